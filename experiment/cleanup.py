@@ -0,0 +1,103 @@
+"""Remove large directory trees off the critical path.
+
+A tree is first renamed into a trash directory on the same file system, which takes
+constant time, and then deleted by a detached low priority process. Anything left
+in the trash, e.g. when the batch system killed the deleting process at the end of
+a job, is removed the next time the trash is emptied.
+"""
+import os
+import shutil
+import subprocess
+import time
+
+from .logs import logger
+
+TRASH = ".trash"
+
+
+def move_to_trash(path, trash_dir):
+    """Move a file or directory into the trash.
+
+    Args:
+        path (str): File or directory
+        trash_dir (str): Trash directory. Must be on the same file system as path.
+
+    Returns:
+        str: The path in the trash. None if it could not be moved.
+
+    """
+    basename = os.path.basename(os.path.normpath(path))
+    trashed = f"{trash_dir}/{basename}.{os.getpid()}.{time.time_ns()}"
+    try:
+        os.makedirs(trash_dir, exist_ok=True)
+        os.rename(path, trashed)
+    except OSError as exc:
+        logger.warning("Could not move {} to the trash: {}", path, repr(exc))
+        return None
+    logger.debug("Moved {} to {}", path, trashed)
+    return trashed
+
+
+def delete(paths, detach=True):
+    """Delete files and directories.
+
+    Args:
+        paths (list): Files and directories
+        detach (bool, optional): Delete in a detached low priority process which is
+                                 not waited for. Defaults to True.
+
+    """
+    if len(paths) == 0:
+        return
+    if detach:
+        subprocess.Popen(  # noqa S603
+            ["nice", "-n", "19", "rm", "-rf", *paths],  # noqa S607
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        return
+    for path in paths:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.lexists(path):
+            os.unlink(path)
+
+
+def empty_trash(trash_dir, detach=True):
+    """Delete everything in the trash.
+
+    Args:
+        trash_dir (str): Trash directory
+        detach (bool, optional): Delete in a detached low priority process.
+                                 Defaults to True.
+
+    """
+    if not os.path.isdir(trash_dir):
+        return
+    delete([os.path.join(trash_dir, entry) for entry in os.listdir(trash_dir)], detach)
+
+
+def remove_tree(path, trash_dir, detach=True):
+    """Remove a directory tree or a file by moving it to the trash.
+
+    Falls back to removing it in place if it can not be moved.
+
+    Args:
+        path (str): Directory tree or file
+        trash_dir (str): Trash directory. Should be on the same file system as path.
+        detach (bool, optional): Delete in a detached low priority process.
+                                 Defaults to True.
+
+    """
+    if not os.path.lexists(path):
+        return
+    trashed = move_to_trash(path, trash_dir)
+    if trashed is None:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        else:
+            os.unlink(path)
+    else:
+        delete([trashed], detach)
@@ -12,6 +12,7 @@ from .scheduler.scheduler import EcflowServerFromConfig
 from .scheduler.submission import NoSchedulerSubmission, TaskSettings
 from .suites import get_defs
 from .toolbox import Platform
+from .worker import DEFAULT_PRELOAD, TaskWorker, benchmark
 
 
 def parse_surfex_script(argv):
@@ -338,3 +339,71 @@ def run_submit_cmd_exp(argv=None):
         argv = sys.argv[1:]
     kwargs = parse_submit_cmd_exp(argv)
     submit_cmd_exp(**kwargs)
+
+
+def parse_task_worker(argv):
+    """Parse the command line input arguments."""
+    parser = ArgumentParser("Resident task worker")
+    parser.add_argument("action", type=str, help="Action", choices=["serve", "bench"])
+    parser.add_argument(
+        "-socket", dest="socket_path", type=str, help="Worker socket", required=True
+    )
+    parser.add_argument(
+        "-config",
+        dest="config_file",
+        type=str,
+        help="Configuration file used by bench",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "-task", type=str, help="Task used by bench", required=False, default="Dummy"
+    )
+    parser.add_argument(
+        "-repeat", type=int, help="Number of bench runs", required=False, default=5
+    )
+    parser.add_argument(
+        "--preload",
+        type=str,
+        nargs="*",
+        help="Modules to preload",
+        required=False,
+        default=DEFAULT_PRELOAD,
+    )
+    parser.add_argument("--version", action="version", version=__version__)
+
+    if len(argv) == 0:
+        parser.print_help()
+        sys.exit()
+
+    args = parser.parse_args(argv)
+    kwargs = {}
+    for arg in vars(args):
+        kwargs.update({arg: getattr(args, arg)})
+    return kwargs
+
+
+def task_worker(**kwargs):
+    """Serve tasks or benchmark the worker."""
+    logger.enable(PACKAGE_NAME)
+    socket_path = kwargs.get("socket_path")
+    if kwargs.get("action") == "serve":
+        TaskWorker(socket_path, preload=kwargs.get("preload")).serve()
+    else:
+        config_file = kwargs.get("config_file")
+        if config_file is None:
+            raise RuntimeError("A config file is needed to benchmark the worker")
+        benchmark(
+            socket_path,
+            config_file,
+            task=kwargs.get("task"),
+            repeat=kwargs.get("repeat"),
+        )
+
+
+def run_task_worker(argv=None):
+    """Run task worker."""
+    if argv is None:
+        argv = sys.argv[1:]
+    kwargs = parse_task_worker(argv)
+    task_worker(**kwargs)
@@ -1,15 +1,19 @@
 #!/usr/bin/env python3
 """Implement helper routines to deal with dates and times."""
-from datetime import datetime, timezone
+import re
+from datetime import datetime, timedelta, timezone
 
 import dateutil.parser
-import pandas as pd
 from dateutil.utils import default_tzinfo
 
 # The regex in a json schema's "pattern" must use JavaScript syntax (ECMA 262).
 # <https://json-schema.org/understanding-json-schema/reference/regular_expressions.html>
 ISO_8601_TIME_DURATION_REGEX = "^P(?!$)(\\d+Y)?(\\d+M)?(\\d+W)?(\\d+D)?"
 ISO_8601_TIME_DURATION_REGEX += "(T(?=\\d+[HMS])(\\d+H)?(\\d+M)?(\\d+S)?)?$"
+# ISO 8601 durations with a fixed length, i.e. without years and months
+_ISO_8601_FIXED_DURATION = re.compile(
+    r"^P(?!$)(?:(\d+)W)?(?:(\d+)D)?(?:T(?=\d+[HMS])(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$"
+)
 
 
 def as_datetime(obj):
@@ -18,8 +22,22 @@ def as_datetime(obj):
 
 
 def as_timedelta(obj):
-    """Convert obj to string and parse into pd.Timedelta."""
-    return pd.Timedelta(str(obj))
+    """Convert obj to string and parse into a timedelta.
+
+    ISO 8601 durations are parsed directly. Other strings are parsed by pandas, which
+    is only imported when needed.
+    """
+    if isinstance(obj, timedelta):
+        return obj
+    match = _ISO_8601_FIXED_DURATION.match(str(obj))
+    if match is None:
+        import pandas as pd
+
+        return pd.Timedelta(str(obj))
+    weeks, days, hours, minutes, seconds = [int(val or 0) for val in match.groups()]
+    return timedelta(
+        weeks=weeks, days=days, hours=hours, minutes=minutes, seconds=seconds
+    )
 
 
 def datetime_as_string(obj):
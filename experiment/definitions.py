@@ -0,0 +1,130 @@
+"""Load YAML and JSON definition files through a compiled cache.
+
+Parsing the large definition files, e.g. the namelist definitions, with the pure
+Python YAML loader is slow. The parsed content is therefore pickled in the user
+cache directory, keyed by the path and the content hash of the source. The cache is
+invalidated when the source changes, and not used if the cache directory can not be
+written. Within a process the pickled form is also kept in memory.
+"""
+import glob
+import hashlib
+import json
+import os
+import pickle  # noqa S403
+
+from .logs import logger
+
+# Pickled definitions already loaded in this process, keyed by file and stat
+_DEFINITIONS = {}
+
+
+def _parse_definitions(filename, content):
+    """Parse the content of a definition file.
+
+    Args:
+        filename (str): Definition file. JSON if the suffix is .json, else YAML.
+        content (bytes): File content
+
+    Returns:
+        any: Parsed content
+
+    """
+    if filename.endswith(".json"):
+        return json.loads(content)
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    return yaml.load(content, Loader=loader)  # noqa S506
+
+
+def definitions_cache_dir():
+    """Get the directory of the definitions cache.
+
+    Returns:
+        str: $XDG_CACHE_HOME/pysurfex-experiment/definitions, where XDG_CACHE_HOME
+             defaults to ~/.cache
+
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME", "")
+    if cache_home == "":
+        cache_home = os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "pysurfex-experiment", "definitions")
+
+
+def definitions_cache_file(filename, digest):
+    """Get the cache file of a definition file.
+
+    Args:
+        filename (str): Definition file
+        digest (str): Content hash of the definition file. "*" gives a glob pattern
+                      matching all cache files.
+
+    Returns:
+        str: Cache file
+
+    """
+    filename = os.path.abspath(filename)
+    path_digest = hashlib.sha256(filename.encode("utf-8")).hexdigest()[:16]
+    basename = os.path.basename(filename)
+    return os.path.join(
+        definitions_cache_dir(), f"{basename}.{path_digest}.{digest[:16]}.pickle"
+    )
+
+
+def _write_cache(filename, cache_file, data):
+    """Write the pickled definitions and remove outdated cache files.
+
+    Args:
+        filename (str): Definition file
+        cache_file (str): Cache file
+        data (bytes): Pickled definitions
+
+    """
+    tmp_file = f"{cache_file}.tmp{os.getpid()}"
+    try:
+        os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+        with open(tmp_file, mode="wb") as fhandler:
+            fhandler.write(data)
+        os.replace(tmp_file, cache_file)
+    except OSError as exc:
+        logger.debug("Could not write definitions cache {}: {}", cache_file, repr(exc))
+        if os.path.exists(tmp_file):
+            os.unlink(tmp_file)
+        return
+    for old_file in glob.glob(definitions_cache_file(filename, "*")):
+        if old_file != cache_file:
+            try:
+                os.unlink(old_file)
+            except OSError:
+                pass
+
+
+def load_definitions(filename):
+    """Load a YAML or JSON definition file.
+
+    Args:
+        filename (str): Definition file
+
+    Returns:
+        any: The parsed content. Each call returns a new copy.
+
+    """
+    stat = os.stat(filename)
+    key = (os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+    if key not in _DEFINITIONS:
+        with open(filename, mode="rb") as fhandler:
+            content = fhandler.read()
+        digest = hashlib.sha256(content).hexdigest()
+        cache_file = definitions_cache_file(filename, digest)
+        try:
+            with open(cache_file, mode="rb") as fhandler:
+                data = fhandler.read()
+            logger.debug("Using definitions cache {}", cache_file)
+        except OSError:
+            logger.debug("Parsing definitions {}", filename)
+            data = pickle.dumps(
+                _parse_definitions(filename, content), protocol=pickle.HIGHEST_PROTOCOL
+            )
+            _write_cache(filename, cache_file, data)
+        _DEFINITIONS[key] = data
+    return pickle.loads(_DEFINITIONS[key])  # noqa S301
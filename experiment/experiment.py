@@ -5,7 +5,6 @@ import os
 import shutil
 
 import tomlkit
-from pysurfex.configuration import Configuration
 
 from .config_parser import ParsedConfig
 from .logs import GLOBAL_LOGLEVEL, logger
@@ -121,6 +120,8 @@ class Exp(ExpFromConfig):
             except RuntimeError:
                 logger.warning("Troika not found!")
 
+        from pysurfex.configuration import Configuration
+
         sfx_config = Configuration(merged_config)
 
         sfx_data = system.get_var("sfx_exp_data", host)
@@ -0,0 +1,88 @@
+"""Share large input files between members without copying them.
+
+A file is shared as a reflink where the file system supports it. A reflink is a
+copy-on-write clone, so either file can be modified without affecting the other.
+Otherwise the file is hardlinked, which shares the data until the file is replaced,
+or copied as a last resort. A file which is going to be modified in place must be
+unshared first if it may be hardlinked.
+"""
+import fcntl
+import os
+import shutil
+
+from .logs import logger
+
+# Linux ioctl cloning a file (FICLONE)
+FICLONE = 0x40049409
+
+
+def reflink(source, destination):
+    """Clone a file as a copy-on-write reflink.
+
+    Args:
+        source (str): File to clone
+        destination (str): New file
+
+    Returns:
+        bool: True if the file was cloned
+
+    """
+    try:
+        with open(source, mode="rb") as src, open(destination, mode="wb") as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(destination):
+            os.unlink(destination)
+        return False
+    return True
+
+
+def link_or_copy(source, destination, hardlink=True):
+    """Share a file as a reflink, a hardlink or a copy.
+
+    The file is created next to the destination and renamed, so readers never see a
+    partial file.
+
+    Args:
+        source (str): File to share
+        destination (str): New file
+        hardlink (bool, optional): Allow a hardlink. Defaults to True.
+
+    Returns:
+        str: How the file was shared, "reflink", "hardlink" or "copy"
+
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    tmp_file = f"{destination}.tmp{os.getpid()}"
+    if os.path.lexists(tmp_file):
+        os.unlink(tmp_file)
+    method = "copy"
+    if reflink(source, tmp_file):
+        method = "reflink"
+    elif hardlink:
+        try:
+            os.link(source, tmp_file)
+            method = "hardlink"
+        except OSError as exc:
+            logger.debug("Could not hardlink {}: {}", source, repr(exc))
+    if method == "copy":
+        shutil.copyfile(source, tmp_file)
+    os.replace(tmp_file, destination)
+    logger.info("Shared {} as {} ({})", source, destination, method)
+    return method
+
+
+def unshare_file(filename):
+    """Give a hardlinked file its own copy of the data.
+
+    Args:
+        filename (str): File to be modified in place
+
+    Returns:
+        bool: True if the file was hardlinked and is now a copy
+
+    """
+    if os.stat(filename).st_nlink < 2:
+        return False
+    link_or_copy(filename, filename, hardlink=False)
+    return True
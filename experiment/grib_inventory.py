@@ -0,0 +1,315 @@
+"""SQLite inventories of GRIB files.
+
+The pysurfex GRIB reader scans a file from the start for each field it reads. An
+inventory stores the header keys, offset and length of each message of a GRIB file
+in a SQLite file next to it, so a field is read directly from its byte range. The
+inventories of several files are queried together with GribInventory, e.g. to find
+the cycles which already have data.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from pysurfex.grib import Grib
+
+from .logs import logger
+
+try:
+    import eccodes
+except ImportError:
+    eccodes = None
+
+INVENTORY_SUFFIX = ".inventory.sqlite"
+
+# Header keys of each message. Keys not defined for a message are stored as NULL.
+INVENTORY_KEYS = {
+    "shortName": "TEXT",
+    "level": "INTEGER",
+    "typeOfLevel": "TEXT",
+    "date": "INTEGER",
+    "time": "INTEGER",
+    "step": "INTEGER",
+    "editionNumber": "INTEGER",
+    "discipline": "INTEGER",
+    "parameterCategory": "INTEGER",
+    "parameterNumber": "INTEGER",
+    "levelType": "INTEGER",
+    "typeOfStatisticalProcessing": "INTEGER",
+    "indicatorOfParameter": "INTEGER",
+    "timeRangeIndicator": "INTEGER",
+}
+
+
+def inventory_file(grib_file):
+    """Get the inventory file of a GRIB file.
+
+    Args:
+        grib_file (str): GRIB file
+
+    Returns:
+        str: Inventory file
+
+    """
+    return f"{grib_file}{INVENTORY_SUFFIX}"
+
+
+def _header_value(gid, key, ktype):
+    """Get a header key of a message.
+
+    Args:
+        gid (int): GRIB message handle
+        key (str): Key
+        ktype (str): SQLite type of the key
+
+    Returns:
+        Any: The value. None if the key is not defined.
+
+    """
+    try:
+        if ktype == "INTEGER":
+            return int(eccodes.codes_get_long(gid, key))
+        return str(eccodes.codes_get(gid, key))
+    except eccodes.CodesInternalError:
+        return None
+
+
+def write_inventory(grib_file):
+    """Write the inventory of a GRIB file.
+
+    Only the section headers of the messages are decoded.
+
+    Args:
+        grib_file (str): GRIB file
+
+    Returns:
+        int: Number of messages
+
+    Raises:
+        RuntimeError: If eccodes is not available
+
+    """
+    if eccodes is None:
+        raise RuntimeError("eccodes not found. Needed for GRIB inventories")
+    rows = []
+    with open(grib_file, mode="rb") as fhandler:
+        while True:
+            gid = eccodes.codes_grib_new_from_file(fhandler, headers_only=True)
+            if gid is None:
+                break
+            row = [
+                eccodes.codes_get(gid, "offset", int),
+                eccodes.codes_get(gid, "totalLength", int),
+            ]
+            for key, ktype in INVENTORY_KEYS.items():
+                row.append(_header_value(gid, key, ktype))
+            rows.append(row)
+            eccodes.codes_release(gid)
+
+    filename = inventory_file(grib_file)
+    tmp_file = f"{filename}.tmp{os.getpid()}"
+    if os.path.exists(tmp_file):
+        os.remove(tmp_file)
+    stat = os.stat(grib_file)
+    columns = ", ".join(f'"{key}" {ktype}' for key, ktype in INVENTORY_KEYS.items())
+    placeholders = ", ".join(["?"] * (len(INVENTORY_KEYS) + 2))
+    with sqlite3.connect(tmp_file) as connection:
+        connection.execute("CREATE TABLE source (size INTEGER, mtime_ns INTEGER)")
+        connection.execute(
+            "INSERT INTO source VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns)
+        )
+        connection.execute(
+            f"CREATE TABLE messages (offset INTEGER, length INTEGER, {columns})"
+        )
+        connection.executemany(f"INSERT INTO messages VALUES ({placeholders})", rows)
+        connection.execute(
+            "CREATE INDEX fields ON messages "
+            '("shortName", "level", "typeOfLevel", "date", "time", "step")'
+        )
+    connection.close()
+    os.replace(tmp_file, filename)
+    logger.debug("Wrote inventory of {} messages in {}", len(rows), grib_file)
+    return len(rows)
+
+
+def _where(keys):
+    """Get an SQL condition selecting header keys.
+
+    Args:
+        keys (dict): Values of header keys
+
+    Returns:
+        tuple: Condition and parameters
+
+    """
+    for key in keys:
+        if key not in INVENTORY_KEYS:
+            raise KeyError(f"{key} is not in the GRIB inventory")
+    if len(keys) == 0:
+        return "", ()
+    condition = " AND ".join(f'"{key}" IS ?' for key in keys)
+    return f" WHERE {condition}", tuple(keys.values())
+
+
+class GribInventory:
+    """Inventories of GRIB files queried together."""
+
+    def __init__(self, grib_files):
+        """Construct the inventory.
+
+        Files without an up to date inventory are left out.
+
+        Args:
+            grib_files (list): GRIB files
+
+        """
+        self.grib_files = []
+        for grib_file in grib_files:
+            if self.is_up_to_date(grib_file):
+                self.grib_files.append(grib_file)
+            else:
+                logger.debug("No up to date inventory of {}", grib_file)
+
+    @staticmethod
+    def is_up_to_date(grib_file):
+        """Check if a GRIB file has an up to date inventory.
+
+        Args:
+            grib_file (str): GRIB file
+
+        Returns:
+            bool: True if the inventory describes the current file
+
+        """
+        filename = inventory_file(grib_file)
+        if not os.path.exists(filename) or not os.path.exists(grib_file):
+            return False
+        stat = os.stat(grib_file)
+        with sqlite3.connect(f"file:{filename}?mode=ro", uri=True) as connection:
+            source = connection.execute("SELECT size, mtime_ns FROM source").fetchone()
+        connection.close()
+        return source == (stat.st_size, stat.st_mtime_ns)
+
+    def query(self, **keys):
+        """Find the messages with some header keys.
+
+        Args:
+            keys (dict): Values of header keys
+
+        Returns:
+            list: Dicts with file, offset, length and the header keys of each
+                  message, in file and message order
+
+        """
+        where, parameters = _where(keys)
+        names = ["offset", "length", *INVENTORY_KEYS]
+        columns = ", ".join(f'"{name}"' for name in names)
+        messages = []
+        for grib_file in self.grib_files:
+            filename = inventory_file(grib_file)
+            with sqlite3.connect(f"file:{filename}?mode=ro", uri=True) as connection:
+                rows = connection.execute(
+                    f"SELECT {columns} FROM messages{where} ORDER BY offset", parameters
+                ).fetchall()
+            connection.close()
+            for row in rows:
+                messages.append({"file": grib_file, **dict(zip(names, row))})
+        return messages
+
+    def cycles(self, **keys):
+        """Find the cycles with data.
+
+        Args:
+            keys (dict): Values of header keys the data must have
+
+        Returns:
+            list: Sorted (date, time) of the messages
+
+        """
+        return sorted({(msg["date"], msg["time"]) for msg in self.query(**keys)})
+
+
+def variable_keys(gribvar):
+    """Get the header keys pysurfex matches a GRIB variable with.
+
+    Args:
+        gribvar (Grib1Variable|Grib2Variable): pysurfex GRIB variable
+
+    Returns:
+        dict: Values of header keys
+
+    """
+    if gribvar.version == 1:
+        return {
+            "editionNumber": 1,
+            "indicatorOfParameter": gribvar.par,
+            "levelType": gribvar.typ,
+            "level": gribvar.level,
+            "timeRangeIndicator": gribvar.tri,
+        }
+    processing = gribvar.type_of_statistical_processing
+    return {
+        "editionNumber": 2,
+        "discipline": gribvar.discipline,
+        "parameterCategory": gribvar.parameter_category,
+        "parameterNumber": gribvar.parameter_number,
+        "levelType": gribvar.level_type,
+        "level": gribvar.level,
+        "typeOfStatisticalProcessing": None if processing == -1 else processing,
+    }
+
+
+class IndexedGrib(Grib):
+    """pysurfex GRIB reader reading fields from the inventory byte ranges."""
+
+    def field(self, gribvar, time):
+        """Read field in grib file.
+
+        The first message matching the variable is found in the inventory and read
+        by pysurfex from an in-memory file holding only that message. Files without
+        an up to date inventory are scanned by pysurfex.
+
+        Args:
+            gribvar (GribVariable1/2): Grib variable to read.
+            time (datetime.datetime): Valid time to read.
+
+        Returns:
+            tuple: Field and geometry
+
+        """
+        if not hasattr(os, "memfd_create"):
+            return Grib.field(self, gribvar, time)
+        messages = GribInventory([self.fname]).query(**variable_keys(gribvar))
+        if len(messages) == 0:
+            return Grib.field(self, gribvar, time)
+
+        fd_in = os.open(self.fname, os.O_RDONLY)
+        try:
+            message = os.pread(fd_in, messages[0]["length"], messages[0]["offset"])
+        finally:
+            os.close(fd_in)
+        fd_message = os.memfd_create("grib_message")
+        try:
+            os.write(fd_message, message)
+            return Grib.field(Grib(f"/proc/self/fd/{fd_message}"), gribvar, time)
+        finally:
+            os.close(fd_message)
+
+
+@contextmanager
+def indexed_grib_reads():
+    """Read GRIB fields with the inventories in the pysurfex readers.
+
+    Yields:
+        None
+
+    """
+    import pysurfex.variable
+
+    if getattr(pysurfex.variable, "Grib", None) is not Grib:
+        yield
+        return
+    pysurfex.variable.Grib = IndexedGrib
+    try:
+        yield
+    finally:
+        pysurfex.variable.Grib = Grib
@@ -0,0 +1,55 @@
+"""Links to the input files of the SURFEX binaries.
+
+The input data of a binary is a mapping from the file names the binary reads to the
+input files. pysurfex links each of them into the work directory with an ln process
+per file. The plain links are created here directly with one symlink each instead,
+and only the entries with their own commands are left to pysurfex.
+"""
+import os
+
+from .logs import logger
+
+
+def split_input_data(data):
+    """Split input data in plain links and entries with their own commands.
+
+    Args:
+        data (dict): Input data mapping from target to input file. An input file may
+                     be a dict with a command to create the target.
+
+    Returns:
+        tuple: Plain links with absolute input files, and the other entries
+
+    """
+    links = {}
+    others = {}
+    for target, input_file in data.items():
+        if isinstance(input_file, str) and os.path.isabs(input_file):
+            links[target] = input_file
+        else:
+            others[target] = input_file
+    return links, others
+
+
+def link_input_files(links, wdir):
+    """Link input files into a work directory.
+
+    Existing targets are replaced, unless they are the input file itself.
+
+    Args:
+        links (dict): Input files for each target
+        wdir (str): Work directory
+
+    """
+    for target, input_file in links.items():
+        link = os.path.join(wdir, target)
+        if os.path.dirname(target) != "":
+            os.makedirs(os.path.dirname(link), exist_ok=True)
+        try:
+            os.symlink(input_file, link)
+        except FileExistsError:
+            if os.path.realpath(link) == os.path.realpath(input_file):
+                continue
+            os.unlink(link)
+            os.symlink(input_file, link)
+    logger.info("Linked {} input files in {}", len(links), wdir)
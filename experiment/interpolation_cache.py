@@ -0,0 +1,386 @@
+"""Persistent cache of horizontal interpolation weights.
+
+The pysurfex interpolation sets up the interpolation from the input grid to the
+experiment domain, e.g. the KD-tree and the bilinear weights, each time a field is
+read. As the geometries do not change during an experiment, the weights are stored
+once in the climate directory and reused by all tasks and cycles.
+
+The nearest neighbour and bilinear interpolations give each output point as a
+weighted sum of the input points in one 2x2 block of the input grid. The weights are
+found by interpolating a few probe fields once. The points in a 2x2 block always
+have different colours (i % 2, j % 2), so interpolating the indicator field of a
+colour gives the weight of the point with that colour, and interpolating the
+indicator field times i and j gives its indices.
+"""
+import functools
+import hashlib
+import importlib
+import os
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from pysurfex.cache import Cache
+from pysurfex.interpolation import Interpolation
+
+from .logs import logger
+
+# Interpolation weights already loaded in this process, keyed by cache file
+_WEIGHTS = {}
+
+# Digests of the coordinates of recently used geometries, keyed by the identity of
+# the geometry, least recently used first. The readers create a new input geometry
+# for each field, so a new geometry is first compared with these coordinates.
+_DIGESTS = OrderedDict()
+MAX_DIGESTS = 8
+
+# pysurfex modules creating an Interpolation for each field they read
+READER_MODULES = ["pysurfex.grib", "pysurfex.netcdf", "pysurfex.fa"]
+
+
+class InterpolationWeights:
+    """Interpolation as weights of the input points."""
+
+    def __init__(self, weights, i_index, j_index):
+        """Construct the interpolation weights.
+
+        Args:
+            weights (np.ndarray): Weights of the points of each colour, (4, npoints)
+            i_index (np.ndarray): First index of the points, (4, npoints)
+            j_index (np.ndarray): Second index of the points, (4, npoints)
+
+        """
+        self.weights = weights
+        self.i_index = i_index
+        self.j_index = j_index
+
+    @classmethod
+    def from_interpolation(cls, interpolate, shape):
+        """Find the weights of an interpolation.
+
+        Args:
+            interpolate (callable): Interpolates a field of the input grid
+            shape (tuple): Shape of the input grid
+
+        Returns:
+            InterpolationWeights: The weights
+
+        """
+        i_field, j_field = np.meshgrid(
+            np.arange(shape[0], dtype="float64"),
+            np.arange(shape[1], dtype="float64"),
+            indexing="ij",
+        )
+        colours = (i_field % 2) + 2 * (j_field % 2)
+        weights = []
+        i_index = []
+        j_index = []
+        for colour in range(4):
+            indicator = (colours == colour).astype("float64")
+            weight = np.asarray(interpolate(indicator), dtype="float64")
+            with np.errstate(divide="ignore", invalid="ignore"):
+                i_val = np.asarray(interpolate(indicator * i_field)) / weight
+                j_val = np.asarray(interpolate(indicator * j_field)) / weight
+            used = np.isfinite(weight) & (weight != 0)
+            weights.append(weight)
+            i_index.append(np.where(used, np.rint(i_val), 0).astype("int32"))
+            j_index.append(np.where(used, np.rint(j_val), 0).astype("int32"))
+        return cls(np.stack(weights), np.stack(i_index), np.stack(j_index))
+
+    def interpolate(self, field2d):
+        """Interpolate a field of the input grid.
+
+        Args:
+            field2d (np.ndarray): Field
+
+        Returns:
+            np.ndarray: Interpolated field
+
+        """
+        values = field2d[self.i_index, self.j_index]
+        with np.errstate(invalid="ignore"):
+            return np.where(self.weights != 0, self.weights * values, 0.0).sum(axis=0)
+
+    def save(self, filename):
+        """Save the weights as a compressed npz file.
+
+        Args:
+            filename (str): File name
+
+        """
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        tmp_file = f"{filename}.tmp{os.getpid()}.npz"
+        np.savez_compressed(
+            tmp_file, weights=self.weights, i_index=self.i_index, j_index=self.j_index
+        )
+        os.replace(tmp_file, filename)
+        logger.info("Saved interpolation weights {}", filename)
+
+    @classmethod
+    def load(cls, filename):
+        """Load weights saved with save.
+
+        Args:
+            filename (str): File name
+
+        Returns:
+            InterpolationWeights: The weights
+
+        """
+        with np.load(filename) as data:
+            return cls(data["weights"], data["i_index"], data["j_index"])
+
+
+def coordinates_digest(lons, lats):
+    """Get a hash of the coordinates of a geometry.
+
+    Args:
+        lons (np.ndarray): Longitudes
+        lats (np.ndarray): Latitudes
+
+    Returns:
+        str: Hash
+
+    """
+    sha = hashlib.sha256()
+    for values in [lons, lats]:
+        sha.update(str(values.shape).encode("utf-8"))
+        sha.update(values.tobytes())
+    return sha.hexdigest()
+
+
+def geometry_digest(geo, points=False):
+    """Get the hash of the coordinates of a geometry, memoized per geometry.
+
+    Args:
+        geo (pysurfex.geo.Geo): Geometry
+        points (bool, optional): Use the point lists of the geometry instead of the
+                                 grid. Defaults to False.
+
+    Returns:
+        str: Hash
+
+    """
+    key = (id(geo), points)
+    entry = _DIGESTS.get(key)
+    if entry is not None and entry[0] is geo:
+        _DIGESTS.move_to_end(key)
+        return entry[3]
+
+    lons, lats = (geo.lonlist, geo.latlist) if points else (geo.lons, geo.lats)
+    lons = np.ascontiguousarray(lons, dtype="float64")
+    lats = np.ascontiguousarray(lats, dtype="float64")
+    digest = None
+    for known in _DIGESTS.values():
+        if np.array_equal(known[1], lons) and np.array_equal(known[2], lats):
+            digest = known[3]
+            break
+    if digest is None:
+        digest = coordinates_digest(lons, lats)
+    # The geometry is kept, so its identity is not reused while it is in _DIGESTS
+    _DIGESTS[key] = (geo, lons, lats, digest)
+    if len(_DIGESTS) > MAX_DIGESTS:
+        _DIGESTS.popitem(last=False)
+    return digest
+
+
+def interpolation_key(operator, geo_in, geo_out):
+    """Get a hash of an interpolation between two geometries.
+
+    Args:
+        operator (str): Interpolation operator
+        geo_in (pysurfex.geo.Geo): Input geometry
+        geo_out (pysurfex.geo.Geo): Output geometry
+
+    Returns:
+        str: Hash
+
+    """
+    sha = hashlib.sha256(operator.encode("utf-8"))
+    sha.update(geometry_digest(geo_in).encode("utf-8"))
+    sha.update(geometry_digest(geo_out, points=True).encode("utf-8"))
+    return sha.hexdigest()
+
+
+class CachedInterpolation(Interpolation):
+    """Interpolation using weights cached on disk."""
+
+    def __init__(self, operator, geo_in, geo_out, cache_dir=None):
+        """Construct the interpolation.
+
+        Args:
+            operator (str): Operator
+            geo_in (pysurfex.geo.Geo): Input geometry
+            geo_out (pysurfex.geo.Geo): Output geometry
+            cache_dir (str, optional): Directory for the weights. Not cached if None.
+
+        """
+        Interpolation.__init__(self, operator, geo_in, geo_out)
+        self.cache_dir = cache_dir
+
+    def cache_file(self, shape):
+        """Get the weights file of this interpolation.
+
+        Args:
+            shape (tuple): Shape of the input fields
+
+        Returns:
+            str: Weights file
+
+        """
+        key = interpolation_key(f"{self.operator}{shape}", self.geo_in, self.geo_out)
+        return f"{self.cache_dir}/interpolation_{self.operator}_{key[:16]}.npz"
+
+    def get_weights(self, field2d):
+        """Get the weights, computing and saving them if needed.
+
+        The weights are checked against the pysurfex interpolation of a random
+        probe field and of the field itself before they are saved. The field alone
+        is not enough, as e.g. a constant field is reproduced by any weights.
+
+        Args:
+            field2d (np.ndarray): Field to interpolate
+
+        Returns:
+            InterpolationWeights: The weights. None if the interpolation can not be
+                                  expressed as weights.
+
+        """
+        filename = self.cache_file(field2d.shape)
+        if filename in _WEIGHTS:
+            return _WEIGHTS[filename]
+        if os.path.exists(filename):
+            logger.debug("Using interpolation weights {}", filename)
+            _WEIGHTS[filename] = InterpolationWeights.load(filename)
+            return _WEIGHTS[filename]
+
+        interpolate = functools.partial(Interpolation.interpolate, self)
+        weights = InterpolationWeights.from_interpolation(interpolate, field2d.shape)
+        probe = np.random.default_rng(seed=1).uniform(1.0, 2.0, field2d.shape)
+        for field in [probe, np.asarray(field2d, dtype="float64")]:
+            if not np.allclose(
+                weights.interpolate(field),
+                interpolate(field),
+                rtol=1e-5,
+                atol=1e-6,
+                equal_nan=True,
+            ):
+                logger.warning("Interpolation {} is not cached", self.operator)
+                weights = None
+                break
+        if weights is not None:
+            weights.save(filename)
+        _WEIGHTS[filename] = weights
+        return weights
+
+    def interpolate(self, field2d, undefined=None):
+        """Do interpolation.
+
+        Args:
+            field2d (np.ndarray): Two dimensional field to interpolate
+            undefined (float, optional): Undefined value if field2d is None.
+                                         Defaults to None.
+
+        Returns:
+            np.array: interpolated_field
+
+        """
+        if (
+            self.cache_dir is None
+            or self.geo_in is None
+            or field2d is None
+            or self.identical
+            or self.operator == "none"
+        ):
+            return Interpolation.interpolate(self, field2d, undefined=undefined)
+        weights = self.get_weights(field2d)
+        if weights is None:
+            return Interpolation.interpolate(self, field2d, undefined=undefined)
+        return weights.interpolate(field2d)
+
+
+class PersistentCache(Cache):
+    """A pysurfex Cache handing out interpolations with weights cached on disk."""
+
+    def __init__(self, max_age, cache_dir):
+        """Construct cache.
+
+        Args:
+            max_age (int): Maximum age in seconds.
+            cache_dir (str): Directory for the interpolation weights
+
+        """
+        Cache.__init__(self, max_age)
+        self.cache_dir = cache_dir
+
+    def interpolator_is_set(self, inttype, geo_in, geo_out):  # noqa ARG002
+        """Check if interpolator is set. Always as they are created on demand.
+
+        Args:
+            inttype (str): Interpolation operator
+            geo_in (pysurfex.geo.Geo): Input geometry
+            geo_out (pysurfex.geo.Geo): Output geometry
+
+        Returns:
+            bool: True
+
+        """
+        return True
+
+    def get_interpolator(self, inttype, geo_in, geo_out):
+        """Get interpolator.
+
+        Args:
+            inttype (str): Interpolation operator
+            geo_in (pysurfex.geo.Geo): Input geometry
+            geo_out (pysurfex.geo.Geo): Output geometry
+
+        Returns:
+            CachedInterpolation: The interpolation
+
+        """
+        return CachedInterpolation(inttype, geo_in, geo_out, cache_dir=self.cache_dir)
+
+    def update_interpolator(self, inttype, geo_in, geo_out, value):  # noqa ARG002
+        """Update interpolator. Not needed as the weights are stored on disk.
+
+        Args:
+            inttype (str): Interpolation operator
+            geo_in (pysurfex.geo.Geo): Input geometry
+            geo_out (pysurfex.geo.Geo): Output geometry
+            value (Interpolation): Interpolation
+
+        """
+        return
+
+
+@contextmanager
+def interpolation_cache(cache_dir):
+    """Use cached interpolation weights in the pysurfex readers.
+
+    The pysurfex readers create their interpolation for each field they read and do
+    not take it from the Cache, so their Interpolation is replaced while the
+    context is active.
+
+    Args:
+        cache_dir (str): Directory for the interpolation weights
+
+    Yields:
+        None
+
+    """
+    factory = functools.partial(CachedInterpolation, cache_dir=cache_dir)
+    patched = []
+    for module_name in READER_MODULES:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            continue
+        if getattr(module, "Interpolation", None) is Interpolation:
+            module.Interpolation = factory
+            patched.append(module)
+    try:
+        yield
+    finally:
+        for module in patched:
+            module.Interpolation = Interpolation
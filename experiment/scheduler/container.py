@@ -0,0 +1,124 @@
+"""Run a task from the variables of an ecflow container."""
+from ..config_parser import MAIN_CONFIG_JSON_SCHEMA, ParsedConfig
+from ..datetime_utils import ecflow2datetime_string
+from ..logs import GLOBAL_LOGLEVEL, LoggerHandlers, logger
+from ..tasks.discover_tasks import get_task
+from ..tracing import span, task_trace
+from .scheduler import EcflowClient, EcflowServerFromConfig, EcflowTask
+
+
+def parse_task_args(args):
+    """Parse the ARGS variable.
+
+    Args:
+        args (str): Arguments on the form "key1=val1;key2=val2"
+
+    Returns:
+        dict: Parsed arguments
+
+    """
+    args_dict = {}
+    if args is not None and args != "":
+        logger.debug("args={}", args)
+        for arg in args.split(";"):
+            parts = arg.split("=")
+            logger.debug("arg={} parts={} len(parts)={}", arg, parts, len(parts))
+            if len(parts) == 2:
+                args_dict.update({parts[0]: parts[1]})
+    return args_dict
+
+
+def task_config_update(**kwargs):
+    """Create the task specific config update from the ecflow variables.
+
+    Args:
+        kwargs (dict): Ecflow variables
+
+    Returns:
+        dict: Update for the parsed config
+
+    """
+    return {
+        "general": {
+            "stream": kwargs.get("STREAM"),
+            "realization": kwargs.get("ENSMBR"),
+            "times": {
+                "basetime": ecflow2datetime_string(kwargs.get("DTG")),
+                "validtime": ecflow2datetime_string(kwargs.get("DTG")),
+                "basetime_pp": ecflow2datetime_string(kwargs.get("DTGPP")),
+            },
+        },
+        "task": {
+            "wrapper": kwargs.get("WRAPPER"),
+            "var_name": kwargs.get("VAR_NAME"),
+            "args": parse_task_args(kwargs.get("ARGS")),
+            "bundle": kwargs.get("BUNDLE_TASKS", ""),
+        },
+    }
+
+
+def ecflow_main(config=None, **kwargs):
+    """Run a task as an ecflow job.
+
+    Args:
+        config (ParsedConfig, optional): Already parsed config. If None the config
+                                         is read from the CONFIG variable.
+        kwargs (dict): Ecflow variables
+
+    """
+    if config is None:
+        with span("config"):
+            config = ParsedConfig.from_file(
+                kwargs.get("CONFIG"), json_schema=MAIN_CONFIG_JSON_SCHEMA
+            )
+
+    # Reset loglevel according to (in order of priority):
+    #     (a) Configs in ECFLOW UI
+    #     (b) What was originally set in the config file
+    #     (c) The default `GLOBAL_LOGLEVEL` if none of the above is found.
+    loglevel = kwargs.get(
+        "LOGLEVEL", config.get_value("general.loglevel", GLOBAL_LOGLEVEL)
+    ).upper()
+    logger.configure(handlers=LoggerHandlers(default_level=loglevel))
+    logger.info("Loglevel={}", loglevel)
+
+    ecf_name = kwargs.get("ECF_NAME")
+    ecf_pass = kwargs.get("ECF_PASS")
+    ecf_tryno = kwargs.get("ECF_TRYNO")
+    ecf_rid = kwargs.get("ECF_RID")
+    task = EcflowTask(ecf_name, ecf_tryno, ecf_pass, ecf_rid)
+    scheduler = EcflowServerFromConfig(config)
+
+    # This will also handle call to sys.exit(), i.e. Client._   _exit__ will still be called.
+    client = EcflowClient(scheduler, task)
+    with client:
+        task_name = kwargs.get("TASK_NAME")
+        logger.info("Running task {}", task_name)
+        config = config.copy(update=task_config_update(**kwargs))
+        with task_trace(task_name, config):
+            with span("create_task"):
+                exp_task = get_task(task.ecf_task, config)
+            exp_task.scheduler_client = client
+            exp_task.run()
+        logger.info("Finished task {}", task_name)
+
+
+def ecflow_abort(reason, **kwargs):
+    """Report an ecflow job aborted when its task could not report it.
+
+    Args:
+        reason (str): Reason for the abort
+        kwargs (dict): Ecflow variables
+
+    """
+    config = ParsedConfig.from_file(
+        kwargs.get("CONFIG"), json_schema=MAIN_CONFIG_JSON_SCHEMA
+    )
+    task = EcflowTask(
+        kwargs.get("ECF_NAME"),
+        kwargs.get("ECF_TRYNO"),
+        kwargs.get("ECF_PASS"),
+        kwargs.get("ECF_RID"),
+    )
+    client = EcflowClient(EcflowServerFromConfig(config), task)
+    client.abort(reason)
@@ -387,6 +387,48 @@ class EcflowClient(object):
             Exception, "Signal handler called with signal " + str(signum), extra
         )
 
+    def event(self, name):
+        """Set an event on the running task.
+
+        Args:
+            name (str): Name of the event.
+        """
+        logger.debug("Setting event {}", name)
+        if self.client is not None:
+            self.client.child_event(name)
+
+    def label(self, name, text):
+        """Update a label on the running task.
+
+        Args:
+            name (str): Name of the label.
+            text (str): New label text.
+        """
+        logger.debug("Setting label {}={}", name, text)
+        if self.client is not None:
+            self.client.child_label(name, text)
+
+    def abort(self, reason):
+        """Report the running task aborted.
+
+        Args:
+            reason (str): Reason for the abort.
+        """
+        logger.error("Aborting task: {}", reason)
+        if self.client is not None:
+            self.client.child_abort(reason)
+
+    def meter(self, name, value):
+        """Update a meter on the running task.
+
+        Args:
+            name (str): Name of the meter.
+            value (int): New meter value.
+        """
+        logger.debug("Setting meter {}={}", name, value)
+        if self.client is not None:
+            self.client.child_meter(name, int(value))
+
     def __enter__(self):
         """Enter the object.
 
@@ -75,6 +75,104 @@ class TaskSettings(object):
         logger.debug("Task settings for task {}: {}", task, task_settings)
         return task_settings
 
+    def may_bundle(self, task):
+        """Check if a task may be run inside a bundle task.
+
+        Args:
+            task (str): The name of the task
+
+        Returns:
+            bool: True if the task is listed in bundle_tasks
+
+        """
+        return task in self.submission_defs.get("bundle_tasks", [])
+
+    def bundle(self, tasks):
+        """Check if a sequence of tasks should be run as a bundle.
+
+        Args:
+            tasks (list): Names of the tasks in order of execution
+
+        Returns:
+            bool: True if more than one task and all tasks may be bundled
+
+        """
+        if len(tasks) < 2:
+            return False
+        return all(self.may_bundle(task) for task in tasks)
+
+    def get_pipeline_depth(self, family, default=24):
+        """Get how many hours a family may run ahead of the work it waits for.
+
+        Args:
+            family (str): The name of the family
+            default (int, optional): Used if no depth is configured. Defaults to 24.
+
+        Returns:
+            int: Pipeline depth in hours
+
+        """
+        pipeline_depth = self.submission_defs.get("pipeline_depth", {})
+        return int(pipeline_depth.get(family, pipeline_depth.get("default", default)))
+
+    def get_limits(self):
+        """Get the limits on concurrently active tasks.
+
+        Returns:
+            dict: Maximum number of active tasks for each limit
+
+        """
+        limits = self.submission_defs.get("limits", {})
+        return {name: int(limit["max"]) for name, limit in limits.items()}
+
+    def get_limit(self, task):
+        """Get the limit a task belongs to.
+
+        Args:
+            task (str): The name of the task
+
+        Returns:
+            str: Name of the limit. None if the task is not limited.
+
+        """
+        for name, limit in self.submission_defs.get("limits", {}).items():
+            if task in limit.get("tasks", []):
+                return name
+        return None
+
+    def get_array_settings(self, family, members):
+        """Get the settings for running a family as a member array.
+
+        Args:
+            family (str): The name of the ensemble family
+            members (list): Ensemble members
+
+        Returns:
+            dict: Array settings. None if the family should not be a member array.
+
+        """
+        settings = self.submission_defs.get("arrays", {}).get(family)
+        if settings is None:
+            return None
+        if len(members) < settings.get("min_members", 2):
+            return None
+        return {"cores_per_member": settings.get("cores_per_member", 1)}
+
+    def get_worker_socket(self, task):
+        """Get the socket of the resident worker for a task.
+
+        Args:
+            task (str): The name of the task
+
+        Returns:
+            str: Path to the worker socket. None if the task should not use a worker.
+
+        """
+        worker = self.submission_defs.get("worker", {})
+        if task in worker.get("tasks", []):
+            return worker.get("socket")
+        return None
+
     def get_task_settings(self, task, key=None, variables=None, ecf_micro="%"):
         """Get task settings.
 
@@ -95,6 +95,60 @@ class EcflowNode:
             else:
                 raise NotImplementedError("Unknown defstatus")
 
+    def add_event(self, name):
+        """Add an event to the node.
+
+        Args:
+            name (str): Name of the event
+
+        """
+        if self.ecf_node is not None:
+            self.ecf_node.add_event(name)
+
+    def add_label(self, name, value=""):
+        """Add a label to the node.
+
+        Args:
+            name (str): Name of the label
+            value (str, optional): Initial label text. Defaults to ""
+
+        """
+        if self.ecf_node is not None:
+            self.ecf_node.add_label(name, value)
+
+    def add_meter(self, name, min_value, max_value):
+        """Add a meter to the node.
+
+        Args:
+            name (str): Name of the meter
+            min_value (int): Minimum value
+            max_value (int): Maximum value
+
+        """
+        if self.ecf_node is not None:
+            self.ecf_node.add_meter(name, min_value, max_value)
+
+    def add_limit(self, name, max_value):
+        """Add a limit to the node.
+
+        Args:
+            name (str): Name of the limit
+            max_value (int): Maximum number of active tasks in the limit
+
+        """
+        if self.ecf_node is not None:
+            self.ecf_node.add_limit(name, max_value)
+
+    def add_inlimit(self, name):
+        """Make the node use a limit defined on one of its parents.
+
+        Args:
+            name (str): Name of the limit
+
+        """
+        if self.ecf_node is not None:
+            self.ecf_node.add_inlimit(name)
+
     def add_part_trigger(self, triggers, mode=True):
         """Add a part trigger.
 
@@ -244,11 +298,7 @@ class EcflowSuiteTriggers:
                 else:
                     if isinstance(trigger, EcflowSuiteTrigger):
                         trigger_string = (
-                            trigger_string
-                            + cat
-                            + trigger.node.path
-                            + " == "
-                            + trigger.mode
+                            trigger_string + cat + trigger.path + " == " + trigger.mode
                         )
                     else:
                         raise TypeError("Trigger must be a Trigger object")
@@ -276,17 +326,34 @@ class EcflowSuiteTriggers:
 class EcflowSuiteTrigger:
     """EcFlow Trigger in a suite."""
 
-    def __init__(self, node, mode="complete"):
+    def __init__(self, node, mode="complete", event=None):
         """Create a EcFlow trigger object.
 
         Args:
             node (EcflowNode): The node to trigger on
             mode (str, optional): Trigger mode. Defaults to "complete"
+            event (str, optional): Trigger on this event of the node instead of
+                                   the node state. Defaults to None
 
         """
         self.node = node
+        self.event = event
+        if event is not None and mode == "complete":
+            mode = "set"
         self.mode = mode
 
+    @property
+    def path(self):
+        """Path to trigger on.
+
+        Returns:
+            str: Node path, with event name appended for event triggers.
+
+        """
+        if self.event is None:
+            return self.node.path
+        return f"{self.node.path}:{self.event}"
+
 
 class EcflowSuiteFamily(EcflowNodeContainer):
     """A family in ecflow.
@@ -378,10 +445,20 @@ class EcflowSuiteTask(EcflowNode):
         logger.debug(parent.path)
         logger.debug(parent.ecf_container_path)
         task_container = parent.ecf_container_path + "/" + name + ".py"
+        worker_socket = task_settings.get_worker_socket(name)
+        if worker_socket is not None and self.ecf_node is not None:
+            self.ecf_node.add_variable("WORKER_SOCKET", worker_socket)
+        limit = task_settings.get_limit(name)
+        if limit is not None:
+            self.add_inlimit(limit)
+
         if parse:
             if input_template is None:
                 raise FileNotFoundError("Input template is missing")
 
+            if worker_socket is not None:
+                input_template = f"{os.path.dirname(input_template)}/worker.py"
+
             variables = task_settings.get_settings(name)
             if "INTERPRETER" in variables:
                 interpreter = variables["INTERPRETER"]
@@ -406,3 +483,132 @@ class EcflowSuiteTask(EcflowNode):
         else:
             if not os.path.exists(task_container):
                 raise FileNotFoundError(f"Container {task_container} is missing!")
+
+
+class EcflowSuiteBundle(EcflowSuiteTask):
+    """A bundle task running a sequence of tasks in one job.
+
+    Every bundled task gets an event with the same name, which is set when the task
+    has finished. Other nodes can trigger on these events with
+    EcflowSuiteTrigger(bundle, event=task).
+
+    Args:
+        EcflowSuiteTask (EcflowSuiteTask): The ecflow task.
+    """
+
+    def __init__(
+        self,
+        tasks,
+        parent,
+        config,
+        task_settings,
+        ecf_files,
+        input_template=None,
+        variables=None,
+        ecf_micro="%",
+        triggers=None,
+        def_status=None,
+        name="Bundle",
+    ):
+        """Construct the EcflowSuiteBundle.
+
+        Args:
+            tasks (list): Names of the tasks to run, in order of execution.
+            parent (EcflowNode): Parent node.
+            config (ParsedConfig): Parsed config
+            task_settings (TaskSettings): Task settings
+            ecf_files (str): Path to ecflow containers
+            input_template(str, optional): Input template
+            variables (dict, optional): Variables to map. Defaults to None
+            ecf_micro (str, optional): ECF_MICRO. Defaults to %
+            triggers (EcflowSuiteTriggers): Triggers. Defaults to None
+            def_status (str, optional): Default status. Defaults to False.
+            name (str, optional): Name of the bundle task. Defaults to "Bundle"
+
+        """
+        if variables is None:
+            variables = {}
+        variables.update({"BUNDLE_TASKS": ":".join(tasks)})
+        EcflowSuiteTask.__init__(
+            self,
+            name,
+            parent,
+            config,
+            task_settings,
+            ecf_files,
+            input_template=input_template,
+            variables=variables,
+            ecf_micro=ecf_micro,
+            triggers=triggers,
+            def_status=def_status,
+        )
+        self.tasks = tasks
+        self.add_label("task", "")
+        for task in tasks:
+            self.add_event(task)
+
+
+class EcflowSuiteMemberArray(EcflowSuiteTask):
+    """A task running the same tasks for many ensemble members in one job.
+
+    The meter "members" counts the finished members and an event is set for each
+    finished member.
+
+    Args:
+        EcflowSuiteTask (EcflowSuiteTask): The ecflow task.
+    """
+
+    def __init__(
+        self,
+        tasks,
+        members,
+        parent,
+        config,
+        task_settings,
+        ecf_files,
+        cores_per_member=1,
+        input_template=None,
+        ecf_micro="%",
+        triggers=None,
+        def_status=None,
+        name="MemberArray",
+    ):
+        """Construct the EcflowSuiteMemberArray.
+
+        Args:
+            tasks (list): Names of the tasks to run for each member, in order.
+            members (list): Ensemble members.
+            parent (EcflowNode): Parent node.
+            config (ParsedConfig): Parsed config
+            task_settings (TaskSettings): Task settings
+            ecf_files (str): Path to ecflow containers
+            cores_per_member (int, optional): Cores used by each member. Defaults to 1
+            input_template(str, optional): Input template
+            ecf_micro (str, optional): ECF_MICRO. Defaults to %
+            triggers (EcflowSuiteTriggers): Triggers. Defaults to None
+            def_status (str, optional): Default status. Defaults to False.
+            name (str, optional): Name of the task. Defaults to "MemberArray"
+
+        """
+        args = (
+            f"members={':'.join([str(member) for member in members])};"
+            f"tasks={':'.join(tasks)};cores_per_member={cores_per_member}"
+        )
+        EcflowSuiteTask.__init__(
+            self,
+            name,
+            parent,
+            config,
+            task_settings,
+            ecf_files,
+            input_template=input_template,
+            variables={"ARGS": args, "ENSMBR": ""},
+            ecf_micro=ecf_micro,
+            triggers=triggers,
+            def_status=def_status,
+        )
+        self.tasks = tasks
+        self.members = members
+        self.add_meter("members", 0, len(members))
+        for member in members:
+            self.add_event(f"mbr_{int(member):03d}")
@@ -7,13 +7,33 @@ from .logs import GLOBAL_LOGLEVEL, logger
 from .scheduler.submission import TaskSettings, TroikaSettings
 from .scheduler.suites import (
     EcflowSuite,
+    EcflowSuiteBundle,
     EcflowSuiteFamily,
+    EcflowSuiteMemberArray,
     EcflowSuiteTask,
     EcflowSuiteTrigger,
     EcflowSuiteTriggers,
 )
+from .tasks.task_array import ekf_perturbations, task_args
 from .toolbox import Platform
 
+# Family of the tasks preparing the input of a cycle
+CYCLE_INPUT_FAMILY = "CycleInput"
+
+
+def forcing_task_path(suite_name, basetime):
+    """Get the path of the Forcing task of a cycle in the suite.
+
+    Args:
+        suite_name (str): Name of the suite
+        basetime (datetime): Cycle basetime
+
+    Returns:
+        str: Path of the task
+
+    """
+    return f"/{suite_name}/{datetime2ecflow(basetime)}/{CYCLE_INPUT_FAMILY}/Forcing"
+
 
 class SurfexSuite:
     """Surfex suite."""
@@ -118,6 +138,8 @@ class SurfexSuite:
             "STREAM": "",
             "ENSMBR": "",
             "ARGS": "",
+            "BUNDLE_TASKS": "",
+            "WORKER_SOCKET": "",
             "FORCE": "",
             "CHECK_EXISTENCE": "",
             "PRINT_NAMELIST": "",
@@ -126,6 +148,9 @@ class SurfexSuite:
         self.suite_name = suite_name
         logger.debug("variables: {}", variables)
         self.suite = EcflowSuite(self.suite_name, ecf_files, variables=variables)
+        for limit, max_value in task_settings.get_limits().items():
+            logger.debug("Limit {} to {} active tasks", limit, max_value)
+            self.suite.add_limit(limit, max_value)
 
         if config.get_value("compile.build"):
             comp = EcflowSuiteFamily("Compilation", self.suite, ecf_files)
@@ -212,12 +237,15 @@ class SurfexSuite:
         static_complete = EcflowSuiteTrigger(static_data)
 
         prep_complete = None
-        hours_ahead = 24
+        # PrepareCycle may run hours_ahead ahead of the Prediction it waits for
+        hours_ahead = task_settings.get_pipeline_depth("PrepareCycle")
         cycle_input_dtg_node = {}
         prediction_dtg_node = {}
         post_processing_dtg_node = {}
         prev_dtg = None
         prefetch = None
+        prev_forcing = None
+        catchup_cycles = int(config.get_value("forcing.catchup_cycles", 1))
         for __, dtg in enumerate(dtgs):
             dtg_str = datetime2ecflow(dtg)
             variables = {"DTG": dtg_str, "DTGBEG": dtgbeg_str}
@@ -254,7 +282,7 @@ class SurfexSuite:
             triggers.add_triggers([EcflowSuiteTrigger(prepare_cycle)])
 
             cycle_input = EcflowSuiteFamily(
-                "CycleInput", dtg_node, ecf_files, triggers=triggers
+                CYCLE_INPUT_FAMILY, dtg_node, ecf_files, triggers=triggers
             )
             cycle_input_dtg_node.update({dtg_str: cycle_input})
             if dtg == dtgs[0]:
@@ -279,6 +307,13 @@ class SurfexSuite:
                 triggers=triggers
             )
 
+            # In catch-up mode a Forcing task also creates the forcing of the next
+            # cycles and sets their Forcing tasks complete
+            forcing_triggers = grib_fetched
+            if catchup_cycles > 1 and prev_forcing is not None:
+                forcing_triggers = EcflowSuiteTriggers(
+                    [EcflowSuiteTrigger(prefetch), EcflowSuiteTrigger(prev_forcing)]
+                )
             forcing = EcflowSuiteTask(
                 "Forcing",
                 cycle_input,
@@ -286,8 +321,9 @@ class SurfexSuite:
                 task_settings,
                 ecf_files,
                 input_template=template,
-                triggers=grib_fetched
+                triggers=forcing_triggers
             )
+            prev_forcing = forcing
             triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(forcing)])
             # move inside forcing task to save queue
             # if config.get_value("forcing.modify_forcing"):
@@ -373,9 +409,6 @@ class SurfexSuite:
                         perturbations = EcflowSuiteFamily(
                             "Perturbations", initialization, ecf_files
                         )
-                        nncv = config.get_value("SURFEX.ASSIM.ISBA.EKF.NNCV")
-                        names = config.get_value("SURFEX.ASSIM.ISBA.EKF.CVAR_M")
-                        llincheck = config.get_value("SURFEX.ASSIM.ISBA.EKF.LLINCHECK")
                         triggers = None
                         fgint = settings.get_fgint(realization=realization)
                         fg_dtg = dtg - fgint
@@ -384,78 +417,57 @@ class SurfexSuite:
                                 EcflowSuiteTrigger(cycle_input_dtg_node[fg_dtg])
                             )
 
-                        name = "REF"
-                        pert = EcflowSuiteFamily(name, perturbations, ecf_files)
-                        args = f"pert=0;name={name};ivar=0"
-                        logger.debug("args: {}", args)
-                        variables = {"ARGS": args}
-                        EcflowSuiteTask(
-                            "PerturbedRun",
-                            pert,
-                            config,
-                            task_settings,
-                            ecf_files,
-                            triggers=triggers,
-                            variables=variables,
-                            input_template=template,
+                        runs = ekf_perturbations(config)
+                        array_settings = task_settings.get_array_settings(
+                            "Perturbations", runs
                         )
-
-                        # Add extra families in case of llincheck
-                        pert_signs = ["none"]
-                        if llincheck:
-                            pert_signs = ["pos", "neg"]
-
-                        pert_families = []
-                        for pert_sign in pert_signs:
-                            if pert_sign == "none":
-                                pert_families.append(perturbations)
-                            elif pert_sign == "pos":
-                                pert_families.append(
-                                    EcflowSuiteFamily(
-                                        "Pos",
-                                        perturbations,
-                                        ecf_files,
-                                        variables=variables,
-                                    )
+                        if array_settings is not None:
+                            cores_per_run = array_settings["cores_per_member"]
+                            variables = {"ARGS": f"cores_per_run={cores_per_run}"}
+                            pert_array = EcflowSuiteTask(
+                                "PerturbationArray",
+                                perturbations,
+                                config,
+                                task_settings,
+                                ecf_files,
+                                triggers=triggers,
+                                variables=variables,
+                                input_template=template,
+                            )
+                            pert_array.add_meter("runs", 0, len(runs))
+                        else:
+                            # Add extra families in case of llincheck
+                            pert_families = {"none": perturbations}
+                            for run in runs:
+                                pert_parent = perturbations
+                                pert_sign = run.get("pert_sign")
+                                if pert_sign in ["pos", "neg"]:
+                                    if pert_sign not in pert_families:
+                                        pert_families[pert_sign] = EcflowSuiteFamily(
+                                            pert_sign.capitalize(),
+                                            perturbations,
+                                            ecf_files,
+                                            variables=variables,
+                                        )
+                                    pert_parent = pert_families[pert_sign]
+                                elif pert_sign not in [None, "none"]:
+                                    raise NotImplementedError
+                                pert = EcflowSuiteFamily(
+                                    run["name"], pert_parent, ecf_files
                                 )
-                            elif pert_sign == "neg":
-                                pert_families.append(
-                                    EcflowSuiteFamily(
-                                        "Neg",
-                                        perturbations,
-                                        ecf_files,
-                                        variables=variables,
-                                    )
+                                args = task_args(run)
+                                logger.debug("args: {}", args)
+                                variables = {"ARGS": args}
+                                EcflowSuiteTask(
+                                    "PerturbedRun",
+                                    pert,
+                                    config,
+                                    task_settings,
+                                    ecf_files,
+                                    triggers=triggers,
+                                    variables=variables,
+                                    input_template=template,
                                 )
-                            else:
-                                raise NotImplementedError
-
-                        nivar = 1
-                        for ivar, val in enumerate(nncv):
-                            logger.debug("ivar {}, nncv[ivar] {}", str(ivar), str(val))
-                            if val == 1:
-
-                                name = names[ivar]
-                                nfam = 0
-                                for pert_parent in pert_families:
-                                    pivar = str((nfam * len(nncv)) + ivar + 1)
-                                    pert = EcflowSuiteFamily(name, pert_parent, ecf_files)
-                                    pert_sign = pert_signs[nfam]
-                                    args = f"pert={str(pivar)};name={name};ivar={str(nivar)};pert_sign={pert_sign}"
-                                    logger.debug("args: {}", args)
-                                    variables = {"ARGS": args}
-                                    EcflowSuiteTask(
-                                        "PerturbedRun",
-                                        pert,
-                                        config,
-                                        task_settings,
-                                        ecf_files,
-                                        triggers=triggers,
-                                        variables=variables,
-                                        input_template=template,
-                                    )
-                                    nfam += 1
-                                nivar = nivar + 1
 
                     prepare_oi_soil_input = None
                     prepare_oi_climate = None
@@ -703,30 +715,64 @@ class SurfexSuite:
                 else:
                     triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(prep)])
                 fg_ready = []
-                for m in ensmsel:
-                    if pert_forcing or pert_state or not da_this:
-                        logger.debug("prep member %s", m)
-                        name = "mbr_%03d" % m
-                        args = "pert=" + str(m) + ";name=" + name
-                        logger.debug("args: %s", args)
-                        variables = {"ARGS": args, "ENSMBR": int(m)}
-                        pert = EcflowSuiteFamily(name, ens_prep, ecf_files, variables=variables) 
-                        if pert_forcing:
-                            EcflowSuiteTask("PerturbForcing", pert, config, task_settings, ecf_files,triggers=noise_created, input_template=template)
-                        if dtg == dtgbeg:
-                            prep = EcflowSuiteTask("Prep", pert, config, task_settings, ecf_files,input_template=template)
-                        else:
-                            trigger = None
-                            if prev_dtg is not None:
-                                prev_dtg_str = datetime2ecflow(prev_dtg)
-                                trigger = EcflowSuiteTriggers([EcflowSuiteTrigger(prediction_dtg_node[prev_dtg_str]["node"])])
-                            cpfg = EcflowSuiteTask("CopyFG", pert, config, task_settings, ecf_files, triggers=trigger, input_template=template)
-                            fg_ready += [EcflowSuiteTrigger(cpfg)]
-                            if not da_this:
-                                prep = EcflowSuiteTask("CycleFirstGuess", pert, config, task_settings, ecf_files,triggers=triggers, input_template=template)
-                                #triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(prep)])
-                        if pert_state:
-                            EcflowSuiteTask("PerturbState", pert, config, task_settings, ecf_files,triggers=triggers, input_template=template)
+                array_settings = task_settings.get_array_settings("ensemble_prep", ensmsel)
+                member_tasks = []
+                if pert_forcing or pert_state or not da_this:
+                    if pert_forcing:
+                        member_tasks.append("PerturbForcing")
+                    if dtg == dtgbeg:
+                        member_tasks.append("Prep")
+                    else:
+                        member_tasks.append("CopyFG")
+                        if not da_this:
+                            member_tasks.append("CycleFirstGuess")
+                    if pert_state:
+                        member_tasks.append("PerturbState")
+                if array_settings is not None and len(member_tasks) > 0:
+                    array_triggers = [triggers]
+                    if dtg != dtgbeg and prev_dtg is not None:
+                        prev_dtg_str = datetime2ecflow(prev_dtg)
+                        array_triggers.append(
+                            EcflowSuiteTrigger(prediction_dtg_node[prev_dtg_str]["node"])
+                        )
+                    member_array = EcflowSuiteMemberArray(
+                        member_tasks,
+                        ensmsel,
+                        ens_prep,
+                        config,
+                        task_settings,
+                        ecf_files,
+                        cores_per_member=array_settings["cores_per_member"],
+                        input_template=template,
+                        triggers=EcflowSuiteTriggers(array_triggers),
+                    )
+                    if "CopyFG" in member_tasks:
+                        fg_ready += [EcflowSuiteTrigger(member_array)]
+                else:
+                    for m in ensmsel:
+                        if pert_forcing or pert_state or not da_this:
+                            logger.debug("prep member %s", m)
+                            name = "mbr_%03d" % m
+                            args = "pert=" + str(m) + ";name=" + name
+                            logger.debug("args: %s", args)
+                            variables = {"ARGS": args, "ENSMBR": int(m)}
+                            pert = EcflowSuiteFamily(name, ens_prep, ecf_files, variables=variables) 
+                            if pert_forcing:
+                                EcflowSuiteTask("PerturbForcing", pert, config, task_settings, ecf_files,triggers=noise_created, input_template=template)
+                            if dtg == dtgbeg:
+                                prep = EcflowSuiteTask("Prep", pert, config, task_settings, ecf_files,input_template=template)
+                            else:
+                                trigger = None
+                                if prev_dtg is not None:
+                                    prev_dtg_str = datetime2ecflow(prev_dtg)
+                                    trigger = EcflowSuiteTriggers([EcflowSuiteTrigger(prediction_dtg_node[prev_dtg_str]["node"])])
+                                cpfg = EcflowSuiteTask("CopyFG", pert, config, task_settings, ecf_files, triggers=trigger, input_template=template)
+                                fg_ready += [EcflowSuiteTrigger(cpfg)]
+                                if not da_this:
+                                    prep = EcflowSuiteTask("CycleFirstGuess", pert, config, task_settings, ecf_files,triggers=triggers, input_template=template)
+                                    #triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(prep)])
+                            if pert_state:
+                                EcflowSuiteTask("PerturbState", pert, config, task_settings, ecf_files,triggers=triggers, input_template=template)
 
                 triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(ens_prep)])
             
@@ -753,14 +799,27 @@ class SurfexSuite:
             #### WORK HERE ####
             if len(ensmsel) > 0:
                 eps = EcflowSuiteFamily("EPS", prediction, ecf_files)
-                for m in ensmsel:
-                    logger.debug("member %s", m)
-                    name = "mbr_%03d" % m
-                    args = "pert=" + str(m) + ";name=" + name
-                    logger.debug("args: %s", args)
-                    variables = {"ARGS": args, "ENSMBR": str(m)}
-                    member = EcflowSuiteFamily(name, eps, ecf_files, variables=variables)
-                    EcflowSuiteTask("Forecast", member, config, task_settings, ecf_files, input_template=template)
+                array_settings = task_settings.get_array_settings("EPS", ensmsel)
+                if array_settings is not None:
+                    member = EcflowSuiteMemberArray(
+                        ["Forecast"],
+                        ensmsel,
+                        eps,
+                        config,
+                        task_settings,
+                        ecf_files,
+                        cores_per_member=array_settings["cores_per_member"],
+                        input_template=template,
+                    )
+                else:
+                    for m in ensmsel:
+                        logger.debug("member %s", m)
+                        name = "mbr_%03d" % m
+                        args = "pert=" + str(m) + ";name=" + name
+                        logger.debug("args: %s", args)
+                        variables = {"ARGS": args, "ENSMBR": str(m)}
+                        member = EcflowSuiteFamily(name, eps, ecf_files, variables=variables)
+                        EcflowSuiteTask("Forecast", member, config, task_settings, ecf_files, input_template=template)
                 triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(forecast), EcflowSuiteTrigger(member)])
 
             EcflowSuiteTask(
@@ -798,34 +857,48 @@ class SurfexSuite:
                     #if config.get_value("general.arhive_ecfs") and (dtg + fgint).strftime("%w%H") == "000":
                     archive_ecfs = EcflowSuiteTask("ArchiveECFS", member, config, task_settings, ecf_files,input_template=template)
                     triggers = EcflowSuiteTriggers([EcflowSuiteTrigger(archive_ecfs), EcflowSuiteTrigger(member)])
+            pp_tasks = ["LogProgressPP"]
             if ((analysis is not None) and (config.get_value("assim.general.do_assim") == False)):
-                qc2obsmon = EcflowSuiteTask(
-                    "Qc2obsmon",
+                pp_tasks = ["Qc2obsmon", "LogProgressPP"]
+            if config.get_value("general.arhive_ecfs") and (dtg + fgint).strftime("%w%H") == "000":
+                archive_ecfs = EcflowSuiteTask("ArchiveECFS", pp_fam, config, task_settings, ecf_files,input_template=template)
+
+            if task_settings.bundle(pp_tasks):
+                EcflowSuiteBundle(
+                    pp_tasks,
                     pp_fam,
                     config,
                     task_settings,
                     ecf_files,
                     input_template=template,
                 )
-                trigger = EcflowSuiteTrigger(qc2obsmon)
-                log_pp_trigger = EcflowSuiteTriggers(trigger)
-            if config.get_value("general.arhive_ecfs") and (dtg + fgint).strftime("%w%H") == "000":
-                archive_ecfs = EcflowSuiteTask("ArchiveECFS", pp_fam, config, task_settings, ecf_files,input_template=template)
-
+            else:
+                if "Qc2obsmon" in pp_tasks:
+                    qc2obsmon = EcflowSuiteTask(
+                        "Qc2obsmon",
+                        pp_fam,
+                        config,
+                        task_settings,
+                        ecf_files,
+                        input_template=template,
+                    )
+                    trigger = EcflowSuiteTrigger(qc2obsmon)
+                    log_pp_trigger = EcflowSuiteTriggers(trigger)
 
-            EcflowSuiteTask(
-                "LogProgressPP",
-                pp_fam,
-                config,
-                task_settings,
-                ecf_files,
-                triggers=log_pp_trigger,
-                input_template=template,
-            )
+                EcflowSuiteTask(
+                    "LogProgressPP",
+                    pp_fam,
+                    config,
+                    task_settings,
+                    ecf_files,
+                    triggers=log_pp_trigger,
+                    input_template=template,
+                )
 
             prev_dtg = dtg
 
-        hours_behind = 24
+        # CycleInput may run hours_behind ahead of the PostProcessing it waits for
+        hours_behind = task_settings.get_pipeline_depth("CycleInput")
         for dtg in dtgs:
             dtg_str = datetime2ecflow(dtg)
             pp_dtg_str = datetime2ecflow(dtg - as_timedelta(f"PT{hours_behind}H"))
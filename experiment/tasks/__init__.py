@@ -1,41 +1,64 @@
-"""Experiment tasks module init file."""
-from .compilation import ConfigureOfflineBinaries, MakeOfflineBinaries
-from .forcing import Forcing
-from .gmtedsoil import Gmted, Soil
-from .surfex_binary_task import Forecast, PerturbedRun, Pgd, Prep, Soda, SurfexBinaryTask
-from .tasks import (
-    AbstractTask,
-    CycleFirstGuess,
-    FirstGuess,
-    FirstGuess4OI,
-    Oi2soda,
-    OptimalInterpolation,
-    PrepareCycle,
-    Qc2obsmon,
-    QualityControl,
-)
-
-__all__ = [
-    "MakeOfflineBinaries",
-    "ConfigureOfflineBinaries",
-    "Forcing",
-    "ModifyForcing",
-    "SurfexBinaryTask",
-    "Pgd",
-    "Prep",
-    "Soda",
-    "Forecast",
-    "PerturbedRun",
-    "AbstractTask",
-    "Dummy",
-    "Oi2soda",
-    "Qc2obsmon",
-    "QualityControl",
-    "OptimalInterpolation",
-    "FirstGuess",
-    "FirstGuess4OI",
-    "CycleFirstGuess",
-    "PrepareCycle",
-    "Soil",
-    "Gmted",
-]
+"""Experiment tasks module init file.
+
+Task classes are imported on first access so importing a single task module does not
+import all the others.
+"""
+import importlib
+
+_TASK_MODULES = {
+    "MakeOfflineBinaries": "compilation",
+    "ConfigureOfflineBinaries": "compilation",
+    "Forcing": "forcing",
+    "ModifyForcing": "forcing",
+    "SurfexBinaryTask": "surfex_binary_task",
+    "Pgd": "surfex_binary_task",
+    "Prep": "surfex_binary_task",
+    "Soda": "surfex_binary_task",
+    "Forecast": "surfex_binary_task",
+    "PerturbedRun": "surfex_binary_task",
+    "AbstractTask": "tasks",
+    "Dummy": "tasks",
+    "Oi2soda": "tasks",
+    "Qc2obsmon": "tasks",
+    "QualityControl": "tasks",
+    "OptimalInterpolation": "tasks",
+    "FirstGuess": "tasks",
+    "FirstGuess4OI": "tasks",
+    "CycleFirstGuess": "tasks",
+    "PrepareCycle": "tasks",
+    "Soil": "gmtedsoil",
+    "Gmted": "gmtedsoil",
+}
+
+__all__ = list(_TASK_MODULES)
+
+
+def __getattr__(name):
+    """Import task classes on first access.
+
+    Args:
+        name (str): Attribute name
+
+    Raises:
+        AttributeError: If the attribute does not exist
+
+    Returns:
+        type: The task class
+
+    """
+    if name not in _TASK_MODULES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module = importlib.import_module(f".{_TASK_MODULES[name]}", __name__)
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    """List the module attributes including the lazily imported task classes.
+
+    Returns:
+        list: Attribute names
+
+    """
+    return sorted(list(globals()) + __all__)
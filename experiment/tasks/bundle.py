@@ -0,0 +1,82 @@
+"""Bundle of tasks run in one job."""
+
+from ..logs import logger
+from .discover_tasks import get_task
+from .tasks import AbstractTask
+
+
+class Bundle(AbstractTask):
+    """Run a sequence of small tasks in the same job.
+
+    The tasks are read from task.bundle in the order they should be executed.
+    Progress is reported to the scheduler with the label "task" and an event per
+    finished task.
+
+    Args:
+        AbstractTask (AbstractTask): Base class
+    """
+
+    def __init__(self, config):
+        """Construct the Bundle task.
+
+        Args:
+            config (ParsedObject): Parsed configuration
+
+        """
+        AbstractTask.__init__(self, config, "Bundle")
+        try:
+            tasks = self.config.get_value("task.bundle")
+        except AttributeError:
+            tasks = []
+        if isinstance(tasks, str):
+            tasks = [task for task in tasks.split(":") if task != ""]
+        self.tasks = list(tasks)
+
+    def run(self):
+        """Override run. The bundled tasks handle their own working directories."""
+        self.execute()
+
+    def execute(self):
+        """Execute the bundled tasks in order.
+
+        Raises:
+            Exception: Re-raised from the failing task after updating the label.
+
+        """
+        if len(self.tasks) == 0:
+            logger.warning("No tasks to run in bundle")
+            return
+
+        for task_name in self.tasks:
+            logger.info("Running bundled task {}", task_name)
+            self.report_label(task_name)
+            try:
+                task = get_task(task_name, self.config)
+                task.scheduler_client = self.scheduler_client
+                task.run()
+            except Exception:
+                self.report_label(f"{task_name} failed")
+                raise
+            self.report_event(task_name)
+            logger.info("Finished bundled task {}", task_name)
+        self.report_label("")
+
+    def report_label(self, text):
+        """Update the task label if running from a scheduler.
+
+        Args:
+            text (str): Label text
+
+        """
+        if self.scheduler_client is not None:
+            self.scheduler_client.label("task", text)
+
+    def report_event(self, task_name):
+        """Set the event for a finished task if running from a scheduler.
+
+        Args:
+            task_name (str): Name of the finished task
+
+        """
+        if self.scheduler_client is not None:
+            self.scheduler_client.event(task_name)
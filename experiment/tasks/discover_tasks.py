@@ -1,6 +1,8 @@
 """Discover tasks."""
+import ast
 import importlib
 import inspect
+import json
 import os
 import pkgutil
 import sys
@@ -9,6 +11,11 @@ from .. import tasks
 from ..logs import logger
 from .tasks import AbstractTask
 
+TASK_MANIFEST = os.path.join(os.path.dirname(__file__), "task_manifest.json")
+PLUGIN_MANIFEST = ".task_manifest.json"
+# Loaded task manifest of the experiment.tasks package
+_TASK_MANIFEST = None
+
 
 def discover_modules(package, what="plugin"):
     """Discover plugin modules.
@@ -60,42 +67,220 @@ def _get_name(cname, cls, suffix, attrname="__plugin_name__"):
     return name
 
 
-def get_task(name, config):
-    """Create a `AbstractTask` object from configuration.
+def scan_task_classes(path, module_prefix, known_tasks=None):
+    """Find task classes in the source files of a package without importing them.
+
+    A class is a task if it derives from AbstractTask or from one of the known task
+    classes, directly or through other classes in the package.
 
     Args:
-        name (str): _description_
-        config (ParsedConfig): _description_
+        path (str): Package directory
+        module_prefix (str): Module name prefix, e.g. "experiment.tasks."
+        known_tasks (set, optional): Names of task classes defined elsewhere.
+                                     Defaults to None.
 
     Returns:
-        AbstractTask: The task object
+        dict: Module and class name for each task name
 
     """
-    task_name = name.lower()
-    plugin_namespace = None
-    plugin_namespace_location = (
-        f"{config.get_value('system.exp_dir')}/experiment_plugin_tasks"
+    task_classes = {"AbstractTask"}
+    if known_tasks is not None:
+        task_classes.update(known_tasks)
+
+    classes = []
+    for fname in sorted(os.listdir(path)):
+        if not fname.endswith(".py") or fname.startswith("__"):
+            continue
+        with open(os.path.join(path, fname), mode="r", encoding="utf-8") as fhandler:
+            tree = ast.parse(fhandler.read(), filename=fname)
+        module = module_prefix + fname[:-3]
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef):
+                continue
+            bases = set()
+            for base in node.bases:
+                if isinstance(base, ast.Name):
+                    bases.add(base.id)
+                elif isinstance(base, ast.Attribute):
+                    bases.add(base.attr)
+            type_name = None
+            for stmt in node.body:
+                if (
+                    isinstance(stmt, ast.Assign)
+                    and len(stmt.targets) == 1
+                    and isinstance(stmt.targets[0], ast.Name)
+                    and stmt.targets[0].id == "__type_name__"
+                    and isinstance(stmt.value, ast.Constant)
+                ):
+                    type_name = stmt.value.value
+            classes.append((module, node.name, bases, type_name))
+
+    found = True
+    while found:
+        found = False
+        for __, cname, bases, __ in classes:
+            if cname not in task_classes and len(bases & task_classes) > 0:
+                task_classes.add(cname)
+                found = True
+
+    manifest = {}
+    for module, cname, bases, type_name in classes:
+        if cname == "AbstractTask" or len(bases & task_classes) == 0:
+            continue
+        tname = type_name
+        if tname is None:
+            tname = _get_name(cname, None, AbstractTask.__name__.lower())
+        if tname in manifest:
+            logger.warning("Task type {} is defined more than once", tname)
+            continue
+        manifest[tname] = {"module": module, "class": cname}
+    return manifest
+
+
+def build_manifest():
+    """Build the task manifest of the experiment.tasks package.
+
+    Returns:
+        dict: Module and class name for each task name
+
+    """
+    return scan_task_classes(tasks.__path__[0], tasks.__name__ + ".")
+
+
+def write_manifest(filename=TASK_MANIFEST):
+    """Write the task manifest of the experiment.tasks package.
+
+    Args:
+        filename (str, optional): Manifest file. Defaults to TASK_MANIFEST.
+
+    """
+    with open(filename, mode="w", encoding="utf-8") as fhandler:
+        json.dump(build_manifest(), fhandler, indent=2, sort_keys=True)
+        fhandler.write("\n")
+    logger.info("Wrote task manifest {}", filename)
+
+
+def load_manifest():
+    """Load the task manifest of the experiment.tasks package.
+
+    Returns:
+        dict: Module and class name for each task name. Empty if no manifest exists.
+
+    """
+    global _TASK_MANIFEST  # noqa PLW0603
+    if _TASK_MANIFEST is None:
+        try:
+            with open(TASK_MANIFEST, mode="r", encoding="utf-8") as fhandler:
+                _TASK_MANIFEST = json.load(fhandler)
+        except (OSError, ValueError) as exc:
+            logger.warning("Could not read task manifest: {}", repr(exc))
+            _TASK_MANIFEST = {}
+    return _TASK_MANIFEST
+
+
+def load_plugin_manifest(plugin_dir):
+    """Get the manifest of the plugin tasks of an experiment.
+
+    The manifest is cached in the plugin directory and rebuilt when a plugin source
+    file is added, removed or modified.
+
+    Args:
+        plugin_dir (str): Plugin directory
+
+    Returns:
+        dict: Module and class name for each task name
+
+    """
+    sources = {
+        fname: os.stat(os.path.join(plugin_dir, fname)).st_mtime_ns
+        for fname in sorted(os.listdir(plugin_dir))
+        if fname.endswith(".py")
+    }
+    cache_file = os.path.join(plugin_dir, PLUGIN_MANIFEST)
+    try:
+        with open(cache_file, mode="r", encoding="utf-8") as fhandler:
+            cached = json.load(fhandler)
+        if cached["sources"] == sources:
+            return cached["tasks"]
+    except (OSError, ValueError, KeyError):
+        pass
+
+    logger.info("Scanning plugin tasks in {}", plugin_dir)
+    known_tasks = {entry["class"] for entry in load_manifest().values()}
+    manifest = scan_task_classes(
+        plugin_dir, os.path.basename(plugin_dir) + ".", known_tasks=known_tasks
     )
-    if os.path.exists(plugin_namespace_location):
-        logger.info("Using local plugin directory {}", plugin_namespace_location)
-        sys.path.insert(0, config.system.exp_dir)
+    try:
+        with open(cache_file, mode="w", encoding="utf-8") as fhandler:
+            json.dump({"sources": sources, "tasks": manifest}, fhandler, indent=2)
+    except OSError as exc:
+        logger.warning("Could not cache plugin manifest: {}", repr(exc))
+    return manifest
+
+
+def find_task_class(name, exp_dir=None):
+    """Find a task class, importing only the module defining it.
+
+    Plugin tasks in the experiment directory take precedence. Tasks missing in the
+    manifests are looked up by importing all task modules.
+
+    Args:
+        name (str): Task name
+        exp_dir (str, optional): Experiment directory with plugins. Defaults to None.
+
+    Raises:
+        KeyError: If the task is not found
+
+    Returns:
+        type: The task class
+
+    """
+    task_name = name.lower()
+    plugin_dir = None
+    if exp_dir is not None:
+        plugin_dir = f"{exp_dir}/experiment_plugin_tasks"
+        if os.path.exists(plugin_dir):
+            logger.info("Using local plugin directory {}", plugin_dir)
+            if exp_dir not in sys.path:
+                sys.path.insert(0, exp_dir)
+            entry = load_plugin_manifest(plugin_dir).get(task_name)
+            if entry is not None:
+                module = importlib.import_module(entry["module"])
+                return getattr(module, entry["class"])
+        else:
+            plugin_dir = None
+
+    entry = load_manifest().get(task_name)
+    if entry is not None:
+        module = importlib.import_module(entry["module"])
+        return getattr(module, entry["class"])
+
+    logger.warning("Task {} is not in the task manifest. Discover all tasks.", name)
+    if plugin_dir is not None:
         import experiment_plugin_tasks as plugin_namespace  # noqa
 
-    known_types = discover(tasks, AbstractTask, attrname="__type_name__")
-    logger.debug("Available task types: {}", ", ".join(known_types.keys()))
-    plugin_known_types = {}
-    if plugin_namespace is not None:
         plugin_known_types = discover(
             plugin_namespace, AbstractTask, attrname="__type_name__"
         )
-        logger.debug(
-            "Available plugin task types: {}", ", ".join(plugin_known_types.keys())
-        )
+        if task_name in plugin_known_types:
+            return plugin_known_types[task_name]
+    known_types = discover(tasks, AbstractTask, attrname="__type_name__")
+    logger.debug("Available task types: {}", ", ".join(known_types.keys()))
+    return known_types[task_name]
 
-    if task_name in plugin_known_types:
-        cls = plugin_known_types[task_name]
-    else:
-        cls = known_types[task_name]
+
+def get_task(name, config):
+    """Create a `AbstractTask` object from configuration.
+
+    Args:
+        name (str): _description_
+        config (ParsedConfig): _description_
+
+    Returns:
+        AbstractTask: The task object
+
+    """
+    cls = find_task_class(name, exp_dir=config.get_value("system.exp_dir"))
     task = cls(config)
     logger.debug("Created %r for {}", task, name)
     return task
@@ -142,3 +327,7 @@ def discover(package, base, attrname="__plugin_name__"):
                 continue
             discovered[tname] = cls
     return discovered
+
+
+if __name__ == "__main__":
+    write_manifest()
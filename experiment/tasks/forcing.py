@@ -2,12 +2,487 @@
 import json
 import os
 
+import numpy as np
 import yaml
-from pysurfex.forcing import modify_forcing, run_time_loop, set_forcing_config
+from netCDF4 import Dataset
+from pysurfex.forcing import run_time_loop, set_forcing_config
 
+from ..datetime_utils import as_datetime, as_timedelta
+from ..definitions import load_definitions
+from ..file_links import link_or_copy, unshare_file
+from ..grib_inventory import indexed_grib_reads
+from ..interpolation_cache import interpolation_cache
 from ..logs import logger
+from ..scheduler.scheduler import EcflowTask
+from ..suites import forcing_task_path
+from ..tasks.task_array import run_in_pool
 from ..tasks.tasks import AbstractTask
 
+# Variables modify_cycle_forcing takes from the previous cycle
+MODIFIED_VARIABLES = ["LWdown", "DIR_SWdown", "SCA_SWdown"]
+
+# Per member forcing layer with the variables differing from the shared forcing
+LAYER_FILE = "FORCING_layer.nc"
+
+
+def forcing_encoding(config):
+    """Get the netCDF layout of the forcing files.
+
+    Args:
+        config (ParsedConfig): Parsed config
+
+    Returns:
+        dict: The forcing.encoding settings. None if the default layout is used.
+
+    """
+    encoding = config.get_value("forcing.encoding", None)
+    if encoding is None:
+        return None
+    encoding = encoding.dict()
+    if not (
+        encoding.get("zlib")
+        or encoding.get("chunk_time")
+        or encoding.get("chunk_points")
+        or encoding.get("least_significant_digit")
+    ):
+        return None
+    return encoding
+
+
+def _variable_encoding(var, ntimes, encoding):
+    """Get the createVariable arguments for the layout of a forcing variable.
+
+    Args:
+        var (netCDF4.Variable): Variable to copy
+        ntimes (int): Number of time steps in the new file
+        encoding (dict): Forcing file layout, see forcing_encoding
+
+    Returns:
+        dict: Arguments to createVariable
+
+    """
+    if encoding is None or len(var.dimensions) == 0:
+        return {}
+    kwargs = {}
+    if encoding.get("zlib"):
+        kwargs.update(
+            {
+                "zlib": True,
+                "complevel": int(encoding.get("complevel", 4)),
+                "shuffle": bool(encoding.get("shuffle", True)),
+            }
+        )
+    chunk_time = int(encoding.get("chunk_time", 0))
+    chunk_points = int(encoding.get("chunk_points", 0))
+    if chunk_time > 0 or chunk_points > 0:
+        chunksizes = []
+        for dim, size in zip(var.dimensions, var.shape):
+            if dim == "time":
+                size = ntimes
+                chunk = chunk_time
+            else:
+                chunk = chunk_points
+            chunksizes.append(max(1, min(chunk, size) if chunk > 0 else size))
+        kwargs.update({"chunksizes": tuple(chunksizes)})
+    digits = encoding.get("least_significant_digit", {}).get(var.name)
+    if digits is not None and var.dtype.kind == "f":
+        kwargs.update({"least_significant_digit": int(digits)})
+    return kwargs
+
+
+def _forcing_file_format(src, encoding):
+    """Get the netCDF format of a new forcing file.
+
+    Args:
+        src (netCDF4.Dataset): Forcing file to copy the structure from
+        encoding (dict): Forcing file layout, see forcing_encoding
+
+    Returns:
+        str: netCDF format. Chunking and compression need netCDF4.
+
+    """
+    if encoding is not None and src.file_format.startswith("NETCDF3"):
+        return "NETCDF4_CLASSIC"
+    return src.file_format
+
+
+def _create_forcing_file(src, dst, ntimes, encoding=None, variables=None):
+    """Create the dimensions and variables of a forcing file like another one.
+
+    Args:
+        src (netCDF4.Dataset): Forcing file to copy the structure from
+        dst (netCDF4.Dataset): New forcing file
+        ntimes (int): Number of time steps in the new file
+        encoding (dict, optional): Forcing file layout, see forcing_encoding.
+                                   Defaults to None.
+        variables (list, optional): Variables to create. Defaults to None, all.
+
+    """
+    dst.setncatts({attr: src.getncattr(attr) for attr in src.ncattrs()})
+    for name, dim in src.dimensions.items():
+        size = ntimes if name == "time" else len(dim)
+        dst.createDimension(name, None if dim.isunlimited() else size)
+    for name, var in src.variables.items():
+        if variables is not None and name not in variables:
+            continue
+        fill_value = None
+        if "_FillValue" in var.ncattrs():
+            fill_value = var.getncattr("_FillValue")
+        out_var = dst.createVariable(
+            name,
+            var.datatype,
+            var.dimensions,
+            fill_value=fill_value,
+            **_variable_encoding(var, ntimes, encoding),
+        )
+        out_var.setncatts(
+            {attr: var.getncattr(attr) for attr in var.ncattrs() if attr != "_FillValue"}
+        )
+
+
+def _time_index(var, first, last):
+    """Get the index selecting time steps of a variable.
+
+    Args:
+        var (netCDF4.Variable): Variable
+        first (int): First time step
+        last (int): Last time step, included
+
+    Returns:
+        tuple: Index
+
+    """
+    return tuple(
+        slice(first, last + 1) if dim == "time" else slice(None) for dim in var.dimensions
+    )
+
+
+def split_forcing_file(input_file, parts, encoding=None):
+    """Split a netCDF forcing file in time.
+
+    The time axis of each part is relative to its first time step.
+
+    Args:
+        input_file (str): Forcing file to split
+        parts (list): Tuples of (first, last, basetime, output_file). The time steps
+                      from first to last, both included, are written to output_file
+                      with times relative to basetime.
+        encoding (dict, optional): Layout of the parts, see forcing_encoding.
+                                   Defaults to None.
+
+    """
+    with Dataset(input_file, mode="r") as src:
+        for first, last, basetime, output_file in parts:
+            logger.info("Write time steps {}-{} to {}", first, last, output_file)
+            tmp_output_file = f"{output_file}.tmp{os.getpid()}"
+            file_format = _forcing_file_format(src, encoding)
+            with Dataset(tmp_output_file, mode="w", format=file_format) as dst:
+                _create_forcing_file(src, dst, last - first + 1, encoding)
+                for name, var in src.variables.items():
+                    out_var = dst[name]
+                    if "time" not in var.dimensions:
+                        out_var[...] = var[...]
+                        continue
+                    values = var[_time_index(var, first, last)]
+                    if name == "time":
+                        values = values - values[0]
+                        out_var.units = (
+                            f"hours since {basetime.strftime('%Y-%m-%d %H')}:00:00 0:00"
+                        )
+                    out_var[...] = values
+            os.replace(tmp_output_file, output_file)
+
+
+def concat_forcing_files(input_files, output_file, offsets, encoding=None):
+    """Concatenate netCDF forcing files in time.
+
+    Each file after the first starts with the last time step of the previous file,
+    which is only written once. The times refer to the time units of the first file.
+
+    Args:
+        input_files (list): Forcing files in time order
+        output_file (str): Concatenated forcing file
+        offsets (list): Hours from the time reference of the first file to the time
+                        reference of each file
+        encoding (dict, optional): Layout of the output, see forcing_encoding.
+                                   Defaults to None.
+
+    """
+    ntimes = []
+    for ifile, input_file in enumerate(input_files):
+        with Dataset(input_file, mode="r") as src:
+            ntimes.append(len(src.dimensions["time"]) - min(ifile, 1))
+
+    tmp_output_file = f"{output_file}.tmp{os.getpid()}"
+    with Dataset(input_files[0], mode="r") as src, Dataset(
+        tmp_output_file, mode="w", format=_forcing_file_format(src, encoding)
+    ) as dst:
+        _create_forcing_file(src, dst, sum(ntimes), encoding)
+        offset = 0
+        for ifile, input_file in enumerate(input_files):
+            logger.info("Append {} time steps from {}", ntimes[ifile], input_file)
+            first = min(ifile, 1)
+            last = first + ntimes[ifile] - 1
+            with Dataset(input_file, mode="r") as part:
+                for name, var in part.variables.items():
+                    if "time" not in var.dimensions:
+                        if ifile == 0:
+                            dst[name][...] = var[...]
+                        continue
+                    values = var[_time_index(var, first, last)]
+                    if name == "time":
+                        values = values + offsets[ifile]
+                    out_var = dst[name]
+                    out_var[_time_index(out_var, offset, offset + ntimes[ifile] - 1)] = (
+                        values
+                    )
+            offset += ntimes[ifile]
+    os.replace(tmp_output_file, output_file)
+
+
+def repack_forcing_file(input_file, output_file, encoding, block_steps=24):
+    """Write a forcing file with another netCDF layout.
+
+    Args:
+        input_file (str): Forcing file
+        output_file (str): Forcing file with the new layout
+        encoding (dict): Layout of the output, see forcing_encoding
+        block_steps (int, optional): Time steps copied at once. Defaults to 24.
+
+    """
+    tmp_output_file = f"{output_file}.tmp{os.getpid()}"
+    with Dataset(input_file, mode="r") as src, Dataset(
+        tmp_output_file, mode="w", format=_forcing_file_format(src, encoding)
+    ) as dst:
+        ntimes = len(src.dimensions["time"])
+        _create_forcing_file(src, dst, ntimes, encoding)
+        for name, var in src.variables.items():
+            out_var = dst[name]
+            if "time" not in var.dimensions:
+                out_var[...] = var[...]
+                continue
+            for first in range(0, ntimes, block_steps):
+                last = min(first + block_steps, ntimes) - 1
+                out_var[_time_index(out_var, first, last)] = var[
+                    _time_index(var, first, last)
+                ]
+    os.replace(tmp_output_file, output_file)
+
+
+def patch_forcing_file(
+    input_file,
+    output_file,
+    variables,
+    input_first=-1,
+    output_first=0,
+    nsteps=1,
+    block_steps=24,
+):
+    """Patch time steps of forcing variables in place from another forcing file.
+
+    The time steps are copied as slices in blocks of block_steps time steps, so
+    neither file is rewritten or read as a whole.
+
+    Args:
+        input_file (str): Forcing file to copy from
+        output_file (str): Forcing file to patch
+        variables (list): Variables to patch
+        input_first (int, optional): First time step to copy. Negative values count
+                                     from the end. Defaults to -1.
+        output_first (int, optional): First time step to patch. Defaults to 0.
+        nsteps (int, optional): Number of time steps. Defaults to 1.
+        block_steps (int, optional): Time steps copied at once. Defaults to 24.
+
+    """
+    if unshare_file(output_file):
+        logger.info("Unshared hardlinked {} before patching it", output_file)
+    with Dataset(input_file, mode="r") as src, Dataset(output_file, mode="r+") as dst:
+        if input_first < 0:
+            input_first += len(src.dimensions["time"])
+        for name in variables:
+            logger.info(
+                "Patch {} time steps of {} in {} from {}",
+                nsteps,
+                name,
+                output_file,
+                input_file,
+            )
+            src_var = src[name]
+            dst_var = dst[name]
+            for offset in range(0, nsteps, block_steps):
+                count = min(block_steps, nsteps - offset)
+                src_first = input_first + offset
+                dst_first = output_first + offset
+                dst_var[_time_index(dst_var, dst_first, dst_first + count - 1)] = src_var[
+                    _time_index(src_var, src_first, src_first + count - 1)
+                ]
+
+
+def _same_values(values, other_values):
+    """Check if two blocks of a forcing variable are identical.
+
+    Args:
+        values (np.ndarray): Values
+        other_values (np.ndarray): Other values
+
+    Returns:
+        bool: True if the values and masks are identical
+
+    """
+    return np.array_equal(
+        np.ma.getmaskarray(values), np.ma.getmaskarray(other_values)
+    ) and np.array_equal(
+        np.ma.getdata(values),
+        np.ma.getdata(other_values),
+        equal_nan=np.asarray(values).dtype.kind == "f",
+    )
+
+
+def write_forcing_layer(
+    base_file, member_file, layer_file, encoding=None, block_steps=24
+):
+    """Write the variables of a member forcing differing from a shared forcing.
+
+    The layer refers to the shared forcing file, and merge_forcing_layer creates the
+    member forcing from the two.
+
+    Args:
+        base_file (str): Shared forcing file
+        member_file (str): Forcing file of the member
+        layer_file (str): Forcing layer of the member
+        encoding (dict, optional): Layout of the layer, see forcing_encoding.
+                                   Defaults to None.
+        block_steps (int, optional): Time steps compared at once. Defaults to 24.
+
+    Returns:
+        list: Variables in the layer
+
+    """
+    tmp_layer_file = f"{layer_file}.tmp{os.getpid()}"
+    with Dataset(base_file, mode="r") as base, Dataset(member_file, mode="r") as src:
+        ntimes = len(src.dimensions["time"])
+        if len(base.dimensions["time"]) != ntimes:
+            raise RuntimeError(f"{member_file} and {base_file} differ in time")
+        variables = []
+        for name, var in src.variables.items():
+            if name == "time" or "time" not in var.dimensions:
+                continue
+            for first in range(0, ntimes, block_steps):
+                last = min(first + block_steps, ntimes) - 1
+                if not _same_values(
+                    var[_time_index(var, first, last)],
+                    base[name][_time_index(base[name], first, last)],
+                ):
+                    variables.append(name)
+                    break
+
+        with Dataset(
+            tmp_layer_file, mode="w", format=_forcing_file_format(src, encoding)
+        ) as dst:
+            _create_forcing_file(src, dst, ntimes, encoding, variables=variables)
+            dst.setncattr("forcing_base", os.path.abspath(base_file))
+            for name in variables:
+                var = src[name]
+                for first in range(0, ntimes, block_steps):
+                    last = min(first + block_steps, ntimes) - 1
+                    dst[name][_time_index(dst[name], first, last)] = var[
+                        _time_index(var, first, last)
+                    ]
+    os.replace(tmp_layer_file, layer_file)
+    logger.info("Wrote forcing layer {} with {}", layer_file, variables)
+    return variables
+
+
+def merge_forcing_layer(layer_file, output_file, block_steps=24):
+    """Create a member forcing from the shared forcing and the layer of the member.
+
+    The shared forcing is cloned or copied and the variables of the layer are
+    patched in place.
+
+    Args:
+        layer_file (str): Forcing layer written by write_forcing_layer
+        output_file (str): Forcing file of the member
+        block_steps (int, optional): Time steps copied at once. Defaults to 24.
+
+    """
+    with Dataset(layer_file, mode="r") as layer:
+        base_file = layer.getncattr("forcing_base")
+        ntimes = len(layer.dimensions["time"])
+        variables = [name for name in layer.variables if name != "time"]
+    link_or_copy(base_file, output_file, hardlink=False)
+    patch_forcing_file(
+        layer_file,
+        output_file,
+        variables,
+        input_first=0,
+        nsteps=ntimes,
+        block_steps=block_steps,
+    )
+
+
+def modify_cycle_forcing(platform, basetime, cycle_length):
+    """Start the radiation of a cycle from the end of the previous cycle.
+
+    Args:
+        platform (Platform): Platform with the forcing_dir pattern
+        basetime (datetime): Cycle basetime
+        cycle_length (timedelta): Cycle length
+
+    """
+    forcing_dir = platform.config.get_value("system.forcing_dir")
+    input_dir = platform.substitute(forcing_dir, basetime=basetime - cycle_length)
+    input_file = os.path.join(input_dir, "FORCING.nc")
+    output_dir = platform.substitute(forcing_dir, basetime=basetime)
+    output_file = os.path.join(output_dir, "FORCING.nc")
+    logger.debug("modify forcing {} from {}", output_file, input_file)
+    if os.path.exists(output_file) and os.path.exists(input_file):
+        patch_forcing_file(input_file, output_file, MODIFIED_VARIABLES)
+    else:
+        logger.info("Output or input is missing: {} {}", output_file, input_file)
+
+
+def forcing_chunks(dtg_start, dtg_stop, chunk_hours):
+    """Split a forcing period in time chunks.
+
+    Consecutive chunks share their boundary time step.
+
+    Args:
+        dtg_start (datetime): First time step
+        dtg_stop (datetime): Last time step
+        chunk_hours (int): Length of the chunks in hours. 0 gives one chunk.
+
+    Returns:
+        list: Tuples of (first, last) time step of each chunk
+
+    """
+    if chunk_hours <= 0:
+        return [(dtg_start, dtg_stop)]
+    chunk_length = as_timedelta(f"PT{int(chunk_hours)}H")
+    chunks = []
+    first = dtg_start
+    while first < dtg_stop:
+        last = min(first + chunk_length, dtg_stop)
+        chunks.append((first, last))
+        first = last
+    return chunks
+
+
+def create_forcing(kwargs, weights_dir=None):
+    """Create a forcing file.
+
+    Used in the pool workers, which each set up their own input readers. GRIB
+    fields are read with the inventories written by PrefetchMars.
+
+    Args:
+        kwargs (dict): Arguments to set_forcing_config
+        weights_dir (str, optional): Directory with cached interpolation weights.
+                                     Defaults to None.
+
+    """
+    with interpolation_cache(weights_dir), indexed_grib_reads():
+        options, var_objs, att_objs = set_forcing_config(**kwargs)
+        run_time_loop(options, var_objs, att_objs)
+
 
 class Forcing(AbstractTask):
     """Create forcing task."""
@@ -27,12 +502,22 @@ class Forcing(AbstractTask):
         except AttributeError:
             user_config = None
         self.user_config = user_config
+        self.output_format = self.config.get_value(
+            "SURFEX.IO.CFORCING_FILETYPE"
+        ).lower()
+        self.encoding = forcing_encoding(self.config)
 
-    def execute(self):
-        """Execute the forcing task.
+    def forcing_kwargs(self, dtg_start, dtg_stop, output):
+        """Get the arguments to set up the forcing generation.
+
+        Args:
+            dtg_start (datetime): First time step
+            dtg_stop (datetime): Last time step
+            output (str): Output file
+
+        Returns:
+            dict: Arguments to set_forcing_config
 
-        Raises:
-            NotImplementedError: _description_
         """
         kwargs = {}
         if self.user_config is not None:
@@ -46,26 +531,13 @@ class Forcing(AbstractTask):
         with open(self.wdir + "/domain.json", mode="w", encoding="utf-8") as file_handler:
             json.dump(domain_json, file_handler, indent=2)
         kwargs.update({"domain": self.wdir + "/domain.json"})
-        global_config = self.platform.get_system_value("config_yml")
-        with open(global_config, mode="r", encoding="utf-8") as file_handler:
-            global_config = yaml.safe_load(file_handler)
+        global_config = load_definitions(self.platform.get_system_value("config_yml"))
         kwargs.update({"config": global_config})
 
-        kwargs.update({"dtg_start": self.dtg.strftime("%Y%m%d%H")})
-        kwargs.update({"dtg_stop": (self.dtg + self.fcint).strftime("%Y%m%d%H")})
-
-        forcing_dir = self.platform.get_system_value("forcing_dir")
-        forcing_dir = self.platform.substitute(forcing_dir, basetime=self.dtg)
-        os.makedirs(forcing_dir, exist_ok=True)
-
-        output_format = self.config.get_value("SURFEX.IO.CFORCING_FILETYPE").lower()
-        if output_format == "netcdf":
-            output = forcing_dir + "/FORCING.nc"
-        else:
-            raise NotImplementedError(output_format)
-
+        kwargs.update({"dtg_start": dtg_start.strftime("%Y%m%d%H")})
+        kwargs.update({"dtg_stop": dtg_stop.strftime("%Y%m%d%H")})
         kwargs.update({"of": output})
-        kwargs.update({"output_format": output_format})
+        kwargs.update({"output_format": self.output_format})
 
         pattern = self.config.get_value("forcing.pattern").replace("@sfx_exp_data@", 
                     self.config.get_value("system.sfx_exp_data"))
@@ -115,37 +587,152 @@ class Forcing(AbstractTask):
         kwargs.update({"timestep": timestep})
         kwargs.update({"analysis": analysis})
         kwargs.update({"interpolation": interpolation})
+        return kwargs
+
+    def generate(self, dtg_start, dtg_stop, output, encoding=None):
+        """Generate forcing, in parallel time chunks if configured.
+
+        The chunks of forcing.chunk_hours hours are created by forcing.workers
+        workers and concatenated in time order.
+
+        Args:
+            dtg_start (datetime): First time step
+            dtg_stop (datetime): Last time step
+            output (str): Output file
+            encoding (dict, optional): Layout of the output, see forcing_encoding.
+                                       Defaults to None.
+
+        Raises:
+            RuntimeError: If any of the chunks failed
+
+        """
+        chunk_hours = int(self.config.get_value("forcing.chunk_hours", 0))
+        chunks = forcing_chunks(dtg_start, dtg_stop, chunk_hours)
+        weights_dir = self.platform.get_system_value("climdir")
+        if self.output_format != "netcdf":
+            encoding = None
+        if len(chunks) == 1 or self.output_format != "netcdf":
+            raw_output = output if encoding is None else f"{self.wdir}/FORCING_raw.nc"
+            create_forcing(
+                self.forcing_kwargs(dtg_start, dtg_stop, raw_output), weights_dir
+            )
+            if encoding is not None:
+                repack_forcing_file(raw_output, output, encoding)
+                os.remove(raw_output)
+            return
+
+        workers = int(self.config.get_value("forcing.workers", 0))
+        chunk_files = [
+            f"{self.wdir}/FORCING_chunk{ichunk:03d}.nc" for ichunk in range(len(chunks))
+        ]
+        jobs = {
+            ichunk: (self.forcing_kwargs(first, last, chunk_files[ichunk]), weights_dir)
+            for ichunk, (first, last) in enumerate(chunks)
+        }
+        logger.info("Create forcing in {} chunks of {}h", len(chunks), chunk_hours)
+        failed = run_in_pool(create_forcing, jobs, max_workers=workers or None)
+        if len(failed) > 0:
+            raise RuntimeError(f"Forcing failed for chunks {sorted(failed)}")
+        offsets = [(first - dtg_start).total_seconds() / 3600 for first, __ in chunks]
+        concat_forcing_files(chunk_files, output, offsets, encoding)
+        for chunk_file in chunk_files:
+            os.remove(chunk_file)
+
+    def forcing_file(self, basetime):
+        """Get the forcing file for a cycle.
+
+        Args:
+            basetime (datetime): Cycle basetime
+
+        Raises:
+            NotImplementedError: Output format is not supported
+
+        Returns:
+            str: Forcing file
+
+        """
+        forcing_dir = self.config.get_value("system.forcing_dir")
+        forcing_dir = self.platform.substitute(forcing_dir, basetime=basetime)
+        os.makedirs(forcing_dir, exist_ok=True)
+        if self.output_format == "netcdf":
+            return os.path.join(forcing_dir, "FORCING.nc")
+        raise NotImplementedError(self.output_format)
+
+    def catchup_cycles(self):
+        """Get the cycles to create forcing for in this task.
+
+        In catch-up mode forcing is created for up to forcing.catchup_cycles
+        consecutive cycles, but not beyond the end of the experiment.
+
+        Returns:
+            list: Basetimes of the cycles
+
+        """
+        ncycles = int(self.config.get_value("forcing.catchup_cycles", 1))
+        if ncycles > 1 and self.config.get_value("forcing.modify_forcing"):
+            logger.warning("Catch-up mode is not used together with modify_forcing")
+            ncycles = 1
+        endtime = as_datetime(self.config.get_value("general.times.end"))
+        cycles = [self.dtg]
+        while len(cycles) < ncycles and cycles[-1] + self.fcint <= endtime:
+            cycles.append(cycles[-1] + self.fcint)
+        return cycles
+
+    def complete_catchup_tasks(self, cycles):
+        """Set the Forcing tasks of cycles created by this task complete.
+
+        Args:
+            cycles (list): Basetimes of the cycles
+
+        """
+        if self.scheduler_client is None:
+            return
+        suite_name = self.scheduler_client.task.ecf_families[0]
+        for cycle in cycles:
+            task = EcflowTask(forcing_task_path(suite_name, cycle), 1, "", None)
+            logger.info("Set {} complete", task.ecf_name)
+            self.scheduler_client.server.force_complete(task)
+
+    def execute(self):
+        """Execute the forcing task.
+
+        In catch-up mode only the cycles without forcing are created. If more than
+        one is missing, the forcing from the first to the last missing cycle is
+        created at once and split per cycle.
+
+        """
+        cycles = self.catchup_cycles()
+        outputs = [self.forcing_file(cycle) for cycle in cycles]
+        missing = []
+        for icycle, output in enumerate(outputs):
+            if os.path.exists(output):
+                logger.info("Output already exists: {}", output)
+            else:
+                missing.append(icycle)
+
+        if len(missing) == 1:
+            cycle = cycles[missing[0]]
+            self.generate(cycle, cycle + self.fcint, outputs[missing[0]], self.encoding)
+        elif len(missing) > 1:
+            logger.info("Create forcing for {} cycles", len(missing))
+            catchup_output = f"{self.wdir}/FORCING_catchup.nc"
+            self.generate(
+                cycles[missing[0]], cycles[missing[-1]] + self.fcint, catchup_output
+            )
+
+            timestep = self.config.get_value("forcing.timestep")
+            nsteps = int(self.fcint.total_seconds() // timestep)
+            parts = []
+            for icycle in missing:
+                first = (icycle - missing[0]) * nsteps
+                parts.append((first, first + nsteps, cycles[icycle], outputs[icycle]))
+            split_forcing_file(catchup_output, parts, self.encoding)
+            os.remove(catchup_output)
+        self.complete_catchup_tasks(cycles[1:])
 
-        if os.path.exists(output):
-            logger.info("Output already exists: {}", output)
-        else:
-            options, var_objs, att_objs = set_forcing_config(**kwargs)
-            run_time_loop(options, var_objs, att_objs)
         # Modify forcing
         if self.config.get_value("forcing.modify_forcing"):
-            dtg = self.dtg
-            dtg_prev = dtg - self.fcint
-            
-            dtg_c = dtg.strftime('%Y%m%d%H')
-            dtg_p = dtg_prev.strftime('%Y%m%d%H')
-
-            logger.debug("modify forcing dtg={} dtg_prev={}", dtg, dtg_prev)
-            forcing_dir = self.platform.get_system_value("forcing_dir")
-            input_file = forcing_dir.replace( dtg_c, dtg_p )      
-            input_file = input_file + "FORCING.nc"
-            output_file = forcing_dir + "/FORCING.nc"
-            time_step = -1
-            variables = ["LWdown", "DIR_SWdown", "SCA_SWdown"]
-            kwargs = {}
-
-            kwargs.update({"input_file": input_file})
-            kwargs.update({"output_file": output_file})
-            kwargs.update({"time_step": time_step})
-            kwargs.update({"variables": variables})
-            if os.path.exists(output_file) and os.path.exists(input_file):
-                modify_forcing(**kwargs)
-            else:
-                logger.info("Output or input is missing: {}", output_file)
+            modify_cycle_forcing(self.platform, self.dtg, self.fcint)
 
 
 class ModifyForcing(AbstractTask):
@@ -168,26 +755,4 @@ class ModifyForcing(AbstractTask):
 
     def execute(self):
         """Execute the forcing task."""
-        dtg = self.dtg
-        dtg_prev = dtg - self.fcint
-        
-        dtg_c = dtg.strftime('%Y%m%d%H')
-        dtg_p = dtg_prev.strftime('%Y%m%d%H')
-
-        logger.debug("modify forcing dtg={} dtg_prev={}", dtg, dtg_prev)
-        forcing_dir = self.platform.get_system_value("forcing_dir")
-        input_file = forcing_dir.replace( dtg_c, dtg_p )      
-        input_file = input_file + "FORCING.nc"
-        output_file = forcing_dir + "/FORCING.nc"
-        time_step = -1
-        variables = ["LWdown", "DIR_SWdown", "SCA_SWdown"]
-        kwargs = {}
-
-        kwargs.update({"input_file": input_file})
-        kwargs.update({"output_file": output_file})
-        kwargs.update({"time_step": time_step})
-        kwargs.update({"variables": variables})
-        if os.path.exists(output_file) and os.path.exists(input_file):
-            modify_forcing(**kwargs)
-        else:
-            logger.info("Output or input is missing: {}", output_file)
+        modify_cycle_forcing(self.platform, self.dtg, self.fcint)
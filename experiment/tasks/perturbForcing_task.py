@@ -1,6 +1,5 @@
 """Forcing task."""
 import os
-import shutil
 from datetime import timedelta
 import json
 #import logging
@@ -8,7 +7,14 @@ import yaml
 from netCDF4 import Dataset
 import numpy as np
 from sfcpert.perturb_forcing import perturb_forcing, remap_precip
+from experiment.file_links import link_or_copy
 from experiment.tasks import AbstractTask
+from experiment.tasks.forcing import (
+    LAYER_FILE,
+    forcing_encoding,
+    repack_forcing_file,
+    write_forcing_layer,
+)
 
 
 class PerturbForcing(AbstractTask):
@@ -81,14 +87,29 @@ class PerturbForcing(AbstractTask):
 
         print(input_forcing_file, output)
 
+        layer_file = forcing_dir + "/" + LAYER_FILE
+        layered = self.config.get_value("eps.forcing_layers", False)
+        if os.path.exists(layer_file):
+            os.unlink(layer_file)
         if self.config.get_value("eps.pert_forcing") == True:
             print("call perturb atm forcing for mbr %s" % mbr)
+            encoding = forcing_encoding(self.config)
+            if layered:
+                # Only the perturbed variables are kept, the rest is shared
+                output = forcing_dir + "/FORCING_full.nc"
             perturb_forcing(input_forcing_file, noise_file, output, cfg)
             if self.config.get_value("eps.remap_precip") == True:
                 remap_precip(output, self.geo.nlats, self.geo.nlons, 200, 4, keep_orographic=True)
+            if layered:
+                write_forcing_layer(input_forcing_file, output, layer_file, encoding)
+                os.unlink(output)
+                if os.path.exists(forcing_dir + "/FORCING.nc"):
+                    os.unlink(forcing_dir + "/FORCING.nc")
+            elif encoding is not None:
+                repack_forcing_file(output, output, encoding)
         else:
             os.makedirs(forcing_dir, exist_ok=True)
-            shutil.copyfile(input_forcing_file, output)
+            link_or_copy(input_forcing_file, output)
 
 
 
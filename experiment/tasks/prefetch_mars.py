@@ -2,6 +2,7 @@
 import os
 import shutil
 import datetime
+import hashlib
 import json
 #import logging
 import yaml
@@ -9,7 +10,10 @@ from netCDF4 import Dataset
 import numpy as np
 import subprocess
 from experiment.datetime_utils import as_datetime
+from experiment.grib_inventory import write_inventory
+from experiment.logs import logger
 from experiment.tasks import AbstractTask
+from experiment.tasks.task_array import run_in_pool
 
 try:
     import eccodes as ec
@@ -65,7 +69,9 @@ class PrefetchMars(AbstractTask):
         print(dts)
         gribdir =  self.config.get_value("system.sfx_exp_data") + "/grib/"
         os.makedirs(gribdir, exist_ok=True)
-        prefetch(dts, gribdir)
+        chunk_days = int(self.config.get_value("prefetch.chunk_days", 7))
+        workers = int(self.config.get_value("prefetch.workers", 0))
+        prefetch(dts, gribdir, chunk_days=chunk_days, workers=workers or None)
 
 class PrefetchMarsObs(AbstractTask):
     """Perturb state task."""
@@ -99,7 +105,18 @@ class PrefetchMarsObs(AbstractTask):
         kwargs.update({"dtg_stop": (dtg + fcint).strftime("%Y%m%d%H")})
         obsdir =  self.platform.substitute(self.config.get_value("system.obs_dir"))
         os.makedirs(obsdir, exist_ok=True)
-        prefetch_synop(dtg, obsdir)
+        window_days = int(self.config.get_value("prefetch.obs_window_days", 0))
+        if window_days > 0:
+            # Fetch this and the following cycles of the window in one request
+            dtend = as_datetime(self.config.get_value("general.times.end"))
+            window_end = dtg + datetime.timedelta(days=window_days)
+            dts = [dtg]
+            while dts[-1] + fcint < window_end and dts[-1] + fcint <= dtend:
+                dts.append(dts[-1] + fcint)
+            workers = int(self.config.get_value("prefetch.workers", 0))
+            prefetch_synop_window(dts, obsdir, workers=workers or None)
+        else:
+            prefetch_synop(dtg, obsdir)
 
 
 class Request(object):
@@ -208,7 +225,7 @@ def fetch_mars(dts, filedir, outfile):
     
     #outfiles = []
     
-    dates = list(set([dt.strftime("%Y%m%d") for dt in dts]))
+    dates = sorted(set([dt.strftime("%Y%m%d") for dt in dts]))
     hours = [str(i*3) for i in range(8)]
     #outfile = dts[0].strftime("multi_carra_%Y%m%dT%HZ.grib2")
     #outfiles.append(outfile)
@@ -255,73 +272,207 @@ def fetch_mars(dts, filedir, outfile):
         stream="oper",
         target=outfile
     )
+    # The first step of the model level parameters of the next day is step 3 of
+    # the last cycle
+    next_date = max(dts) + datetime.timedelta(days=1)
+    req_ml_next = Request(
+        action="retrieve",
+        dates=[next_date.strftime("%Y%m%d")],
+        hours=["0"],
+        origin="no-ar-ce",
+        step=[0],
+        levtype="ml",
+        levelist=[65],
+        param=params_ml,
+        expver="prod",
+        clas="rr",
+        typ="an",
+        stream="oper",
+        target=outfile
+    )
     with open(request_file, 'a') as rf:
             req.write_request(rf)
             req_acc.write_request(rf)
             req_ml.write_request(rf)
+            req_ml_next.write_request(rf)
         
     result = subprocess.run(["mars", request_file])
+    if result.returncode != 0 or not os.path.exists(outfile):
+        raise RuntimeError(f"MARS request {request_file} for {outfile} failed")
     result = subprocess.run(["mv",] + [outfile] + [filedir])
 
 
-def split_files(file_in, dest):
-    filepattern = "carra_@yyyy@@mm@@dd@T@hh@Z_@lll@.grib2"
-    #file_in = fill_pattern("carra_@yyyy@@mm@@dd@T@hh@Z.grib2", get_info(dt))
-    
+SPLIT_FILE_PATTERN = "carra_@yyyy@@mm@@dd@T@hh@Z_@lll@.grib2"
+
+
+def scan_grib_file(file_in):
+    """Index the messages of a GRIB file from their headers.
+
+    Only the section headers are decoded, not the data.
+
+    Args:
+        file_in (str): GRIB file
+
+    Returns:
+        list: Tuples of (offset, length, basetime, step, param) for each message
+
+    """
+    index = []
     with open(file_in, "rb") as fin:
-        outputset = {}
         while True:
-            gid = ec.codes_grib_new_from_file(fin)
+            gid = ec.codes_grib_new_from_file(fin, headers_only=True)
             if gid is None:
                 break
-            dt = get_basetime(gid)
-            info = get_info(dt)
-
-            step = ec.codes_get(gid, "step")
-            info["lll"] = "%03d" % step
-            filename = fill_pattern(filepattern, info)
-            if filename not in outputset:
-                outputset[filename] = []
-            
-            if step == 0:
-                param = ec.codes_get(gid, "param")
-                if param in params_ml:
-                    gid0 = ec.codes_clone(gid)
-                    prev_dt = dt - datetime.timedelta(hours=3)
-                    ec.codes_set(gid0, "step", 3)
-                    ec.codes_set(gid0, "hour", prev_dt.hour)
-                    ec.codes_set(gid0, "date", int(prev_dt.strftime("%Y%m%d")))
-                    info0 = get_info(prev_dt)
-                    info0["lll"] = "003"
-                    filename0 = fill_pattern(filepattern, info0)
-                    if filename0 not in outputset:
-                        outputset[filename0] = []
-                    outputset[filename0].append(gid0)
-            if step == 1:
-                # copy accumulated and set zero
-                param = ec.codes_get(gid, "param")
-                if param in params_acc:
-                    gid0 = ec.codes_clone(gid)
-                    ec.codes_set(gid0, "step", 0)
-                    values = ec.codes_get_array(gid0, "values")*0
-                    ec.codes_set_values(gid0, values)
-                    info["lll"] = "%03d" % 0
-                    filename0 = fill_pattern(filepattern, info)
-                    if filename0 not in outputset:
-                        outputset[filename0] = []
-                    outputset[filename0].append(gid0)        
-            outputset[filename].append(ec.codes_clone(gid))
+            index.append(
+                (
+                    ec.codes_get(gid, "offset", int),
+                    ec.codes_get(gid, "totalLength", int),
+                    get_basetime(gid),
+                    ec.codes_get(gid, "step"),
+                    ec.codes_get(gid, "param"),
+                )
+            )
             ec.codes_release(gid)
-    
-    for file_out in outputset:
-        if os.path.exists(dest + file_out):
-            mode = "ab"
-        else:
-            mode = "wb"
-        with open(dest + file_out, mode) as fout:
-            for gid in outputset[file_out]:
-                ec.codes_write(gid, fout)
-                ec.codes_release(gid)
+    return index
+
+
+def split_plan(index):
+    """Get the messages to write to each split file.
+
+    Most messages are copied as they are. The first step of the model level
+    parameters is also used as step 3 of the previous cycle, and the first step of
+    the accumulated parameters is also used with zero values as step 0.
+
+    Args:
+        index (list): Messages from scan_grib_file
+
+    Returns:
+        dict: Tuples of (offset, length, action) for each file, in the order they
+              are written. The action is "copy", "previous_cycle" or "zero".
+
+    """
+    plan = {}
+    for offset, length, dt, step, param in index:
+        info = get_info(dt)
+        info["lll"] = "%03d" % step
+        filename = fill_pattern(SPLIT_FILE_PATTERN, info)
+        if step == 0 and param in params_ml:
+            info0 = get_info(dt - datetime.timedelta(hours=3))
+            info0["lll"] = "003"
+            filename0 = fill_pattern(SPLIT_FILE_PATTERN, info0)
+            plan.setdefault(filename0, []).append((offset, length, "previous_cycle"))
+        if step == 1 and param in params_acc:
+            info["lll"] = "%03d" % 0
+            filename0 = fill_pattern(SPLIT_FILE_PATTERN, info)
+            plan.setdefault(filename0, []).append((offset, length, "zero"))
+        plan.setdefault(filename, []).append((offset, length, "copy"))
+    return plan
+
+
+def derived_message(message, action):
+    """Derive a message for another step from a raw GRIB message.
+
+    Args:
+        message (bytes): GRIB message
+        action (str): "previous_cycle" or "zero", see split_plan
+
+    Returns:
+        bytes: Derived GRIB message
+
+    """
+    gid = ec.codes_new_from_message(message)
+    if action == "previous_cycle":
+        prev_dt = get_basetime(gid) - datetime.timedelta(hours=3)
+        ec.codes_set(gid, "step", 3)
+        ec.codes_set(gid, "hour", prev_dt.hour)
+        ec.codes_set(gid, "date", int(prev_dt.strftime("%Y%m%d")))
+    elif action == "zero":
+        # copy accumulated and set zero
+        ec.codes_set(gid, "step", 0)
+        values = ec.codes_get_array(gid, "values")*0
+        ec.codes_set_values(gid, values)
+    else:
+        raise ValueError(f"Unknown action {action}")
+    message = ec.codes_get_message(gid)
+    ec.codes_release(gid)
+    return message
+
+
+def write_split_file(file_in, file_out, messages, append=True):
+    """Write messages of a GRIB or BUFR file to a split file.
+
+    Copied messages are written as raw byte ranges without decoding them.
+
+    Args:
+        file_in (str): GRIB or BUFR file
+        file_out (str): Split file
+        messages (list): Tuples of (offset, length, action), see split_plan
+        append (bool, optional): Append to the split file. Otherwise the split file
+                                 is replaced when it is complete. Defaults to True.
+
+    """
+    tmp_file_out = file_out if append else f"{file_out}.tmp{os.getpid()}"
+    fd_in = os.open(file_in, os.O_RDONLY)
+    try:
+        with open(tmp_file_out, "ab" if append else "wb") as fout:
+            for offset, length, action in messages:
+                message = os.pread(fd_in, length, offset)
+                if len(message) != length:
+                    raise RuntimeError(f"Truncated message at {offset} in {file_in}")
+                if action != "copy":
+                    message = derived_message(message, action)
+                fout.write(message)
+    finally:
+        os.close(fd_in)
+    if not append:
+        os.replace(tmp_file_out, file_out)
+
+
+def write_grib_split_file(file_in, file_out, messages):
+    """Write messages of a GRIB file to a split file and write its inventory.
+
+    Args:
+        file_in (str): GRIB file
+        file_out (str): Split file, replaced when it is complete
+        messages (list): Tuples of (offset, length, action), see split_plan
+
+    """
+    write_split_file(file_in, file_out, messages, append=False)
+    write_inventory(file_out)
+
+
+def split_files(file_in, dest, workers=None, outputs=None):
+    """Split a MARS retrieval in one GRIB file per basetime and step.
+
+    The messages are indexed from their headers, and the split files are written
+    in parallel processes from the byte ranges of their messages. Each split file
+    is written from this retrieval only, and replaces an existing file.
+
+    Args:
+        file_in (str): GRIB file from MARS
+        dest (str): Directory of the split files, ending with a slash
+        workers (int, optional): Maximum number of processes. Defaults to None,
+                                 one per available core.
+        outputs (list, optional): Split files to write. Messages of other files are
+                                  skipped. Defaults to None, all files.
+
+    Raises:
+        RuntimeError: If any split file could not be written
+
+    """
+    plan = split_plan(scan_grib_file(file_in))
+    if outputs is not None:
+        skipped = sorted(set(plan) - set(outputs))
+        if len(skipped) > 0:
+            logger.debug("Skip split files of other chunks: {}", skipped)
+        plan = {filename: plan[filename] for filename in outputs if filename in plan}
+    jobs = {
+        filename: (file_in, dest + filename, messages)
+        for filename, messages in plan.items()
+    }
+    failed = run_in_pool(write_grib_split_file, jobs, max_workers=workers)
+    if len(failed) > 0:
+        raise RuntimeError(f"Could not split {file_in} to {sorted(failed)}")
 
 
 # accumulated parameters
@@ -345,40 +496,208 @@ params_ml = [
     133  # q humidity
 ]
 
-def prefetch(dts, dest):  
-    
-    #dts = [datetime.datetime(2015, 9, 8) + datetime.timedelta(hours=i*3) for i in range(8)]
-    #dest = "/scratch/fab0/tmp/"
-    
-    #tempfile = dts[0].strftime("multi_carra_%Y%m%dT%HZ.grib2")
-    tempfile = f"multi_carra_{dts[0].strftime('%Y%m%d')}_{dts[-1].strftime('%Y%m%d')}.grib2"
-    if not os.path.exists(dest + tempfile):
-        fetch_mars(dts, dest, tempfile)
+MANIFEST_FILE = "prefetch_manifest.json"
+
+
+def plan_requests(dts, chunk_days=7):
+    """Plan the MARS retrievals of a period.
+
+    The dates are grouped in chunks of at most chunk_days consecutive dates within
+    one month, as the data are stored on tape by month. All steps and streams of
+    the dates of a chunk are retrieved in one request.
+
+    Args:
+        dts (list): Times to retrieve
+        chunk_days (int, optional): Maximum number of dates in a chunk.
+                                    Defaults to 7.
+
+    Returns:
+        list: Dates of each chunk
+
+    """
+    chunks = []
+    for date in sorted({dt.date() for dt in dts}):
+        if (
+            len(chunks) > 0
+            and len(chunks[-1]) < chunk_days
+            and date - chunks[-1][-1] == datetime.timedelta(days=1)
+            and date.month == chunks[-1][-1].month
+        ):
+            chunks[-1].append(date)
+        else:
+            chunks.append([date])
+    return chunks
+
+
+def split_outputs(dates):
+    """Get the split files of the cycles of some dates.
+
+    Args:
+        dates (list): Dates
+
+    Returns:
+        list: File names
+
+    """
+    outputs = []
+    for date in dates:
+        for hour in range(0, 24, 3):
+            dt = datetime.datetime.combine(date, datetime.time(hour))
+            for step in range(4):
+                info = get_info(dt)
+                info["lll"] = "%03d" % step
+                outputs.append(fill_pattern(SPLIT_FILE_PATTERN, info))
+    return outputs
+
+
+def file_checksum(filename):
+    """Get the sha256 checksum of a file.
+
+    Args:
+        filename (str): File name
+
+    Returns:
+        str: Hex digest
+
+    """
+    sha = hashlib.sha256()
+    with open(filename, "rb") as fhandler:
+        for block in iter(lambda: fhandler.read(16 * 1024 * 1024), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def read_manifest(dest):
+    """Read the manifest of the prefetched chunks.
+
+    Args:
+        dest (str): Prefetch directory, ending with a slash
+
+    Returns:
+        dict: Manifest entry for each chunk
+
+    """
+    try:
+        with open(dest + MANIFEST_FILE, mode="r", encoding="utf-8") as fhandler:
+            return json.load(fhandler)
+    except FileNotFoundError:
+        return {}
+
+
+def write_manifest(dest, manifest):
+    """Write the manifest of the prefetched chunks.
+
+    Args:
+        dest (str): Prefetch directory, ending with a slash
+        manifest (dict): Manifest entry for each chunk
+
+    """
+    tmp_file = f"{dest}{MANIFEST_FILE}.tmp{os.getpid()}"
+    with open(tmp_file, mode="w", encoding="utf-8") as fhandler:
+        json.dump(manifest, fhandler, indent=2, sort_keys=True)
+    os.replace(tmp_file, dest + MANIFEST_FILE)
+
+
+def prefetch(dts, dest, chunk_days=7, workers=None):
+    """Retrieve and split the GRIB files of a period.
+
+    The period is retrieved in chunks planned by plan_requests. Each chunk is
+    recorded in a manifest in dest when it is retrieved, with the checksum of the
+    retrieval, and when it is split. A rerun only retrieves the missing chunks, and
+    skips chunks whose split files already exist. A chunk only writes the split
+    files of its own cycles, so splitting it again leaves the other chunks intact.
+
+    Args:
+        dts (list): Times to retrieve
+        dest (str): Prefetch directory, ending with a slash
+        chunk_days (int, optional): Maximum number of dates in a request.
+                                    Defaults to 7.
+        workers (int, optional): Maximum number of processes splitting the files.
+                                 Defaults to None.
+
+    """
+    manifest = read_manifest(dest)
+    for dates in plan_requests(dts, chunk_days):
+        name = f"{dates[0].strftime('%Y%m%d')}_{dates[-1].strftime('%Y%m%d')}"
+        tempfile = f"multi_carra_{name}.grib2"
+        entry = manifest.get(name, {})
+        if entry.get("split", False):
+            logger.info("Chunk {} is already prefetched", name)
+            continue
+        outputs = split_outputs(dates)
+        if all(os.path.exists(dest + output) for output in outputs):
+            logger.info("Split files of chunk {} already exist", name)
+            continue
+
+        if os.path.exists(dest + tempfile) and entry.get("sha256") == file_checksum(
+            dest + tempfile
+        ):
+            logger.info("Chunk {} is already fetched", name)
+        else:
+            logger.info("Fetch chunk {}", name)
+            fetch_mars(dates, dest, tempfile)
+            entry = {
+                "dates": [date.strftime("%Y%m%d") for date in dates],
+                "file": tempfile,
+                "size": os.path.getsize(dest + tempfile),
+                "sha256": file_checksum(dest + tempfile),
+            }
+            manifest[name] = entry
+            write_manifest(dest, manifest)
+
+        split_files(dest + tempfile, dest, workers=workers, outputs=outputs)
+        entry["split"] = True
+        write_manifest(dest, manifest)
+
+
+# SYNOP observations before this date are taken from ERA
+ERA_SYNOP_END = datetime.datetime(2002, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def synop_window(dt):
+    """Get the time window of the SYNOP observations of a cycle.
+
+    Args:
+        dt (datetime.datetime): Cycle time
+
+    Returns:
+        tuple: First and last time of the observations, both included
+
+    """
+    if dt < ERA_SYNOP_END:
+        start = dt.replace(minute=0, second=0, microsecond=0)
     else:
-        print("WARNING! the data is already fetched, consider to clean")
-    split_files(dest + tempfile, dest)
+        start = (dt - datetime.timedelta(hours=1.5)).replace(
+            minute=0, second=0, microsecond=0
+        )
+    return start, start + datetime.timedelta(minutes=180)
 
 
-def prefetch_synop(dt, dest):
-    
-    dt_ = dt - datetime.timedelta(hours=1.5)
-    date = dt_.strftime("%Y%m%d")
-    ea_date = datetime.datetime(2002, 1, 1, tzinfo=datetime.timezone.utc)
-    time = dt_.strftime("%H")
-    time_ea = dt.strftime("%H")
-    target = f'ob{dt.strftime("%Y%m%d%H")}'
-    
-    if dt < ea_date:
-      request = f'''retrieve,
+def synop_request(date, time, range_minutes, target, era=False):
+    """Get a MARS request for SYNOP observations.
+
+    Args:
+        date (str): MARS date
+        time (str): MARS time
+        range_minutes (int): Minutes after date and time to retrieve
+        target (str): Target file
+        era (bool, optional): Retrieve from ERA. Defaults to False.
+
+    Returns:
+        str: Request
+
+    """
+    if era:
+        request = f'''retrieve,
         class   = E4,
         repres  = BUFR,
         type    = AI,
         obsgroup= con,
         obstype = lsd,
         date    = {date},
-        time    = {time_ea},
+        time    = {time},
         area    = 90/0/60/45,
-        range   = 180,
+        range   = {range_minutes},
         target  = {target}'''
     else:
         request = f'''retrieve,
@@ -387,9 +706,24 @@ def prefetch_synop(dt, dest):
         obstype = lsd,
         date    = {date},
         time    = {time},
-        range   = 180,
+        range   = {range_minutes},
         area    = 90/0/60/45,
         target  = {target}'''
+    return request
+
+
+def prefetch_synop(dt, dest):
+    
+    dt_ = dt - datetime.timedelta(hours=1.5)
+    date = dt_.strftime("%Y%m%d")
+    time = dt_.strftime("%H")
+    time_ea = dt.strftime("%H")
+    target = f'ob{dt.strftime("%Y%m%d%H")}'
+    
+    if dt < ERA_SYNOP_END:
+        request = synop_request(date, time_ea, 180, target, era=True)
+    else:
+        request = synop_request(date, time, 180, target)
         
     request_file = "request.out"
     with open(request_file, 'w') as f:
@@ -397,3 +731,89 @@ def prefetch_synop(dt, dest):
     result = subprocess.run(["mars", request_file])
     result = subprocess.run(["mv",] + [target] + [dest])
 
+
+def scan_bufr_file(file_in):
+    """Index the messages of a BUFR file from their headers.
+
+    Args:
+        file_in (str): BUFR file
+
+    Returns:
+        list: Tuples of (offset, length, typical time) for each message
+
+    """
+    index = []
+    with open(file_in, "rb") as fin:
+        while True:
+            bid = ec.codes_bufr_new_from_file(fin, headers_only=True)
+            if bid is None:
+                break
+            typical_time = datetime.datetime.strptime(
+                f"{ec.codes_get(bid, 'typicalDate')}"
+                f"{int(ec.codes_get(bid, 'typicalTime')):06d}",
+                "%Y%m%d%H%M%S",
+            ).replace(tzinfo=datetime.timezone.utc)
+            index.append(
+                (
+                    ec.codes_get(bid, "offset", int),
+                    ec.codes_get(bid, "totalLength", int),
+                    typical_time,
+                )
+            )
+            ec.codes_release(bid)
+    return index
+
+
+def prefetch_synop_window(dts, dest, workers=None):
+    """Retrieve the SYNOP observations of several cycles in one request.
+
+    The observations of whole days covering the windows of the cycles are
+    retrieved and split in one file per cycle from the typical times of the
+    messages, like prefetch_synop would have retrieved them. Cycles which already
+    have observations are skipped.
+
+    Args:
+        dts (list): Cycle times
+        dest (str): Observation directory
+        workers (int, optional): Maximum number of processes splitting the file.
+                                 Defaults to None.
+
+    Raises:
+        RuntimeError: If the retrieval or the split fails
+
+    """
+    missing = [
+        dt for dt in dts if not os.path.exists(f"{dest}/ob{dt.strftime('%Y%m%d%H')}")
+    ]
+    for era in [True, False]:
+        cycles = [dt for dt in missing if (dt < ERA_SYNOP_END) == era]
+        if len(cycles) == 0:
+            continue
+        windows = {dt: synop_window(dt) for dt in cycles}
+        first = min(start for start, __ in windows.values())
+        last = max(end for __, end in windows.values())
+        target = f"ob{first.strftime('%Y%m%d%H')}_{last.strftime('%Y%m%d%H')}"
+        dates = f"{first.strftime('%Y%m%d')}/to/{last.strftime('%Y%m%d')}"
+        logger.info("Fetch SYNOP for {} cycles from {} to {}", len(cycles), first, last)
+
+        request_file = "request.out"
+        with open(request_file, mode="w", encoding="utf-8") as fhandler:
+            fhandler.write(synop_request(dates, "00", 1439, target, era=era))
+        result = subprocess.run(["mars", request_file])
+        if result.returncode != 0 or not os.path.exists(target):
+            raise RuntimeError(f"MARS request {request_file} for {target} failed")
+
+        index = scan_bufr_file(target)
+        jobs = {}
+        for dt, (start, end) in windows.items():
+            messages = [
+                (offset, length, "copy")
+                for offset, length, typical_time in index
+                if start <= typical_time <= end
+            ]
+            filename = f"ob{dt.strftime('%Y%m%d%H')}"
+            jobs[filename] = (target, f"{dest}/{filename}", messages, False)
+        failed = run_in_pool(write_split_file, jobs, max_workers=workers)
+        if len(failed) > 0:
+            raise RuntimeError(f"Could not split {target} to {sorted(failed)}")
+        os.remove(target)
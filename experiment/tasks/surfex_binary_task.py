@@ -1,8 +1,11 @@
 """Tasks running surfex binaries."""
+import hashlib
 import json
 import os
+import pickle  # noqa S403
+import socket
+from functools import cached_property
 
-import yaml
 from pysurfex.binary_input import InputDataFromNamelist, JsonOutputData
 from pysurfex.configuration import Configuration
 from pysurfex.file import PGDFile, PREPFile, SURFFile
@@ -10,8 +13,11 @@ from pysurfex.namelist import NamelistGenerator
 from pysurfex.platform_deps import SystemFilePaths
 from pysurfex.run import BatchJob, PerturbedOffline, SURFEXBinary
 
+from ..definitions import load_definitions
+from ..input_links import link_input_files, split_input_data
 from ..logs import logger
 from ..tasks.tasks import AbstractTask
+from ..tracing import span
 
 
 class SurfexBinaryTask(AbstractTask):
@@ -32,6 +38,8 @@ class SurfexBinaryTask(AbstractTask):
         if name is None:
             name = self.__class__.__name__
         AbstractTask.__init__(self, config, name)
+        update = {"SURFEX": {"ASSIM": {"OBS": {"NNCO": self.nnco}}}}
+        self.config = self.config.copy(update=update)
 
         self.mode = mode
         self.need_pgd = True
@@ -105,6 +113,127 @@ class SurfexBinaryTask(AbstractTask):
         """Execute task."""
         logger.debug("Using empty class execute")
 
+    def namelist_cache_file(self, prep_file=None, prep_pgdfile=None):
+        """Get the cache file of the namelist and input data of this run.
+
+        The file name is a hash of everything the namelist and input data depend on.
+        The perturbation of perturbed runs is applied afterwards and not part of it.
+
+        Args:
+            prep_file (str, optional): PREP input file. Defaults to None.
+            prep_pgdfile (str, optional): PGD file of the PREP input. Defaults to None.
+
+        Returns:
+            str: Cache file
+
+        """
+        key = {
+            "mode": self.mode,
+            "dtg": self.dtg,
+            "surfex": self.config.get_value("SURFEX").dict(),
+            "domain": self.config.get_value("domain").dict(),
+            "prep_file": prep_file,
+            "prep_pgdfile": prep_pgdfile,
+            "file_paths": vars(self.exp_file_paths),
+        }
+        for definitions in [self.namelist_defs, self.binary_input_files]:
+            stat = os.stat(definitions)
+            key[definitions] = [stat.st_mtime_ns, stat.st_size]
+        digest = hashlib.sha256(
+            json.dumps(key, sort_keys=True, default=str).encode("utf-8")
+        ).hexdigest()
+        return f"{self.wrk}/namelists/{self.mode}_{digest[:16]}.pickle"
+
+    def link_input_files(self, input_data):
+        """Link the plain input files into the work directory.
+
+        The remaining entries of input_data are prepared by the binary as before.
+
+        Args:
+            input_data (InputDataFromNamelist): Input data. Updated in place.
+
+        """
+        links, others = split_input_data(input_data.data)
+        link_input_files(links, os.getcwd())
+        input_data.data = others
+
+    def merge_forcing_layer(self, input_data):
+        """Create the forcing in the work directory if the forcing is layered.
+
+        A member with a forcing layer next to its FORCING.nc gets the shared forcing
+        merged with the layer instead of a link.
+
+        Args:
+            input_data (InputDataFromNamelist): Input data. Updated in place.
+
+        """
+        from ..tasks.forcing import LAYER_FILE, merge_forcing_layer
+
+        forcing_file = input_data.data.get("FORCING.nc")
+        if not isinstance(forcing_file, str):
+            return
+        layer_file = f"{os.path.dirname(forcing_file)}/{LAYER_FILE}"
+        if not os.path.exists(layer_file):
+            return
+        merge_forcing_layer(layer_file, f"{os.getcwd()}/FORCING.nc")
+        input_data.data.pop("FORCING.nc")
+
+    def namelist_and_input_data(self, prep_file=None, prep_pgdfile=None):
+        """Get the namelist and the input data for the binary.
+
+        They are generated once per mode and cycle and cached in the cycle work
+        directory. Perturbed runs only differ in the perturbation, which
+        PerturbedOffline applies to the namelist, and share the cached namelist.
+
+        Args:
+            prep_file (str, optional): PREP input file. Defaults to None.
+            prep_pgdfile (str, optional): PGD file of the PREP input. Defaults to None.
+
+        Returns:
+            tuple: Namelist settings and InputDataFromNamelist object
+
+        """
+        cache_file = self.namelist_cache_file(prep_file, prep_pgdfile)
+        try:
+            with open(cache_file, mode="rb") as fhandler:
+                settings, input_data = pickle.load(fhandler)  # noqa S301
+            logger.info("Using cached namelist {}", cache_file)
+            return settings, input_data
+        except (OSError, EOFError, pickle.UnpicklingError) as exc:
+            logger.debug("No cached namelist {}: {}", cache_file, repr(exc))
+
+        with span("namelist", mode=self.mode):
+            # TODO file handling should be in pysurfex
+            definitions = load_definitions(self.namelist_defs)
+            namelist = NamelistGenerator(self.mode, self.sfx_config, definitions)
+            settings = namelist.get_namelist()
+
+            if self.mode == "pgd":
+                settings = self.geo.update_namelist(settings)
+
+        with span("input_data", mode=self.mode):
+            input_data = load_definitions(self.binary_input_files)
+
+            input_data = InputDataFromNamelist(
+                settings,
+                input_data,
+                self.mode,
+                self.exp_file_paths,
+                basetime=self.dtg,
+                validtime=self.dtg,
+            )
+
+        try:
+            data = pickle.dumps((settings, input_data), protocol=pickle.HIGHEST_PROTOCOL)
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = f"{cache_file}.tmp{os.getpid()}"
+            with open(tmp_file, mode="wb") as fhandler:
+                fhandler.write(data)
+            os.replace(tmp_file, cache_file)
+        except (OSError, pickle.PicklingError, TypeError, AttributeError) as exc:
+            logger.warning("Could not cache namelist {}: {}", cache_file, repr(exc))
+        return settings, input_data
+
     def execute_binary(
         self,
         binary,
@@ -164,29 +293,27 @@ class SurfexBinaryTask(AbstractTask):
                     nvar += 1
             self.sfx_config.update_setting("SURFEX#SODA#NVAR", nvar)
 
-        # TODO file handling should be in pysurfex
-        with open(self.namelist_defs, mode="r", encoding="utf-8") as fhandler:
-            definitions = yaml.safe_load(fhandler)
-        namelist = NamelistGenerator(self.mode, self.sfx_config, definitions)
-        settings = namelist.get_namelist()
-
-        if self.mode == "pgd":
-            settings = self.geo.update_namelist(settings)
-
-        with open(self.binary_input_files, mode="r", encoding="utf-8") as fhandler:
-            input_data = json.load(fhandler)
-
-        input_data = InputDataFromNamelist(
-            settings,
-            input_data,
-            self.mode,
-            self.exp_file_paths,
-            basetime=self.dtg,
-            validtime=self.dtg,
-        )
+        settings, input_data = self.namelist_and_input_data(prep_file, prep_pgdfile)
+        if self.mode in ["offline", "perturbed"]:
+            with span("forcing_layer", mode=self.mode):
+                self.merge_forcing_layer(input_data)
+        if self.config.get_value("general.input_links", True):
+            with span("input_links", mode=self.mode):
+                self.link_input_files(input_data)
 
         batch = BatchJob(rte, wrapper=self.wrapper)
 
+        # Outputs in a scratch working directory are copied back in the background
+        copy_back = self.scratch_root is not None
+        archive_file = output
+        copy_back_data = {}
+        if copy_back:
+            archive_file = None
+            if archive_data is not None:
+                for fname, target in list(archive_data.data.items()):
+                    if isinstance(target, str):
+                        copy_back_data[fname] = archive_data.data.pop(fname)
+
         # Create input
         filetype = settings["nam_io_offline"]["csurf_filetype"]
         pgdfile = settings["nam_io_offline"]["cpgdfile"]
@@ -207,22 +334,71 @@ class SurfexBinaryTask(AbstractTask):
             )
 
         if self.need_prep and self.need_pgd:
-            surffile = SURFFile(filetype, surffile, archive_file=output, lfagmap=lfagmap)
+            surffile = SURFFile(
+                filetype, surffile, archive_file=archive_file, lfagmap=lfagmap
+            )
         else:
             surffile = None
-
-        if self.perturbed:
-            if self.pert > 0:
-                PerturbedOffline(
+        output_file = surffile
+
+        with span("binary", binary=binary, mode=self.mode):
+            if self.perturbed:
+                if self.pert > 0:
+                    PerturbedOffline(
+                        binary,
+                        batch,
+                        prepfile,
+                        self.ivar,
+                        settings,
+                        input_data,
+                        negpert=self.negpert,
+                        pgdfile=pgdfile,
+                        surfout=surffile,
+                        archive_data=archive_data,
+                        print_namelist=self.print_namelist,
+                    )
+                else:
+                    SURFEXBinary(
+                        binary,
+                        batch,
+                        prepfile,
+                        settings,
+                        input_data,
+                        pgdfile=pgdfile,
+                        surfout=surffile,
+                        archive_data=archive_data,
+                        print_namelist=self.print_namelist,
+                    )
+            elif self.pgd:
+                pgdfile = PGDFile(
+                    filetype,
+                    pgdfile,
+                    input_file=pgd_file_path,
+                    archive_file=archive_file,
+                    lfagmap=lfagmap,
+                )
+                output_file = pgdfile
+                SURFEXBinary(
+                    binary,
+                    batch,
+                    pgdfile,
+                    settings,
+                    input_data,
+                    archive_data=archive_data,
+                    print_namelist=self.print_namelist,
+                )
+            elif self.prep:
+                prepfile = PREPFile(
+                    filetype, prepfile, archive_file=archive_file, lfagmap=lfagmap
+                )
+                output_file = prepfile
+                SURFEXBinary(
                     binary,
                     batch,
                     prepfile,
-                    self.ivar,
                     settings,
                     input_data,
-                    negpert=self.negpert,
                     pgdfile=pgdfile,
-                    surfout=surffile,
                     archive_data=archive_data,
                     print_namelist=self.print_namelist,
                 )
@@ -238,47 +414,12 @@ class SurfexBinaryTask(AbstractTask):
                     archive_data=archive_data,
                     print_namelist=self.print_namelist,
                 )
-        elif self.pgd:
-            pgdfile = PGDFile(
-                filetype,
-                pgdfile,
-                input_file=pgd_file_path,
-                archive_file=output,
-                lfagmap=lfagmap,
-            )
-            SURFEXBinary(
-                binary,
-                batch,
-                pgdfile,
-                settings,
-                input_data,
-                archive_data=archive_data,
-                print_namelist=self.print_namelist,
-            )
-        elif self.prep:
-            prepfile = PREPFile(filetype, prepfile, archive_file=output, lfagmap=lfagmap)
-            SURFEXBinary(
-                binary,
-                batch,
-                prepfile,
-                settings,
-                input_data,
-                pgdfile=pgdfile,
-                archive_data=archive_data,
-                print_namelist=self.print_namelist,
-            )
-        else:
-            SURFEXBinary(
-                binary,
-                batch,
-                prepfile,
-                settings,
-                input_data,
-                pgdfile=pgdfile,
-                surfout=surffile,
-                archive_data=archive_data,
-                print_namelist=self.print_namelist,
-            )
+
+        if copy_back:
+            if output_file is not None and output is not None:
+                self.declare_output(output_file.filename, output)
+            for fname, target in copy_back_data.items():
+                self.declare_output(fname, target)
 
 
 class Pgd(SurfexBinaryTask):
@@ -451,6 +592,11 @@ class PerturbedRun(SurfexBinaryTask):
         """
         SurfexBinaryTask.__init__(self, config, "PerturbedRun", "perturbed")
 
+    @cached_property
+    def wdir(self):
+        """Task working directory. Separate for each perturbation."""
+        return f"{self.wdir_root}/{socket.gethostname()}{self.pid}_PERT{self.pert}"
+
     def execute(self):
         """Execute."""
         pgdfile = self.config.get_value("SURFEX.IO.CPGDFILE") + self.suffix
@@ -0,0 +1,336 @@
+"""Run tasks for many ensemble members in one job."""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from ..config_parser import MAIN_CONFIG_JSON_SCHEMA, ParsedConfig
+from ..logs import logger
+from .discover_tasks import get_task
+from .tasks import AbstractTask
+
+
+def available_cores():
+    """Get the cores this process is allowed to run on.
+
+    Returns:
+        list: Core numbers
+
+    """
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count()))
+
+
+def _pin_worker(core_sets):
+    """Pin a pool worker to the next free set of cores.
+
+    Args:
+        core_sets (multiprocessing.Queue): Queue with the core sets of the pool
+
+    """
+    cores = core_sets.get()
+    try:
+        os.sched_setaffinity(0, cores)
+    except AttributeError:
+        return
+    logger.debug("Worker {} pinned to cores {}", os.getpid(), cores)
+
+
+def run_in_pool(function, jobs, cores_per_job=1, max_workers=None, callback=None):
+    """Run jobs concurrently on a process pool sized to the available cores.
+
+    Each pool worker is pinned to its own set of cores_per_job cores, which are also
+    inherited by the processes it starts.
+
+    Args:
+        function (callable): Function to run. Must be defined at module level.
+        jobs (dict): Arguments to function for each job, indexed by a job key.
+        cores_per_job (int, optional): Cores used by each job. Defaults to 1.
+        max_workers (int, optional): Upper limit of concurrent jobs. Defaults to None.
+        callback (callable, optional): Called with job key and exception (None on
+                                       success) when a job has finished.
+
+    Returns:
+        dict: Exception for each failed job, indexed by the job key.
+
+    """
+    cores = available_cores()
+    cores_per_job = max(1, min(cores_per_job, len(cores)))
+    nslots = max(1, len(cores) // cores_per_job)
+    if max_workers is not None:
+        nslots = min(nslots, max_workers)
+    nslots = max(1, min(nslots, len(jobs)))
+    logger.info(
+        "Running {} jobs on {} workers with {} cores each",
+        len(jobs),
+        nslots,
+        cores_per_job,
+    )
+
+    context = multiprocessing.get_context("fork")
+    core_sets = context.Queue()
+    for slot in range(nslots):
+        core_sets.put(cores[slot * cores_per_job : (slot + 1) * cores_per_job])
+
+    failed = {}
+    with ProcessPoolExecutor(
+        max_workers=nslots,
+        mp_context=context,
+        initializer=_pin_worker,
+        initargs=(core_sets,),
+    ) as executor:
+        futures = {executor.submit(function, *args): key for key, args in jobs.items()}
+        for future in as_completed(futures):
+            key = futures[future]
+            exc = future.exception()
+            if exc is not None:
+                logger.error("Job {} failed: {}", key, repr(exc))
+                failed[key] = exc
+            else:
+                logger.info("Job {} finished", key)
+            if callback is not None:
+                callback(key, exc)
+    return failed
+
+
+def member_name(member):
+    """Get the name used for a member in the suite.
+
+    Args:
+        member (int): Ensemble member
+
+    Returns:
+        str: Member name
+
+    """
+    return f"mbr_{int(member):03d}"
+
+
+def ekf_perturbations(config):
+    """Get the reference and perturbed runs of the EKF.
+
+    Args:
+        config (ParsedConfig): Parsed config
+
+    Returns:
+        list: Task arguments of each run. The reference run comes first.
+
+    """
+    nncv = config.get_value("SURFEX.ASSIM.ISBA.EKF.NNCV")
+    names = config.get_value("SURFEX.ASSIM.ISBA.EKF.CVAR_M")
+    pert_signs = ["none"]
+    if config.get_value("SURFEX.ASSIM.ISBA.EKF.LLINCHECK"):
+        pert_signs = ["pos", "neg"]
+
+    runs = [{"pert": "0", "name": "REF", "ivar": "0"}]
+    nivar = 1
+    for ivar, val in enumerate(nncv):
+        if val == 1:
+            for nfam, pert_sign in enumerate(pert_signs):
+                runs.append(
+                    {
+                        "pert": str((nfam * len(nncv)) + ivar + 1),
+                        "name": names[ivar],
+                        "ivar": str(nivar),
+                        "pert_sign": pert_sign,
+                    }
+                )
+            nivar = nivar + 1
+    return runs
+
+
+def task_args(args):
+    """Format task arguments for the ARGS variable of a task.
+
+    Args:
+        args (dict): Task arguments
+
+    Returns:
+        str: Semicolon separated key=value pairs
+
+    """
+    return ";".join([f"{key}={val}" for key, val in args.items()])
+
+
+def run_member_tasks(tasks, config_dict):
+    """Run the tasks of one member in order.
+
+    Args:
+        tasks (list): Task names
+        config_dict (dict): Member config
+
+    """
+    config = ParsedConfig.parse_obj(config_dict, json_schema=MAIN_CONFIG_JSON_SCHEMA)
+    for task_name in tasks:
+        logger.info(
+            "Running task {} for member {}",
+            task_name,
+            config.get_value("general.realization"),
+        )
+        get_task(task_name, config).run()
+
+
+class MemberArray(AbstractTask):
+    """Run the same tasks for many ensemble members in one job.
+
+    Task arguments:
+        members: Colon separated list of members
+        tasks: Colon separated list of tasks to run in order for each member
+        cores_per_member: Cores used by each member. Defaults to 1.
+
+    Args:
+        AbstractTask (AbstractTask): Base class
+    """
+
+    def __init__(self, config):
+        """Construct the MemberArray task.
+
+        Args:
+            config (ParsedObject): Parsed configuration
+
+        """
+        AbstractTask.__init__(self, config, "MemberArray")
+        args = self.config.get_value("task.args").dict()
+        self.members = [
+            int(member) for member in str(args.get("members", "")).split(":") if member
+        ]
+        self.tasks = [task for task in str(args.get("tasks", "")).split(":") if task]
+        self.cores_per_member = int(args.get("cores_per_member", 1))
+        self.finished = 0
+
+    def run(self):
+        """Override run. The member tasks handle their own working directories."""
+        self.execute()
+
+    def member_config(self, member):
+        """Get the config for a member.
+
+        Args:
+            member (int): Ensemble member
+
+        Returns:
+            dict: Member config
+
+        """
+        update = {
+            "general": {"realization": member},
+            "task": {"args": {"pert": str(member), "name": member_name(member)}},
+        }
+        return self.config.copy(update=update).dict()
+
+    def member_done(self, member, exc):
+        """Report a finished member to the scheduler.
+
+        Args:
+            member (int): Ensemble member
+            exc (Exception): Exception if the member failed, else None
+
+        """
+        if exc is not None or self.scheduler_client is None:
+            return
+        self.finished += 1
+        self.scheduler_client.event(member_name(member))
+        self.scheduler_client.meter("members", self.finished)
+
+    def execute(self):
+        """Execute the tasks for all members.
+
+        Raises:
+            RuntimeError: If any of the members failed
+
+        """
+        if len(self.members) == 0 or len(self.tasks) == 0:
+            logger.warning("No members or tasks in member array")
+            return
+
+        jobs = {
+            member: (self.tasks, self.member_config(member)) for member in self.members
+        }
+        failed = run_in_pool(
+            run_member_tasks,
+            jobs,
+            cores_per_job=self.cores_per_member,
+            callback=self.member_done,
+        )
+        if len(failed) > 0:
+            members = ", ".join([member_name(member) for member in sorted(failed)])
+            raise RuntimeError(f"Member array failed for {members}")
+
+
+class PerturbationArray(AbstractTask):
+    """Run the reference and all perturbed runs of the EKF in one job.
+
+    Each run gets its own pinned cores and working directory. The job fails if any
+    of the runs failed, as all of them are needed for the Jacobians.
+
+    Task arguments:
+        cores_per_run: Cores used by each run. Defaults to 1.
+
+    Args:
+        AbstractTask (AbstractTask): Base class
+    """
+
+    def __init__(self, config):
+        """Construct the PerturbationArray task.
+
+        Args:
+            config (ParsedObject): Parsed configuration
+
+        """
+        AbstractTask.__init__(self, config, "PerturbationArray")
+        args = self.config.get_value("task.args").dict()
+        self.cores_per_run = int(args.get("cores_per_run", 1))
+        self.runs = ekf_perturbations(self.config)
+        self.finished = 0
+
+    def run(self):
+        """Override run. The perturbed runs handle their own working directories."""
+        self.execute()
+
+    def run_config(self, run):
+        """Get the config for a perturbed run.
+
+        Args:
+            run (dict): Task arguments of the run
+
+        Returns:
+            dict: Run config
+
+        """
+        return self.config.copy(update={"task": {"args": run}}).dict()
+
+    def run_done(self, pert, exc):
+        """Report a finished run to the scheduler.
+
+        Args:
+            pert (str): Perturbation number
+            exc (Exception): Exception if the run failed, else None
+
+        """
+        if exc is not None or self.scheduler_client is None:
+            return
+        self.finished += 1
+        self.scheduler_client.meter("runs", self.finished)
+
+    def execute(self):
+        """Execute all perturbed runs.
+
+        Raises:
+            RuntimeError: If any of the runs failed
+
+        """
+        jobs = {
+            run["pert"]: (["PerturbedRun"], self.run_config(run)) for run in self.runs
+        }
+        failed = run_in_pool(
+            run_member_tasks,
+            jobs,
+            cores_per_job=self.cores_per_run,
+            callback=self.run_done,
+        )
+        if len(failed) > 0:
+            runs = ", ".join(
+                [task_args(run) for run in self.runs if run["pert"] in failed]
+            )
+            raise RuntimeError(f"Perturbed runs failed: {runs}")
@@ -5,32 +5,77 @@ import json
 import os
 import shutil
 import socket
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 
-import numpy as np
-import yaml
-from pysurfex.cache import Cache
-from pysurfex.file import SurfFileTypeExtension
-from pysurfex.geo import ConfProj, get_geo_object
-from pysurfex.input_methods import get_datasources
-from pysurfex.interpolation import horizontal_oi
-from pysurfex.netcdf import (
-    create_netcdf_first_guess_template,
-    oi2soda,
-    read_first_guess_netcdf_file,
-    write_analysis_netcdf_file,
-)
-from pysurfex.obsmon import write_obsmon_sqlite_file
-from pysurfex.pseudoobs import CryoclimObservationSet
-from pysurfex.read import ConvertedInput, Converter
-from pysurfex.run import BatchJob
-from pysurfex.titan import TitanDataSet, dataset_from_file, define_quality_control
-
+from ..cleanup import TRASH, empty_trash, remove_tree
 from ..config_parser import ParsedConfig
 from ..configuration import Configuration
 from ..datetime_utils import as_datetime, as_timedelta, datetime_as_string
+from ..definitions import load_definitions
 from ..experiment import ExpFromConfig
 from ..logs import logger
 from ..toolbox import FileManager
+from ..tracing import span, task_trace, traced
+
+
+def copy_back(source, destination):
+    """Move an output file to its destination.
+
+    The file is moved to a temporary file next to the destination and renamed, so
+    readers never see a partial file.
+
+    Args:
+        source (str): Output file
+        destination (str): Destination
+
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+    tmp_file = f"{destination}.tmp{os.getpid()}"
+    shutil.move(source, tmp_file)
+    os.replace(tmp_file, destination)
+    logger.info("Moved {} to {}", source, destination)
+
+
+# Domain geometries already created in this process, keyed by the domain settings
+_CONF_PROJ_GEOS = {}
+
+
+@traced("geometry")
+def get_conf_proj_geo(config):
+    """Get the ConfProj geometry of the experiment domain.
+
+    The geometry is only created once per process for each set of domain settings.
+
+    Args:
+        config (ParsedConfig): Parsed configuration
+
+    Returns:
+        ConfProj: The domain geometry
+
+    """
+    from pysurfex.geo import ConfProj
+
+    conf_proj = {
+        "nam_conf_proj_grid": {
+            "nimax": config.get_value("domain.nimax"),
+            "njmax": config.get_value("domain.njmax"),
+            "xloncen": config.get_value("domain.xloncen"),
+            "xlatcen": config.get_value("domain.xlatcen"),
+            "xdx": config.get_value("domain.xdx"),
+            "xdy": config.get_value("domain.xdy"),
+            "ilone": config.get_value("domain.ilone"),
+            "ilate": config.get_value("domain.ilate"),
+        },
+        "nam_conf_proj": {
+            "xlon0": config.get_value("domain.xlon0"),
+            "xlat0": config.get_value("domain.xlat0"),
+        },
+    }
+    key = json.dumps(conf_proj, sort_keys=True)
+    if key not in _CONF_PROJ_GEOS:
+        _CONF_PROJ_GEOS[key] = ConfProj(conf_proj)
+    return _CONF_PROJ_GEOS[key]
 
 
 class AbstractTask(object):
@@ -50,25 +95,24 @@ class AbstractTask(object):
         self.config = config
         self.name = name
         logger.debug("Create task")
-        self.fmanager = FileManager(self.config)
-        self.platform = self.fmanager.platform
-        self.settings = Configuration(self.config)
         self.dtg = as_datetime(config.get_value("general.times.basetime"))
         self.basetime = as_datetime(config.get_value("general.times.basetime"))
         self.starttime = as_datetime(config.get_value("general.times.start"))
         self.dtgbeg = as_datetime(config.get_value("general.times.start"))
 
         self.host = "0"
-        self.work_dir = self.platform.get_system_value("sfx_exp_data")
-        self.lib = self.platform.get_system_value("sfx_exp_lib")
         try:
             self.stream = self.config.get_value("general.stream")
         except AttributeError:
             self.stream = None
 
-        self.surfex_config = self.platform.get_system_value("surfex_config")
         self.sfx_exp_vars = None
-        logger.debug("   config: {}", json.dumps(config.dict(), sort_keys=True, indent=2))
+        # Set by the container to report events, labels and meters to the scheduler
+        self.scheduler_client = None
+        logger.opt(lazy=True).debug(
+            "   config: {}",
+            lambda: json.dumps(config.dict(), sort_keys=True, indent=2),
+        )
 
         mbr = self.config.get_value("general.realization")
         if isinstance(mbr, str) and mbr == "":
@@ -78,58 +122,11 @@ class AbstractTask(object):
         self.mbr = mbr
         self.members = self.config.get_value("general.realizations")
 
-        # Domain/geo
-        conf_proj = {
-            "nam_conf_proj_grid": {
-                "nimax": self.config.get_value("domain.nimax"),
-                "njmax": self.config.get_value("domain.njmax"),
-                "xloncen": self.config.get_value("domain.xloncen"),
-                "xlatcen": self.config.get_value("domain.xlatcen"),
-                "xdx": self.config.get_value("domain.xdx"),
-                "xdy": self.config.get_value("domain.xdy"),
-                "ilone": self.config.get_value("domain.ilone"),
-                "ilate": self.config.get_value("domain.ilate"),
-            },
-            "nam_conf_proj": {
-                "xlon0": self.config.get_value("domain.xlon0"),
-                "xlat0": self.config.get_value("domain.xlat0"),
-            },
-        }
-
-        self.geo = ConfProj(conf_proj)
-        self.fmanager = FileManager(config)
-        self.platform = self.fmanager.platform
         wrapper = self.config.get_value("task.wrapper")
         if wrapper is None:
             wrapper = ""
         self.wrapper = wrapper
-
-        masterodb = False
-        try:
-            lfagmap = self.config.get_value("SURFEX.IO.LFAGMAP")
-        except AttributeError:
-            lfagmap = False
         self.csurf_filetype = self.config.get_value("SURFEX.IO.CSURF_FILETYPE")
-        self.suffix = SurfFileTypeExtension(
-            self.csurf_filetype, lfagmap=lfagmap, masterodb=masterodb
-        ).suffix
-
-        # TODO Move to config
-        ###########################################################################
-        wrk = self.config.get_value("system.wrk")
-        self.wrk = self.platform.substitute(wrk)
-        os.makedirs(self.wrk, exist_ok=True)
-        archive = self.platform.get_system_value("archive_dir")
-        self.archive = self.platform.substitute(archive)
-
-        os.makedirs(self.archive, exist_ok=True)
-        self.bindir = self.platform.get_system_value("bin_dir")
-
-        self.extrarch = self.platform.get_system_value("extrarch_dir")
-
-        os.makedirs(self.extrarch, exist_ok=True)
-        self.obsdir = self.platform.get_system_value("obs_dir")
-        os.makedirs(self.obsdir, exist_ok=True)
 
         # TODO
         self.fgint = as_timedelta(self.config.get_value("general.times.cycle_length"))
@@ -138,19 +135,10 @@ class AbstractTask(object):
         self.next_dtg = self.dtg + self.fcint
         self.next_dtgpp = self.next_dtg
 
-        first_guess_dir = self.platform.get_system_value("archive_dir")
-        first_guess_dir = self.platform.substitute(first_guess_dir, basetime=self.fg_dtg)
-        self.first_guess_dir = first_guess_dir
-        self.namelist_defs = self.platform.get_system_value("namelist_defs")
-        self.binary_input_files = self.platform.get_system_value("binary_input_files")
-        ###########################################################################
-
         self.pid = str(os.getpid())
-        wdir = f"{self.wrk}/{socket.gethostname()}{self.pid}"
-        self.wdir = wdir
-
-        self.fg_guess_sfx = self.wrk + "/first_guess_sfx"
-        self.fc_start_sfx = self.wrk + "/fc_start_sfx"
+        # Declared outputs being copied back and the thread doing it
+        self.outputs = []
+        self.output_executor = None
 
         self.translation = {
             "t2m": "air_temperature_2m",
@@ -159,10 +147,157 @@ class AbstractTask(object):
         }
         self.obs_types = self.config.get_value("SURFEX.ASSIM.OBS.COBS_M")
 
-        self.nnco = self.settings.get_nnco(dtg=self.basetime)
-        update = {"SURFEX": {"ASSIM": {"OBS": {"NNCO": self.nnco}}}}
-        self.config = self.config.copy(update=update)
-        logger.debug("NNCO: {}", self.nnco)
+    # The task context below is only created when a task uses it
+
+    @cached_property
+    def fmanager(self):
+        """File manager."""
+        return FileManager(self.config)
+
+    @cached_property
+    def platform(self):
+        """Platform."""
+        return self.fmanager.platform
+
+    @cached_property
+    def settings(self):
+        """Experiment settings."""
+        return Configuration(self.config)
+
+    @cached_property
+    def geo(self):
+        """Domain geometry."""
+        return get_conf_proj_geo(self.config)
+
+    @cached_property
+    def suffix(self):
+        """Suffix of the surfex files."""
+        from pysurfex.file import SurfFileTypeExtension
+
+        masterodb = False
+        try:
+            lfagmap = self.config.get_value("SURFEX.IO.LFAGMAP")
+        except AttributeError:
+            lfagmap = False
+        return SurfFileTypeExtension(
+            self.csurf_filetype, lfagmap=lfagmap, masterodb=masterodb
+        ).suffix
+
+    @cached_property
+    def nnco(self):
+        """Observation types to assimilate in this cycle."""
+        nnco = self.settings.get_nnco(dtg=self.basetime)
+        logger.debug("NNCO: {}", nnco)
+        return nnco
+
+    @cached_property
+    def work_dir(self):
+        """Experiment data directory."""
+        return self.platform.get_system_value("sfx_exp_data")
+
+    @cached_property
+    def lib(self):
+        """Experiment library directory."""
+        return self.platform.get_system_value("sfx_exp_lib")
+
+    @cached_property
+    def surfex_config(self):
+        """Surfex config."""
+        return self.platform.get_system_value("surfex_config")
+
+    # TODO Move to config
+    ###########################################################################
+    @cached_property
+    def wrk(self):
+        """Work directory. Created on first use."""
+        wrk = self.platform.substitute(self.config.get_value("system.wrk"))
+        os.makedirs(wrk, exist_ok=True)
+        return wrk
+
+    @cached_property
+    def archive(self):
+        """Archive directory. Created on first use."""
+        archive = self.platform.substitute(self.platform.get_system_value("archive_dir"))
+        os.makedirs(archive, exist_ok=True)
+        return archive
+
+    @cached_property
+    def bindir(self):
+        """Binary directory."""
+        return self.platform.get_system_value("bin_dir")
+
+    @cached_property
+    def extrarch(self):
+        """Extra archive directory. Created on first use."""
+        extrarch = self.platform.get_system_value("extrarch_dir")
+        os.makedirs(extrarch, exist_ok=True)
+        return extrarch
+
+    @cached_property
+    def obsdir(self):
+        """Observation directory. Created on first use."""
+        obsdir = self.platform.get_system_value("obs_dir")
+        os.makedirs(obsdir, exist_ok=True)
+        return obsdir
+
+    @cached_property
+    def first_guess_dir(self):
+        """First guess directory."""
+        first_guess_dir = self.platform.get_system_value("archive_dir")
+        return self.platform.substitute(first_guess_dir, basetime=self.fg_dtg)
+
+    @cached_property
+    def namelist_defs(self):
+        """Namelist definitions file."""
+        return self.platform.get_system_value("namelist_defs")
+
+    @cached_property
+    def binary_input_files(self):
+        """Binary input data definitions file."""
+        return self.platform.get_system_value("binary_input_files")
+
+    ###########################################################################
+
+    @cached_property
+    def scratch_root(self):
+        """Root of node local working directories. None if not configured."""
+        scratch_root = self.config.get_value("general.scratch_root", "")
+        if not scratch_root:
+            return None
+        scratch_root = os.path.expandvars(scratch_root)
+        if "$" in scratch_root:
+            logger.warning("Scratch root {} is not defined", scratch_root)
+            return None
+        return scratch_root
+
+    @cached_property
+    def wdir_root(self):
+        """Directory for the task working directories."""
+        if self.scratch_root is None:
+            return self.wrk
+        return f"{self.scratch_root}/{self.config.get_value('general.case')}"
+
+    @cached_property
+    def trash_dir(self):
+        """Trash directory on the file system of the working directories."""
+        if self.scratch_root is None:
+            return f"{self.work_dir}/{TRASH}"
+        return f"{self.wdir_root}/{TRASH}"
+
+    @cached_property
+    def wdir(self):
+        """Task working directory."""
+        return f"{self.wdir_root}/{socket.gethostname()}{self.pid}"
+
+    @cached_property
+    def fg_guess_sfx(self):
+        """First guess surfex directory."""
+        return self.wrk + "/first_guess_sfx"
+
+    @cached_property
+    def fc_start_sfx(self):
+        """Forecast start surfex directory."""
+        return self.wrk + "/fc_start_sfx"
 
     def create_wdir(self):
         """Create task working directory."""
@@ -175,16 +310,61 @@ class AbstractTask(object):
     def remove_wdir(self):
         """Remove working directory."""
         os.chdir(self.wrk)
-        shutil.rmtree(self.wdir)
+        remove_tree(self.wdir, self.trash_dir)
         logger.debug("Remove {}", self.wdir)
 
+    def declare_output(self, filename, destination):
+        """Copy an output file back to its destination in the background.
+
+        The copy is waited for in postfix, before the working directory is removed.
+
+        Args:
+            filename (str): Output file. Relative to the working directory.
+            destination (str): Destination
+
+        """
+        if self.output_executor is None:
+            self.output_executor = ThreadPoolExecutor(max_workers=1)
+        source = os.path.join(self.wdir, filename)
+        self.outputs.append(
+            (destination, self.output_executor.submit(copy_back, source, destination))
+        )
+
+    def wait_for_outputs(self, check=True):
+        """Wait for the declared outputs to be copied back.
+
+        Args:
+            check (bool, optional): Raise if an output failed. Defaults to True.
+
+        Raises:
+            RuntimeError: If any output could not be copied back
+
+        """
+        failed = []
+        for destination, future in self.outputs:
+            exc = future.exception()
+            if exc is not None:
+                logger.error("Could not copy back {}: {}", destination, repr(exc))
+                failed.append(destination)
+        self.outputs = []
+        if self.output_executor is not None:
+            self.output_executor.shutdown()
+            self.output_executor = None
+        if check and len(failed) > 0:
+            raise RuntimeError(f"Could not copy back {', '.join(failed)}")
+
     def rename_wdir(self, prefix="Failed_"):
-        """Rename failed working directory."""
+        """Rename failed working directory.
+
+        The working directory is moved to the experiment data directory, also when
+        it is on node local scratch.
+        """
+        self.wait_for_outputs(check=False)
         fdir = f"{self.wrk}/{prefix}{self.name}"
         if os.path.isdir(self.wdir):
             if os.path.exists(fdir):
                 logger.debug("{} exists. Remove it", fdir)
-                shutil.rmtree(fdir)
+                remove_tree(fdir, f"{self.work_dir}/{TRASH}")
             shutil.move(self.wdir, fdir)
             logger.info("Renamed {} to {}", self.wdir, fdir)
 
@@ -211,6 +391,7 @@ class AbstractTask(object):
 
         """
         logger.debug("Base class post")
+        self.wait_for_outputs()
         # Clean workdir
         if self.config.get_value("general.keep_workdirs"):
             self.rename_wdir(prefix=f"Finished_task_{self.pid}_")
@@ -223,15 +404,41 @@ class AbstractTask(object):
         Define run sequence.
 
         """
-        self.prepfix()
-        self.execute()
-        self.postfix()
+        with task_trace(self.name, self.config):
+            with span("prepfix"):
+                self.prepfix()
+            with span("execute"):
+                self.execute()
+            with span("postfix"):
+                self.postfix()
+
+
+class Dummy(AbstractTask):
+    """A task doing nothing. Useful to measure the overhead of running a task.
+
+    Args:
+        AbstractTask (AbstractTask): Base class
+    """
+
+    def __init__(self, config):
+        """Construct the Dummy task.
+
+        Args:
+            config (ParsedObject): Parsed configuration
+
+        """
+        AbstractTask.__init__(self, config, "Dummy")
+
+    def execute(self):
+        """Execute."""
+        logger.info("Dummy task")
 
 
 class PrepareCycle(AbstractTask):
     """Prepare for th cycle to be run.
 
-    Clean up existing directories.
+    Clean up existing directories. They are moved to the trash and deleted in the
+    background, together with anything left in the trash by earlier tasks.
 
     Args:
         AbstractTask (_type_): _description_
@@ -252,8 +459,9 @@ class PrepareCycle(AbstractTask):
 
     def execute(self):
         """Execute."""
-        if os.path.exists(self.wrk):
-            shutil.rmtree(self.wrk)
+        trash_dir = f"{self.work_dir}/{TRASH}"
+        empty_trash(trash_dir)
+        remove_tree(self.wrk, trash_dir)
 
 
 class QualityControl(AbstractTask):
@@ -275,6 +483,9 @@ class QualityControl(AbstractTask):
 
     def execute(self):
         """Execute."""
+        from pysurfex.input_methods import get_datasources
+        from pysurfex.titan import TitanDataSet, define_quality_control
+
         an_time = self.dtg
 
         sfx_lib = self.platform.get_system_value("sfx_exp_lib")
@@ -477,6 +688,13 @@ class OptimalInterpolation(AbstractTask):
 
     def execute(self):
         """Execute."""
+        from pysurfex.interpolation import horizontal_oi
+        from pysurfex.netcdf import (
+            read_first_guess_netcdf_file,
+            write_analysis_netcdf_file,
+        )
+        from pysurfex.titan import dataset_from_file
+
         if self.var_name in self.translation:
             var = self.translation[self.var_name]
         else:
@@ -623,6 +841,9 @@ class CryoClim2json(AbstractTask):
 
     def execute(self):
         """Execute."""
+        from pysurfex.netcdf import read_first_guess_netcdf_file
+        from pysurfex.pseudoobs import CryoclimObservationSet
+
         var = "surface_snow_thickness"
         input_file = self.archive + "/raw_" + var + ".nc"
 
@@ -717,6 +938,8 @@ class Oi2soda(AbstractTask):
 
     def execute(self):
         """Execute."""
+        from pysurfex.netcdf import oi2soda
+
         yy2 = self.dtg.strftime("%y")
         mm2 = self.dtg.strftime("%m")
         dd2 = self.dtg.strftime("%d")
@@ -787,6 +1010,8 @@ class Qc2obsmon(AbstractTask):
 
     def execute(self):
         """Execute."""
+        from pysurfex.obsmon import write_obsmon_sqlite_file
+
         outdir = self.extrarch + "/ecma_sfc/" + self.dtg.strftime("%Y%m%d%H") + "/"
         os.makedirs(outdir, exist_ok=True)
         output = outdir + "/ecma.db"
@@ -847,6 +1072,11 @@ class FirstGuess4OI(AbstractTask):
 
     def execute(self):
         """Execute."""
+        import yaml
+
+        from ..grib_inventory import indexed_grib_reads
+        from ..interpolation_cache import PersistentCache, interpolation_cache
+
         validtime = self.dtg
 
         kwargs = {}
@@ -893,11 +1123,13 @@ class FirstGuess4OI(AbstractTask):
 
         output = self.archive + "/raw" + extra + ".nc"
         cache_time = 3600
-        cache = Cache(cache_time)
+        weights_dir = self.platform.get_system_value("climdir")
+        cache = PersistentCache(cache_time, weights_dir)
         if os.path.exists(output):
             logger.info("Output already exists {}", output)
         else:
-            self.write_file(output, variables, self.geo, validtime, cache=cache)
+            with interpolation_cache(weights_dir), indexed_grib_reads():
+                self.write_file(output, variables, self.geo, validtime, cache=cache)
 
         # Create symlinks
         for target, linkfile in symlink_files.items():
@@ -920,6 +1152,12 @@ class FirstGuess4OI(AbstractTask):
             RuntimeError: No valid data read
 
         """
+        import numpy as np
+        import yaml
+        from pysurfex.geo import get_geo_object
+        from pysurfex.netcdf import create_netcdf_first_guess_template
+        from pysurfex.read import ConvertedInput, Converter
+
         f_g = None
         for var in variables:
             lvar = var.lower()
@@ -968,8 +1206,7 @@ class FirstGuess4OI(AbstractTask):
             else:
 
                 config_file = self.platform.get_system_value("first_guess_yml")
-                with open(config_file, mode="r", encoding="utf-8") as file_handler:
-                    config = yaml.safe_load(file_handler)
+                config = load_definitions(config_file)
 
 
             logger.info("config_file={}", config_file)
@@ -1105,6 +1342,8 @@ class FetchMarsObs(AbstractTask):
 
     def execute(self):
         """Execute."""
+        from pysurfex.run import BatchJob
+
         basetime_str = self.basetime.strftime("%Y%m%d%H")
         date_str = self.basetime.strftime("%Y%m%d")
         obfile = f"{self.obsdir}/ob{basetime_str}"
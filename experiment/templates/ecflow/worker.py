@@ -0,0 +1,72 @@
+"""Ecflow container running the task in a resident worker."""
+# @ENV_SUB1@
+
+import sys
+
+from experiment import PACKAGE_NAME
+from experiment.logs import logger
+from experiment.worker import WorkerLostError, ecflow_request, run_in_worker
+
+# @ENV_SUB2@
+
+
+logger.enable(PACKAGE_NAME)
+
+
+def parse_ecflow_vars():
+    """Parse the ecflow variables."""
+    return {
+        "CONFIG": "%CONFIG%",
+        "WRAPPER": "%WRAPPER%",
+        "ENSMBR": "%ENSMBR%",
+        "DTG": "%DTG%",
+        "DTGPP": "%DTGPP%",
+        "STREAM": "%STREAM%",
+        "TASK_NAME": "%TASK%",
+        "VAR_NAME": "%VAR_NAME%",
+        "LOGLEVEL": "%LOGLEVEL%",
+        "ARGS": "%ARGS%",
+        "BUNDLE_TASKS": "%BUNDLE_TASKS%",
+        "WORKER_SOCKET": "%WORKER_SOCKET%",
+        "ECF_NAME": "%ECF_NAME%",
+        "ECF_PASS": "%ECF_PASS%",
+        "ECF_TRYNO": "%ECF_TRYNO%",
+        "ECF_RID": "%ECF_RID%",
+    }
+
+
+"""
+%nopp"
+"""
+
+
+def worker_main(**kwargs):
+    """Ecflow container worker method.
+
+    Falls back to running the task in this process if no worker is available. The
+    task is aborted if the worker is lost while running it.
+    """
+    try:
+        exit_code = run_in_worker(kwargs.get("WORKER_SOCKET"), ecflow_request(**kwargs))
+    except WorkerLostError as exc:
+        from experiment.scheduler.container import ecflow_abort
+
+        ecflow_abort(str(exc), **kwargs)
+        sys.exit(1)
+    if exit_code is None:
+        from experiment.scheduler.container import ecflow_main
+
+        ecflow_main(**kwargs)
+    else:
+        sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    # Get ecflow variables
+    kwargs_main = parse_ecflow_vars()
+
+    worker_main(**kwargs_main)
+
+"""    # noqa
+%end"  # noqa
+"""  # noqa
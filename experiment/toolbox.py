@@ -4,6 +4,7 @@ import re
 
 from .datetime_utils import as_datetime
 from .logs import logger
+from .tracing import traced
 
 
 class ArchiveError(Exception):
@@ -366,6 +367,7 @@ class FileManager:
         self.platform = Platform(config)
         logger.debug("Constructed FileManager object.")
 
+    @traced("FileManager.get_input")
     def get_input(
         self,
         target,
@@ -468,6 +470,7 @@ class FileManager:
             provider_id=provider_id,
         )
 
+    @traced("FileManager.get_output")
     def get_output(
         self,
         target,
@@ -0,0 +1,190 @@
+"""Trace where tasks spend their time.
+
+Spans are recorded when the environment variable PYSURFEX_EXPERIMENT_TRACE or the
+config setting general.trace_dir is set to a directory. The spans of each task are
+written to that directory in the Chrome trace event format, which can be opened in
+chrome://tracing or https://ui.perfetto.dev. When tracing is disabled a span costs
+one attribute lookup.
+"""
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from .logs import logger
+
+TRACE_ENV = "PYSURFEX_EXPERIMENT_TRACE"
+
+
+class Tracer:
+    """Collect spans and write them as Chrome trace events."""
+
+    def __init__(self, trace_dir=None):
+        """Construct the tracer.
+
+        Args:
+            trace_dir (str, optional): Directory for the trace files. Tracing is
+                                       disabled if None. Defaults to None.
+
+        """
+        self.trace_dir = trace_dir
+        self.events = []
+        self.open_tasks = 0
+
+    @property
+    def enabled(self):
+        """Whether spans are recorded."""
+        return bool(self.trace_dir)
+
+    def add_span(self, name, start, end, args=None):
+        """Add a finished span.
+
+        Args:
+            name (str): Span name
+            start (int): Start time in ns since the epoch
+            end (int): End time in ns since the epoch
+            args (dict, optional): Extra information shown for the span.
+                                   Defaults to None.
+
+        """
+        event = {
+            "name": name,
+            "cat": "experiment",
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = {key: str(val) for key, val in args.items()}
+        self.events.append(event)
+
+    def write(self, filename):
+        """Write the recorded spans and start over.
+
+        Args:
+            filename (str): Trace file
+
+        """
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        with open(filename, mode="w", encoding="utf-8") as fhandler:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, fhandler)
+        self.events = []
+        logger.info("Wrote trace {}", filename)
+
+
+class _Span:
+    """Record the time spent in a with block."""
+
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.tracer.add_span(self.name, self.start, time.time_ns(), self.args)
+        return False
+
+
+_TRACER = Tracer(os.environ.get(TRACE_ENV))
+_NO_SPAN = nullcontext()
+
+
+def get_tracer():
+    """Get the tracer of this process.
+
+    Returns:
+        Tracer: The tracer
+
+    """
+    return _TRACER
+
+
+def configure_tracing(config):
+    """Enable tracing if set in the config and not already enabled.
+
+    Args:
+        config (ParsedConfig): Parsed config
+
+    """
+    if not _TRACER.enabled:
+        _TRACER.trace_dir = config.get_value("general.trace_dir", "")
+
+
+def span(name, **args):
+    """Trace a with block.
+
+    Args:
+        name (str): Span name
+        args (dict): Extra information shown for the span
+
+    Returns:
+        contextlib.AbstractContextManager: Context manager recording the span
+
+    """
+    if not _TRACER.enabled:
+        return _NO_SPAN
+    return _Span(_TRACER, name, args)
+
+
+def traced(name=None):
+    """Trace all calls of a function.
+
+    Args:
+        name (str, optional): Span name. Defaults to the function name.
+
+    Returns:
+        callable: Decorator
+
+    """
+
+    def decorator(function):
+        span_name = function.__qualname__ if name is None else name
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _TRACER.enabled:
+                return function(*args, **kwargs)
+            with _Span(_TRACER, span_name, None):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def task_trace(name, config=None):
+    """Trace a task and write its trace file when the outermost task finishes.
+
+    Args:
+        name (str): Task name
+        config (ParsedConfig, optional): Config that may enable tracing.
+                                         Defaults to None.
+
+    Yields:
+        None
+
+    """
+    if config is not None:
+        configure_tracing(config)
+    _TRACER.open_tasks += 1
+    start = time.time_ns()
+    try:
+        yield
+    finally:
+        _TRACER.open_tasks -= 1
+        if _TRACER.enabled:
+            _TRACER.add_span(name, start, time.time_ns(), {"task": name})
+            if _TRACER.open_tasks == 0:
+                _TRACER.write(f"{_TRACER.trace_dir}/{name}_{os.getpid()}.trace.json")
@@ -0,0 +1,415 @@
+"""Resident task worker.
+
+A worker preloads the heavy modules and keeps parsed configs in memory. Jobs send
+their task to the worker over a Unix socket. Each task runs in a forked child with
+stdout and stderr connected to the socket. The job script therefore gets the task
+output and exit code as if the task had run in its own process.
+
+This module is imported by the thin job scripts and must only import light modules at
+module level.
+"""
+import atexit
+import importlib
+import json
+import os
+import selectors
+import signal
+import socket
+import statistics
+import subprocess  # noqa S404
+import sys
+import time
+import traceback
+
+from .logs import logger
+
+DEFAULT_PRELOAD = [
+    "experiment.scheduler.container",
+    "experiment.tasks.tasks",
+    "experiment.tasks.surfex_binary_task",
+    "experiment.tasks.forcing",
+]
+EXIT_MARKER = b"\0EXIT "
+# Output kept back by the client until the exit marker can be recognized
+_TAIL_SIZE = 64
+
+
+class WorkerLostError(RuntimeError):
+    """The connection to the worker was lost before the task had finished."""
+
+
+class TaskWorker:
+    """Serve task requests on a Unix socket."""
+
+    def __init__(self, socket_path, preload=None, request_timeout=10.0):
+        """Construct the worker.
+
+        Args:
+            socket_path (str): Path to the Unix socket
+            preload (list, optional): Modules to import before serving.
+                                      Defaults to DEFAULT_PRELOAD.
+            request_timeout (float, optional): Seconds to wait for the request of a
+                                               new connection. Defaults to 10.
+
+        """
+        self.socket_path = socket_path
+        if preload is None:
+            preload = DEFAULT_PRELOAD
+        self.preload = preload
+        self.request_timeout = request_timeout
+        self.configs = {}
+        self.children = {}
+        # File descriptors of the server, closed in the children
+        self.server_fds = []
+
+    def preload_modules(self):
+        """Import the modules to share with the children."""
+        for module in self.preload:
+            logger.info("Preloading {}", module)
+            try:
+                importlib.import_module(module)
+            except ImportError as exc:
+                logger.warning("Could not preload {}: {}", module, repr(exc))
+
+    def get_config(self, config_file):
+        """Get a parsed config. Configs are cached until the file is modified.
+
+        Args:
+            config_file (str): Config file
+
+        Returns:
+            ParsedConfig: Parsed config
+
+        """
+        from .config_parser import MAIN_CONFIG_JSON_SCHEMA, ParsedConfig
+        from .tasks.tasks import get_conf_proj_geo
+
+        key = (config_file, os.stat(config_file).st_mtime_ns)
+        if key not in self.configs:
+            logger.info("Parsing config {}", config_file)
+            config = ParsedConfig.from_file(
+                config_file, json_schema=MAIN_CONFIG_JSON_SCHEMA
+            )
+            # Create the domain geometry once so the children inherit it
+            try:
+                get_conf_proj_geo(config)
+            except AttributeError as exc:
+                logger.warning("Could not create domain geometry: {}", repr(exc))
+            self.configs = {
+                ckey: cval
+                for ckey, cval in self.configs.items()
+                if ckey[0] != config_file
+            }
+            self.configs[key] = config
+        return self.configs[key]
+
+    def serve(self, poll_interval=0.5):
+        """Serve requests until interrupted.
+
+        The worker wakes up on SIGCHLD, so the exit code is sent as soon as a child
+        has finished.
+
+        Args:
+            poll_interval (float, optional): Maximum seconds between checks for
+                                             finished children. Defaults to 0.5.
+
+        """
+        self.preload_modules()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(self.socket_path)
+            server.listen()
+            logger.info("Worker {} listening on {}", os.getpid(), self.socket_path)
+            wakeup_read, wakeup_write = os.pipe()
+            os.set_blocking(wakeup_write, False)
+            old_wakeup_fd = signal.set_wakeup_fd(wakeup_write)
+            old_handler = signal.signal(signal.SIGCHLD, lambda *args: None)
+            selector = selectors.DefaultSelector()
+            selector.register(server, selectors.EVENT_READ)
+            selector.register(wakeup_read, selectors.EVENT_READ)
+            self.server_fds = [
+                server.fileno(),
+                selector.fileno(),
+                wakeup_read,
+                wakeup_write,
+            ]
+            try:
+                while True:
+                    for key, __ in selector.select(poll_interval):
+                        if key.fileobj is server:
+                            conn, __ = server.accept()
+                            self.handle(conn)
+                        else:
+                            os.read(wakeup_read, 512)
+                    self.reap()
+            finally:
+                self.server_fds = []
+                signal.signal(signal.SIGCHLD, old_handler)
+                signal.set_wakeup_fd(old_wakeup_fd)
+                selector.close()
+                os.close(wakeup_read)
+                os.close(wakeup_write)
+                os.unlink(self.socket_path)
+
+    def handle(self, conn):
+        """Start a child for a request.
+
+        A client not sending its request within request_timeout seconds is
+        disconnected, so it can not block the other jobs.
+
+        Args:
+            conn (socket.socket): Connection from the job
+
+        """
+        try:
+            conn.settimeout(self.request_timeout)
+            with conn.makefile("rb") as reader:
+                request = json.loads(reader.readline().decode("utf-8"))
+            # The connection becomes stdout and stderr of the child
+            conn.settimeout(None)
+            config = self.get_config(request["config"])
+        except (OSError, ValueError, KeyError) as exc:
+            logger.error("Invalid request: {}", repr(exc))
+            try:
+                conn.sendall(f"Invalid request: {exc!r}\n".encode("utf-8"))
+                conn.sendall(EXIT_MARKER + b"1\n")
+            except OSError:
+                pass
+            conn.close()
+            return
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            signal.set_wakeup_fd(-1)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            # Only the exit handlers registered by the task are run in the child
+            atexit._clear()  # noqa SLF001
+            try:
+                # The server and the connections of other running tasks must only be
+                # kept by the parent
+                for server_fd in self.server_fds:
+                    os.close(server_fd)
+                for other_conn in self.children.values():
+                    other_conn.close()
+                exit_code = self.run_child(conn, request, config)
+            finally:
+                atexit._run_exitfuncs()  # noqa SLF001
+                sys.stdout.flush()
+                sys.stderr.flush()
+                os._exit(exit_code)
+        logger.info("Started child {} for {}", pid, request.get("task"))
+        self.children[pid] = conn
+
+    def reap(self):
+        """Send the exit code of finished children to their jobs."""
+        while len(self.children) > 0:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            conn = self.children.pop(pid, None)
+            if conn is None:
+                continue
+            exit_code = os.waitstatus_to_exitcode(status)
+            logger.info("Child {} finished with exit code {}", pid, exit_code)
+            try:
+                conn.sendall(EXIT_MARKER + f"{exit_code}\n".encode("utf-8"))
+            except OSError as exc:
+                logger.warning("Could not report exit code: {}", repr(exc))
+            conn.close()
+
+    @staticmethod
+    def run_child(conn, request, config):
+        """Run the task in the forked child.
+
+        Args:
+            conn (socket.socket): Connection from the job
+            request (dict): The request
+            config (ParsedConfig): Parsed config
+
+        Returns:
+            int: Exit code
+
+        """
+        with open(os.devnull, mode="rb") as devnull:
+            os.dup2(devnull.fileno(), 0)
+        os.dup2(conn.fileno(), 1)
+        os.dup2(conn.fileno(), 2)
+        conn.close()
+        os.environ.update(request.get("env", {}))
+        os.chdir(request.get("cwd", os.getcwd()))
+        try:
+            if request.get("mode") == "ecflow":
+                from .scheduler.container import ecflow_main
+
+                ecflow_main(config=config, **request["kwargs"])
+            else:
+                from .tasks.discover_tasks import get_task
+
+                get_task(request["task"], config).run()
+        except SystemExit as exc:
+            if isinstance(exc.code, int):
+                return exc.code
+            return 0 if exc.code is None else 1
+        except BaseException:  # noqa B036
+            traceback.print_exc()
+            return 1
+        return 0
+
+
+def ecflow_request(**kwargs):
+    """Create a worker request for an ecflow job.
+
+    Args:
+        kwargs (dict): Ecflow variables
+
+    Returns:
+        dict: The request
+
+    """
+    return {
+        "mode": "ecflow",
+        "task": kwargs.get("TASK_NAME"),
+        "config": kwargs.get("CONFIG"),
+        "kwargs": kwargs,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+
+
+def task_request(task, config_file):
+    """Create a worker request for a task without scheduler.
+
+    Args:
+        task (str): Task name
+        config_file (str): Config file
+
+    Returns:
+        dict: The request
+
+    """
+    return {
+        "mode": "task",
+        "task": task,
+        "config": config_file,
+        "cwd": os.getcwd(),
+        "env": dict(os.environ),
+    }
+
+
+def run_in_worker(socket_path, request, stream=None):
+    """Run a request in the worker and stream the output.
+
+    Args:
+        socket_path (str): Path to the worker socket
+        request (dict): The request
+        stream (io.BufferedIOBase, optional): Where to write the task output.
+                                              Defaults to sys.stdout.buffer.
+
+    Raises:
+        WorkerLostError: If the connection is lost before the exit code is received
+
+    Returns:
+        int: Exit code of the task. None if no worker is available.
+
+    """
+    if socket_path is None or socket_path == "":
+        return None
+    if stream is None:
+        stream = sys.stdout.buffer
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError as exc:
+        logger.info("No worker available on {}: {}", socket_path, repr(exc))
+        sock.close()
+        return None
+
+    with sock:
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+        pending = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                break
+            pending += data
+            if len(pending) > _TAIL_SIZE:
+                stream.write(pending[:-_TAIL_SIZE])
+                stream.flush()
+                pending = pending[-_TAIL_SIZE:]
+
+    index = pending.rfind(EXIT_MARKER)
+    if index < 0:
+        stream.write(pending)
+        stream.flush()
+        raise WorkerLostError(f"Lost connection to worker {socket_path}")
+    stream.write(pending[:index])
+    stream.flush()
+    return int(pending[index + len(EXIT_MARKER) :].strip())
+
+
+def run_task_locally(task, config_file):
+    """Run a task without scheduler in this process.
+
+    Args:
+        task (str): Task name
+        config_file (str): Config file
+
+    """
+    from .config_parser import MAIN_CONFIG_JSON_SCHEMA, ParsedConfig
+    from .tasks.discover_tasks import get_task
+
+    config = ParsedConfig.from_file(config_file, json_schema=MAIN_CONFIG_JSON_SCHEMA)
+    get_task(task, config).run()
+
+
+def benchmark(socket_path, config_file, task="Dummy", repeat=5):
+    """Compare the latency of a task in a new interpreter and in the worker.
+
+    Args:
+        socket_path (str): Path to the worker socket
+        config_file (str): Config file
+        task (str, optional): Task to run. Defaults to "Dummy".
+        repeat (int, optional): Number of runs. Defaults to 5.
+
+    Raises:
+        RuntimeError: If the task fails or no worker is available
+
+    Returns:
+        dict: Median latency in seconds for "cold" and "warm" runs
+
+    """
+    code = (
+        "from experiment.worker import run_task_locally; "
+        f"run_task_locally({task!r}, {config_file!r})"
+    )
+    cold = []
+    warm = []
+    with open(os.devnull, mode="wb") as devnull:
+        for __ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(  # noqa S603
+                [sys.executable, "-c", code], stdout=devnull, stderr=devnull, check=True
+            )
+            cold.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            exit_code = run_in_worker(
+                socket_path, task_request(task, config_file), stream=devnull
+            )
+            warm.append(time.perf_counter() - start)
+            if exit_code != 0:
+                raise RuntimeError(f"Task {task} failed in worker with {exit_code}")
+
+    result = {"cold": statistics.median(cold), "warm": statistics.median(warm)}
+    logger.info(
+        "Task {}: cold {:.3f}s warm {:.3f}s ({} runs)",
+        task,
+        result["cold"],
+        result["warm"],
+        repeat,
+    )
+    return result
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""Benchmark netCDF layouts of the forcing files.
+
+Writes a synthetic forcing file in the default layout and copies it with each layout
+in LAYOUTS using repack_forcing_file. For each layout it reports the write time, the
+time to read it like the OFFLINE binary does, one time step of all points for each
+variable, and the file size.
+
+Usage: python tests/benchmark/forcing_layout.py --points 100000 --times 25
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from netCDF4 import Dataset
+
+from experiment.tasks.forcing import repack_forcing_file
+
+VARIABLES = [
+    "Tair",
+    "Qair",
+    "PSurf",
+    "DIR_SWdown",
+    "SCA_SWdown",
+    "LWdown",
+    "Rainf",
+    "Snowf",
+    "Wind",
+    "Wind_DIR",
+    "CO2air",
+]
+
+LAYOUTS = {
+    "default": None,
+    "chunked": {"chunk_time": 1},
+    "zlib": {"zlib": True, "complevel": 4, "shuffle": True, "chunk_time": 1},
+    "zlib_quantised": {
+        "zlib": True,
+        "complevel": 4,
+        "shuffle": True,
+        "chunk_time": 1,
+        "least_significant_digit": {name: 3 for name in VARIABLES},
+    },
+}
+
+
+def write_synthetic_forcing(filename, npoints, ntimes):
+    """Write a forcing file with smooth random fields in the default layout.
+
+    Args:
+        filename (str): Forcing file
+        npoints (int): Number of points
+        ntimes (int): Number of time steps
+
+    """
+    rng = np.random.default_rng(1)
+    with Dataset(filename, mode="w", format="NETCDF3_64BIT_OFFSET") as nc_file:
+        nc_file.createDimension("Number_of_points", npoints)
+        nc_file.createDimension("time", None)
+        time_var = nc_file.createVariable("time", "f8", ("time",))
+        time_var.units = "hours since 2023-01-01 00:00:00 0:00"
+        time_var[:] = np.arange(ntimes)
+        zs_var = nc_file.createVariable("ZS", "f4", ("Number_of_points",))
+        zs_var[:] = rng.uniform(0, 2000, npoints)
+        base = np.cumsum(rng.normal(size=npoints)) / np.sqrt(npoints)
+        for ivar, name in enumerate(VARIABLES):
+            var = nc_file.createVariable(name, "f4", ("time", "Number_of_points"))
+            for itime in range(ntimes):
+                var[itime, :] = 100 * ivar + base + 0.1 * itime
+
+
+def read_like_offline(filename):
+    """Read a forcing file one time step of all points at a time.
+
+    Args:
+        filename (str): Forcing file
+
+    """
+    with Dataset(filename, mode="r") as nc_file:
+        for itime in range(len(nc_file.dimensions["time"])):
+            for name in VARIABLES:
+                nc_file[name][itime, :]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--points", type=int, default=100000, help="Number of points")
+    parser.add_argument("--times", type=int, default=25, help="Number of time steps")
+    parser.add_argument("--dir", default=None, help="Directory for the files")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+        source = f"{tmpdir}/FORCING_source.nc"
+        write_synthetic_forcing(source, args.points, args.times)
+        print(f"{'layout':<16}{'write [s]':>12}{'read [s]':>12}{'size [MB]':>12}")
+        for layout, encoding in LAYOUTS.items():
+            filename = f"{tmpdir}/FORCING_{layout}.nc"
+            tic = time.perf_counter()
+            repack_forcing_file(source, filename, encoding)
+            write_time = time.perf_counter() - tic
+            tic = time.perf_counter()
+            read_like_offline(filename)
+            read_time = time.perf_counter() - tic
+            size = os.path.getsize(filename) / 1e6
+            print(f"{layout:<16}{write_time:>12.3f}{read_time:>12.3f}{size:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Benchmark the peak memory of splitting a MARS retrieval in GRIB files.
+
+Builds a synthetic retrieval from the eccodes GRIB2 sample with the parameters,
+hours and steps PrefetchMars retrieves, and splits growing parts of it with
+split_files in a child process. The peak resident memory of the child should not
+grow with the size of the input.
+
+Usage: python tests/benchmark/grib_split_memory.py --size-gb 2
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+from multiprocessing import get_context
+
+import eccodes as ec
+import numpy as np
+
+from experiment.tasks.prefetch_mars import params_acc, params_inst, params_ml, split_files
+
+
+def write_retrieval(filename, size_bytes, npoints):
+    """Write a synthetic MARS retrieval.
+
+    Args:
+        filename (str): GRIB file
+        size_bytes (int): Approximate size of the file in bytes
+        npoints (int): Number of grid points in each side of the fields
+
+    Returns:
+        int: Number of messages
+
+    """
+    template = ec.codes_grib_new_from_samples("regular_ll_sfc_grib2")
+    ec.codes_set(template, "Ni", npoints)
+    ec.codes_set(template, "Nj", npoints)
+    ec.codes_set(template, "bitsPerValue", 16)
+    rng = np.random.default_rng(1)
+    ec.codes_set_values(template, rng.uniform(250, 300, npoints * npoints))
+
+    fields = [(0, param) for param in params_inst + params_ml]
+    fields += [(step, param) for step in [1, 2, 3] for param in params_acc + params_inst]
+    fields = [(step, param) for step, param in fields if _encodable(template, param)]
+    written = 0
+    nmessages = 0
+    day = 0
+    with open(filename, mode="wb") as fhandler:
+        while written < size_bytes:
+            date = int(time.strftime("%Y%m%d", time.gmtime(1672531200 + 86400 * day)))
+            for hour in range(0, 24, 3):
+                for step, param in fields:
+                    gid = ec.codes_clone(template)
+                    ec.codes_set(gid, "date", date)
+                    ec.codes_set(gid, "hour", hour)
+                    ec.codes_set(gid, "paramId", param)
+                    ec.codes_set(gid, "step", step)
+                    ec.codes_write(gid, fhandler)
+                    ec.codes_release(gid)
+                    nmessages += 1
+            written = fhandler.tell()
+            day += 1
+    ec.codes_release(template)
+    return nmessages
+
+
+def _encodable(template, param):
+    """Check if the GRIB2 tables of eccodes have a parameter."""
+    gid = ec.codes_clone(template)
+    try:
+        ec.codes_set(gid, "paramId", param)
+    except ec.GribInternalError:
+        return False
+    finally:
+        ec.codes_release(gid)
+    return True
+
+
+def _split(file_in, dest):
+    """Split a retrieval in a child process."""
+    split_files(file_in, dest)
+
+
+def peak_rss_of_split(file_in, dest):
+    """Split a retrieval in a new process and get its peak memory.
+
+    Args:
+        file_in (str): GRIB file
+        dest (str): Output directory, ending with a slash
+
+    Returns:
+        tuple: Time in seconds and peak resident memory in MB
+
+    """
+    tic = time.perf_counter()
+    process = get_context("spawn").Process(target=_split, args=(file_in, dest))
+    process.start()
+    process.join()
+    elapsed = time.perf_counter() - tic
+    return elapsed, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-gb", type=float, default=2.0, help="Largest input size")
+    parser.add_argument("--points", type=int, default=700, help="Grid points per side")
+    parser.add_argument("--dir", default=None, help="Directory for the files")
+    args = parser.parse_args()
+
+    print(f"{'input [MB]':>12}{'messages':>10}{'time [s]':>10}{'peak RSS [MB]':>15}")
+    for fraction in [0.25, 0.5, 1.0]:
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmpdir:
+            file_in = f"{tmpdir}/mars.grib2"
+            nmessages = write_retrieval(
+                file_in, int(fraction * args.size_gb * 1e9), args.points
+            )
+            os.makedirs(f"{tmpdir}/split")
+            elapsed, peak_rss = peak_rss_of_split(file_in, f"{tmpdir}/split/")
+            size = os.path.getsize(file_in) / 1e6
+            print(f"{size:>12.0f}{nmessages:>10}{elapsed:>10.1f}{peak_rss:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
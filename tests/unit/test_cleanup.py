@@ -0,0 +1,47 @@
+"""Test the deferred removal of directory trees."""
+import os
+
+from experiment.cleanup import TRASH, empty_trash, remove_tree
+
+
+def test_remove_tree(tmp_path):
+    tree = tmp_path / "2023010103" / "000"
+    tree.mkdir(parents=True)
+    (tree / "SURFOUT.nc").write_text("surfout")
+    trash_dir = str(tmp_path / TRASH)
+
+    remove_tree(str(tree.parent), trash_dir, detach=False)
+    assert not tree.parent.exists()
+    assert os.listdir(trash_dir) == []
+
+    # Leftovers are removed when the trash is emptied
+    (tmp_path / TRASH / "leftover").mkdir()
+    (tmp_path / TRASH / "leftover" / "PREP.nc").write_text("prep")
+    empty_trash(trash_dir, detach=False)
+    assert os.listdir(trash_dir) == []
+
+
+def test_remove_missing_tree(tmp_path):
+    remove_tree(str(tmp_path / "missing"), str(tmp_path / TRASH))
+    assert not (tmp_path / TRASH).exists()
+
+
+def test_remove_tree_in_place(tmp_path):
+    # The trash can not be created, so everything is removed in place
+    trash_dir = tmp_path / TRASH
+    trash_dir.write_text("not a directory")
+    tree = tmp_path / "2023010103"
+    tree.mkdir()
+    (tree / "SURFOUT.nc").write_text("surfout")
+    surfout = tmp_path / "SURFOUT.nc"
+    surfout.write_text("surfout")
+    link = tmp_path / "link"
+    link.symlink_to(tree)
+
+    remove_tree(str(link), str(trash_dir), detach=False)
+    assert not os.path.lexists(link)
+    assert tree.exists()
+    remove_tree(str(surfout), str(trash_dir), detach=False)
+    assert not surfout.exists()
+    remove_tree(str(tree), str(trash_dir), detach=False)
+    assert not tree.exists()
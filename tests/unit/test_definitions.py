@@ -0,0 +1,57 @@
+"""Unit tests for the definitions cache."""
+import glob
+import os
+
+import pytest
+
+from experiment.definitions import definitions_cache_file, load_definitions
+
+
+@pytest.fixture(autouse=True)
+def _cache_home(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", f"{tmp_path.as_posix()}/cache")
+
+
+def test_load_definitions(tmp_path):
+    filename = f"{tmp_path.as_posix()}/definitions.yml"
+    with open(filename, mode="w", encoding="utf-8") as fhandler:
+        fhandler.write("pgd:\n  nam_io_offline:\n    csurf_filetype: NC\n")
+
+    definitions = load_definitions(filename)
+    assert definitions == {"pgd": {"nam_io_offline": {"csurf_filetype": "NC"}}}
+    cache_files = glob.glob(definitions_cache_file(filename, "*"))
+    assert len(cache_files) == 1
+    assert cache_files[0].startswith(f"{tmp_path.as_posix()}/cache/")
+    assert sorted(os.listdir(tmp_path)) == ["cache", "definitions.yml"]
+
+    # Each call returns a new copy
+    definitions["pgd"] = None
+    assert load_definitions(filename)["pgd"] is not None
+
+    # A modified source invalidates the cache
+    with open(filename, mode="w", encoding="utf-8") as fhandler:
+        fhandler.write("prep: {}\n")
+    os.utime(filename, ns=(0, 0))
+    assert load_definitions(filename) == {"prep": {}}
+    new_cache_files = glob.glob(definitions_cache_file(filename, "*"))
+    assert len(new_cache_files) == 1
+    assert new_cache_files != cache_files
+
+
+def test_load_json_definitions(tmp_path):
+    filename = f"{tmp_path.as_posix()}/input.json"
+    with open(filename, mode="w", encoding="utf-8") as fhandler:
+        fhandler.write('{"pgd": {"ecoclimap": "ecoclimap.bin"}}')
+    assert load_definitions(filename) == {"pgd": {"ecoclimap": "ecoclimap.bin"}}
+
+
+def test_load_definitions_without_cache_dir(tmp_path, monkeypatch):
+    # The cache directory can not be created below a file
+    monkeypatch.setenv("XDG_CACHE_HOME", f"{tmp_path.as_posix()}/not_a_dir")
+    with open(f"{tmp_path.as_posix()}/not_a_dir", mode="w", encoding="utf-8"):
+        pass
+    filename = f"{tmp_path.as_posix()}/input.yml"
+    with open(filename, mode="w", encoding="utf-8") as fhandler:
+        fhandler.write("pgd: {}\n")
+    assert load_definitions(filename) == {"pgd": {}}
+    assert sorted(os.listdir(tmp_path)) == ["input.yml", "not_a_dir"]
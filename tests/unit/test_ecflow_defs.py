@@ -0,0 +1,56 @@
+"""Test the ecflow definitions created for the suite nodes."""
+import os
+
+import pytest
+
+from experiment.config_parser import ParsedConfig
+from experiment.scheduler.submission import TaskSettings
+from experiment.scheduler.suites import EcflowSuite, EcflowSuiteFamily, EcflowSuiteTask
+
+pytest.importorskip("ecflow")
+
+
+@pytest.fixture()
+def task_settings():
+    submission = {
+        "submit_types": ["background"],
+        "default_submit_type": "background",
+        "background": {"SCHOST": "localhost"},
+        "limits": {"io": {"max": 2, "tasks": ["Forcing"]}},
+        "worker": {"socket": "/tmp/worker.sock", "tasks": ["LogProgress"]},  # noqa S108
+    }
+    config = ParsedConfig.parse_obj({"submission": submission}, json_schema={})
+    return TaskSettings(config)
+
+
+@pytest.mark.parametrize("parse", [True, False])
+def test_limits_and_worker_in_defs(tmp_path, task_settings, monkeypatch, parse):
+    monkeypatch.setattr(TaskSettings, "parse_job", lambda *args, **kwargs: None)
+    ecf_files = tmp_path.as_posix()
+    suite = EcflowSuite("suite", ecf_files)
+    for limit, max_value in task_settings.get_limits().items():
+        suite.add_limit(limit, max_value)
+    family = EcflowSuiteFamily("family", suite, ecf_files)
+    os.makedirs(family.ecf_container_path, exist_ok=True)
+    for name in ["Forcing", "LogProgress"]:
+        with open(f"{family.ecf_container_path}/{name}.py", mode="w", encoding="utf-8"):
+            pass
+        EcflowSuiteTask(
+            name,
+            family,
+            None,
+            task_settings,
+            ecf_files,
+            input_template=f"{ecf_files}/default.py",
+            parse=parse,
+        )
+
+    defs = suite.defs
+    assert [(limit.name(), limit.limit()) for limit in suite.ecf_node.limits] == [
+        ("io", 2)
+    ]
+    forcing = defs.find_abs_node("/suite/family/Forcing")
+    assert [inlimit.name() for inlimit in forcing.inlimits] == ["io"]
+    log_progress = defs.find_abs_node("/suite/family/LogProgress")
+    assert list(log_progress.inlimits) == []
+    assert log_progress.find_variable("WORKER_SOCKET").value() == "/tmp/worker.sock"
@@ -0,0 +1,31 @@
+"""Test sharing of files between members."""
+import os
+
+from experiment.file_links import link_or_copy, unshare_file
+
+
+def test_link_or_copy(tmp_path):
+    source = tmp_path / "FORCING.nc"
+    source.write_text("forcing")
+    destination = tmp_path / "001" / "FORCING.nc"
+
+    method = link_or_copy(str(source), str(destination))
+    assert method in ["reflink", "hardlink", "copy"]
+    assert destination.read_text() == "forcing"
+    assert os.listdir(destination.parent) == ["FORCING.nc"]
+
+    method = link_or_copy(str(source), str(destination), hardlink=False)
+    assert method in ["reflink", "copy"]
+    assert not os.path.samefile(source, destination)
+
+
+def test_unshare_file(tmp_path):
+    source = tmp_path / "FORCING.nc"
+    source.write_text("forcing")
+    destination = tmp_path / "FORCING_001.nc"
+    os.link(source, destination)
+
+    assert unshare_file(str(destination))
+    destination.write_text("patched")
+    assert source.read_text() == "forcing"
+    assert not unshare_file(str(destination))
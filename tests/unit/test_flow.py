@@ -12,7 +12,13 @@ from experiment.experiment import ExpFromFiles
 from experiment.logs import logger
 from experiment.scheduler.scheduler import EcflowServer, EcflowTask
 from experiment.scheduler.submission import TaskSettings
-from experiment.scheduler.suites import EcflowSuite, EcflowSuiteFamily, EcflowSuiteTask
+from experiment.scheduler.suites import (
+    EcflowSuite,
+    EcflowSuiteBundle,
+    EcflowSuiteFamily,
+    EcflowSuiteMemberArray,
+    EcflowSuiteTask,
+)
 from experiment.suites import SurfexSuite
 
 TESTDATA = f"{str((Path(__file__).parent).parent)}/testdata"
@@ -164,6 +170,50 @@ class TestFlow:
             def_status=None,
         )
 
+    @pytest.mark.usefixtures("_mockers_for_ecflow")
+    def test_ecflow_suite_bundle(self, tmp_path_factory, get_exp_from_files):
+        """Create a bundle task running two tasks in one job."""
+        tmpdir = f"{tmp_path_factory.getbasetemp().as_posix()}"
+        ecf_files = f"{tmpdir}"
+        suite = EcflowSuite("suite", ecf_files)
+        family = EcflowSuiteFamily("family", suite, ecf_files)
+        config = get_exp_from_files
+        task_settings = TaskSettings(config)
+        input_template = f"{ROOT}/experiment/templates/stand_alone.py"
+        bundle = EcflowSuiteBundle(
+            ["Qc2obsmon", "LogProgressPP"],
+            family,
+            config,
+            task_settings,
+            ecf_files,
+            input_template=input_template,
+        )
+        assert bundle.name == "Bundle"
+        assert bundle.tasks == ["Qc2obsmon", "LogProgressPP"]
+
+    @pytest.mark.usefixtures("_mockers_for_ecflow")
+    def test_ecflow_suite_member_array(self, tmp_path_factory, get_exp_from_files):
+        """Create a task running forecasts for many members in one job."""
+        tmpdir = f"{tmp_path_factory.getbasetemp().as_posix()}"
+        ecf_files = f"{tmpdir}"
+        suite = EcflowSuite("suite", ecf_files)
+        family = EcflowSuiteFamily("EPS", suite, ecf_files)
+        config = get_exp_from_files
+        task_settings = TaskSettings(config)
+        input_template = f"{ROOT}/experiment/templates/stand_alone.py"
+        member_array = EcflowSuiteMemberArray(
+            ["Forecast"],
+            [1, 2, 3],
+            family,
+            config,
+            task_settings,
+            ecf_files,
+            cores_per_member=2,
+            input_template=input_template,
+        )
+        assert member_array.name == "MemberArray"
+        assert member_array.members == [1, 2, 3]
+
     @pytest.mark.usefixtures("_mockers_for_ecflow")
     def test_ecflow_sufex_suite(self, tmp_path_factory, get_exp_from_files):
         tmpdir = f"{tmp_path_factory.getbasetemp().as_posix()}"
@@ -0,0 +1,149 @@
+"""Test the forcing file utilities."""
+import numpy as np
+from netCDF4 import Dataset
+
+from experiment.datetime_utils import as_datetime
+from experiment.tasks.forcing import (
+    concat_forcing_files,
+    forcing_chunks,
+    merge_forcing_layer,
+    patch_forcing_file,
+    repack_forcing_file,
+    split_forcing_file,
+    write_forcing_layer,
+)
+
+
+def test_split_forcing_file(tmp_path):
+    input_file = f"{tmp_path}/FORCING_catchup.nc"
+    with Dataset(input_file, mode="w") as nc_file:
+        nc_file.createDimension("Number_of_points", 2)
+        nc_file.createDimension("time", 7)
+        time = nc_file.createVariable("time", "f4", ("time",))
+        time.units = "hours since 2023-01-01 00:00:00 0:00"
+        time[:] = np.arange(7)
+        tair = nc_file.createVariable("Tair", "f4", ("time", "Number_of_points"))
+        tair[:] = np.arange(14).reshape(7, 2)
+        zs = nc_file.createVariable("ZS", "f4", ("Number_of_points",))
+        zs[:] = [10.0, 20.0]
+
+    parts = [
+        (0, 3, as_datetime("2023-01-01T00"), f"{tmp_path}/FORCING_1.nc"),
+        (3, 6, as_datetime("2023-01-01T03"), f"{tmp_path}/FORCING_2.nc"),
+    ]
+    split_forcing_file(input_file, parts)
+
+    with Dataset(f"{tmp_path}/FORCING_2.nc", mode="r") as nc_file:
+        assert len(nc_file.dimensions["time"]) == 4
+        assert nc_file["time"].units == "hours since 2023-01-01 03:00:00 0:00"
+        assert list(nc_file["time"][:]) == [0, 1, 2, 3]
+        assert nc_file["Tair"][0, 1] == 7
+        assert list(nc_file["ZS"][:]) == [10.0, 20.0]
+
+
+def test_concat_forcing_chunks(tmp_path):
+    chunks = forcing_chunks(as_datetime("2023-01-01T00"), as_datetime("2023-01-01T08"), 3)
+    assert chunks == [
+        (as_datetime("2023-01-01T00"), as_datetime("2023-01-01T03")),
+        (as_datetime("2023-01-01T03"), as_datetime("2023-01-01T06")),
+        (as_datetime("2023-01-01T06"), as_datetime("2023-01-01T08")),
+    ]
+
+    chunk_files = []
+    for ichunk, (first, last) in enumerate(chunks):
+        chunk_file = f"{tmp_path}/FORCING_chunk{ichunk:03d}.nc"
+        ntimes = int((last - first).total_seconds() // 3600) + 1
+        with Dataset(chunk_file, mode="w") as nc_file:
+            nc_file.createDimension("Number_of_points", 2)
+            nc_file.createDimension("time", ntimes)
+            time = nc_file.createVariable("time", "f4", ("time",))
+            time.units = f"hours since {first.strftime('%Y-%m-%d %H')}:00:00 0:00"
+            time[:] = np.arange(ntimes)
+            tair = nc_file.createVariable("Tair", "f4", ("time", "Number_of_points"))
+            tair[:] = np.repeat(np.arange(ntimes) + 3 * ichunk, 2).reshape(ntimes, 2)
+            zs = nc_file.createVariable("ZS", "f4", ("Number_of_points",))
+            zs[:] = [10.0, 20.0]
+        chunk_files.append(chunk_file)
+
+    output = f"{tmp_path}/FORCING.nc"
+    concat_forcing_files(chunk_files, output, [0, 3, 6])
+    with Dataset(output, mode="r") as nc_file:
+        assert nc_file["time"].units == "hours since 2023-01-01 00:00:00 0:00"
+        assert list(nc_file["time"][:]) == list(range(9))
+        assert list(nc_file["Tair"][:, 0]) == list(range(9))
+        assert list(nc_file["ZS"][:]) == [10.0, 20.0]
+
+
+def test_patch_forcing_file(tmp_path):
+    for name, offset in [("FORCING_prev.nc", 100), ("FORCING.nc", 0)]:
+        with Dataset(f"{tmp_path}/{name}", mode="w") as nc_file:
+            nc_file.createDimension("Number_of_points", 2)
+            nc_file.createDimension("time", 4)
+            lwdown = nc_file.createVariable("LWdown", "f4", ("time", "Number_of_points"))
+            lwdown[:] = np.arange(8).reshape(4, 2) + offset
+
+    patch_forcing_file(
+        f"{tmp_path}/FORCING_prev.nc",
+        f"{tmp_path}/FORCING.nc",
+        ["LWdown"],
+        input_first=-3,
+        nsteps=3,
+        block_steps=2,
+    )
+    with Dataset(f"{tmp_path}/FORCING.nc", mode="r") as nc_file:
+        assert list(nc_file["LWdown"][:, 0]) == [102, 104, 106, 6]
+
+
+def test_repack_forcing_file(tmp_path):
+    with Dataset(f"{tmp_path}/FORCING.nc", mode="w", format="NETCDF3_64BIT") as nc_file:
+        nc_file.createDimension("Number_of_points", 6)
+        nc_file.createDimension("time", None)
+        nc_file.createVariable("time", "f8", ("time",))[:] = np.arange(5)
+        tair = nc_file.createVariable("Tair", "f4", ("time", "Number_of_points"))
+        tair[:] = 270 + np.arange(30).reshape(5, 6) / 7
+
+    encoding = {
+        "zlib": True,
+        "complevel": 4,
+        "shuffle": True,
+        "chunk_time": 1,
+        "least_significant_digit": {"Tair": 2},
+    }
+    repack_forcing_file(
+        f"{tmp_path}/FORCING.nc", f"{tmp_path}/FORCING_packed.nc", encoding, block_steps=2
+    )
+    with Dataset(f"{tmp_path}/FORCING.nc", mode="r") as src, Dataset(
+        f"{tmp_path}/FORCING_packed.nc", mode="r"
+    ) as dst:
+        assert dst.file_format == "NETCDF4_CLASSIC"
+        assert dst["Tair"].chunking() == [1, 6]
+        assert dst["Tair"].filters()["zlib"]
+        assert np.array_equal(dst["time"][:], src["time"][:])
+        assert np.allclose(dst["Tair"][:], src["Tair"][:], atol=0.01)
+
+
+def test_forcing_layer(tmp_path):
+    for name, rainf_offset in [("FORCING_base.nc", 0), ("FORCING_member.nc", 1)]:
+        with Dataset(f"{tmp_path}/{name}", mode="w") as nc_file:
+            nc_file.createDimension("Number_of_points", 2)
+            nc_file.createDimension("time", 3)
+            nc_file.createVariable("time", "f8", ("time",))[:] = np.arange(3)
+            for var_name, offset in [("Tair", 0), ("Rainf", rainf_offset)]:
+                var = nc_file.createVariable(var_name, "f4", ("time", "Number_of_points"))
+                var[:] = np.arange(6).reshape(3, 2) + offset
+
+    variables = write_forcing_layer(
+        f"{tmp_path}/FORCING_base.nc",
+        f"{tmp_path}/FORCING_member.nc",
+        f"{tmp_path}/FORCING_layer.nc",
+        block_steps=2,
+    )
+    assert variables == ["Rainf"]
+    merge_forcing_layer(f"{tmp_path}/FORCING_layer.nc", f"{tmp_path}/FORCING.nc")
+    with Dataset(f"{tmp_path}/FORCING.nc", mode="r") as merged, Dataset(
+        f"{tmp_path}/FORCING_member.nc", mode="r"
+    ) as member:
+        for name in ["time", "Tair", "Rainf"]:
+            assert np.array_equal(merged[name][:], member[name][:])
+    with Dataset(f"{tmp_path}/FORCING_base.nc", mode="r") as base:
+        assert list(base["Rainf"][:, 0]) == [0, 2, 4]
@@ -0,0 +1,74 @@
+"""Test the GRIB inventories."""
+import os
+
+import numpy as np
+import pytest
+from pysurfex.grib import Grib, Grib2Variable
+
+from experiment.grib_inventory import (
+    GribInventory,
+    IndexedGrib,
+    inventory_file,
+    write_inventory,
+)
+
+ec = pytest.importorskip("eccodes")
+
+
+def _write_grib_file(filename, hour, fields):
+    with open(filename, mode="wb") as fhandler:
+        for param, level, step in fields:
+            gid = ec.codes_grib_new_from_samples("regular_ll_sfc_grib2")
+            ec.codes_set(gid, "date", 20230101)
+            ec.codes_set(gid, "hour", hour)
+            ec.codes_set(gid, "paramId", param)
+            ec.codes_set(gid, "typeOfFirstFixedSurface", 105)
+            ec.codes_set(gid, "level", level)
+            ec.codes_set(gid, "step", step)
+            values = np.full(ec.codes_get_size(gid, "values"), param + level + step)
+            ec.codes_set_values(gid, values.astype("float64"))
+            ec.codes_write(gid, fhandler)
+            ec.codes_release(gid)
+
+
+def test_inventory_query(tmp_path):
+    files = [f"{tmp_path}/fc00.grib2", f"{tmp_path}/fc03.grib2"]
+    _write_grib_file(files[0], 0, [(130, 65, 0), (133, 65, 0), (130, 64, 0)])
+    _write_grib_file(files[1], 3, [(130, 65, 0)])
+    for grib_file in files:
+        write_inventory(grib_file)
+    assert os.path.exists(inventory_file(files[0]))
+
+    inventory = GribInventory(files)
+    messages = inventory.query(shortName="t", level=64)
+    assert [(msg["file"], msg["step"]) for msg in messages] == [(files[0], 0)]
+    with open(files[0], mode="rb") as fhandler:
+        fhandler.seek(messages[0]["offset"])
+        gid = ec.codes_new_from_message(fhandler.read(messages[0]["length"]))
+    assert ec.codes_get(gid, "level") == 64
+    assert ec.codes_get_array(gid, "values")[0] == 194
+    ec.codes_release(gid)
+
+    assert inventory.cycles() == [(20230101, 0), (20230101, 300)]
+    assert inventory.cycles(shortName="q") == [(20230101, 0)]
+
+
+def test_inventory_is_ignored_when_the_file_changes(tmp_path):
+    grib_file = f"{tmp_path}/fc00.grib2"
+    _write_grib_file(grib_file, 0, [(130, 65, 0)])
+    write_inventory(grib_file)
+    _write_grib_file(grib_file, 0, [(130, 65, 0), (133, 65, 0)])
+    os.utime(grib_file, ns=(0, 0))
+    assert GribInventory([grib_file]).grib_files == []
+
+
+def test_indexed_grib_field(tmp_path):
+    grib_file = f"{tmp_path}/fc00.grib2"
+    _write_grib_file(grib_file, 0, [(130, 65, 0), (133, 65, 0), (130, 64, 0)])
+    write_inventory(grib_file)
+    gribvar = Grib2Variable(0, 0, 0, 105, 64)
+    field, geo = IndexedGrib(grib_file).field(gribvar, None)
+    expected_field, expected_geo = Grib(grib_file).field(gribvar, None)
+    assert np.array_equal(field, expected_field)
+    assert np.array_equal(geo.lons, expected_geo.lons)
+    assert field[0, 0] == 194
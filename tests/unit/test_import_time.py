@@ -0,0 +1,67 @@
+"""Import time regression tests for the entry points."""
+import subprocess
+import sys
+
+import pytest
+
+# Modules that must only be imported by the tasks using them
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "netCDF4",
+    "pysurfex.netcdf",
+    "pysurfex.titan",
+    "pysurfex.obsmon",
+    "pysurfex.interpolation",
+]
+
+
+def _import_times(code):
+    """Get the cumulative import time in microseconds of each imported module.
+
+    Args:
+        code (str): Code to run in a new interpreter
+
+    Returns:
+        dict: Cumulative import time for each module
+
+    """
+    stderr = subprocess.run(  # noqa S603
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:") :].split("|")
+        try:
+            times[fields[2].strip()] = int(fields[1])
+        except (IndexError, ValueError):
+            continue
+    return times
+
+
+@pytest.mark.parametrize(
+    ("module", "budget"),
+    [
+        ("experiment.cli", 1_500_000),
+        ("experiment.scheduler.container", 1_000_000),
+        ("experiment.worker", 300_000),
+    ],
+)
+def test_entry_point_import_time(module, budget):
+    times = _import_times(f"import {module}")
+    assert [heavy for heavy in HEAVY_MODULES if heavy in times] == []
+    assert times[module] < budget
+
+
+def test_minimal_task_import_time():
+    times = _import_times(
+        "from experiment.tasks.discover_tasks import find_task_class; "
+        "find_task_class('LogProgress')"
+    )
+    assert [heavy for heavy in HEAVY_MODULES if heavy in times] == []
+    assert times["experiment.tasks.tasks"] < 1_000_000
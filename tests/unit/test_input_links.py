@@ -0,0 +1,34 @@
+"""Test the links to the binary input files."""
+import os
+
+from experiment.input_links import link_input_files, split_input_data
+
+
+def test_split_input_data():
+    data = {
+        "PGD.nc": "/data/PGD.nc",
+        "FORCING.nc": "forcing/FORCING.nc",
+        "PREP.nc": {"PREP.nc": "cp /data/PREP.nc PREP.nc"},
+    }
+    links, others = split_input_data(data)
+    assert links == {"PGD.nc": "/data/PGD.nc"}
+    assert set(others) == {"FORCING.nc", "PREP.nc"}
+
+
+def test_link_input_files(tmp_path):
+    for fname in ["PGD.nc", "ecoclimap.bin"]:
+        (tmp_path / fname).write_text(fname)
+    wdir = tmp_path / "wdir"
+    wdir.mkdir()
+    (wdir / "PGD.nc").symlink_to("/stale/PGD.nc")
+    (wdir / "PREP.nc").write_text("PREP.nc")
+
+    links = {
+        "PGD.nc": f"{tmp_path}/PGD.nc",
+        "clim/ecoclimap.bin": f"{tmp_path}/ecoclimap.bin",
+        "PREP.nc": f"{wdir}/PREP.nc",
+    }
+    link_input_files(links, str(wdir))
+    assert os.readlink(wdir / "PGD.nc") == f"{tmp_path}/PGD.nc"
+    assert (wdir / "clim" / "ecoclimap.bin").read_text() == "ecoclimap.bin"
+    assert (wdir / "PREP.nc").read_text() == "PREP.nc"
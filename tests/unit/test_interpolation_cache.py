@@ -0,0 +1,106 @@
+"""Test the cached interpolation weights."""
+import os
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+
+from experiment import interpolation_cache
+from experiment.interpolation_cache import (
+    CachedInterpolation,
+    InterpolationWeights,
+    interpolation_key,
+)
+
+
+def _bilinear(field2d):
+    """Interpolate to points between the grid points of a regular 4x3 grid."""
+    points = [(0.5, 0.5), (1.25, 1.0), (2.0, 0.75), (2.9, 1.6), (3.0, 2.0)]
+    values = []
+    for x_val, y_val in points:
+        i_val = min(int(x_val), field2d.shape[0] - 2)
+        j_val = min(int(y_val), field2d.shape[1] - 2)
+        d_x = x_val - i_val
+        d_y = y_val - j_val
+        values.append(
+            (1 - d_x) * (1 - d_y) * field2d[i_val, j_val]
+            + d_x * (1 - d_y) * field2d[i_val + 1, j_val]
+            + (1 - d_x) * d_y * field2d[i_val, j_val + 1]
+            + d_x * d_y * field2d[i_val + 1, j_val + 1]
+        )
+    return np.array(values)
+
+
+def _nearest(field2d):
+    """Pick the grid points nearest to some points, or NaN outside the grid."""
+    values = [field2d[1, 2], field2d[3, 0], field2d[0, 0], np.nan]
+    return np.array(values)
+
+
+def test_interpolation_weights(tmp_path):
+    field = np.arange(12, dtype="float64").reshape(4, 3) ** 2
+    for interpolate in [_bilinear, _nearest]:
+        weights = InterpolationWeights.from_interpolation(interpolate, field.shape)
+        filename = f"{tmp_path}/interpolation_{interpolate.__name__}.npz"
+        weights.save(filename)
+        weights = InterpolationWeights.load(filename)
+        assert np.allclose(weights.interpolate(field), interpolate(field), equal_nan=True)
+
+
+def test_interpolation_weights_keep_missing_values():
+    field = np.ones((4, 3))
+    field[3, 2] = np.nan
+    weights = InterpolationWeights.from_interpolation(_bilinear, field.shape)
+    assert np.allclose(
+        weights.interpolate(field), [1.0, 1.0, 1.0, np.nan, np.nan], equal_nan=True
+    )
+
+
+def test_interpolation_key_is_memoized(monkeypatch):
+    digests = []
+    monkeypatch.setattr(interpolation_cache, "_DIGESTS", OrderedDict())
+    monkeypatch.setattr(
+        interpolation_cache,
+        "coordinates_digest",
+        lambda lons, lats: digests.append(lons.shape) or str(lons.sum() + lats.sum()),
+    )
+    lons, lats = np.meshgrid(np.arange(4.0), np.arange(3.0), indexing="ij")
+    geo_out = SimpleNamespace(lonlist=np.array([0.5, 1.5]), latlist=np.array([1.0, 1.0]))
+
+    keys = []
+    for __ in range(3):
+        # The readers create a new input geometry for each field
+        geo_in = SimpleNamespace(lons=lons.copy(), lats=lats.copy())
+        keys.append(interpolation_key("bilinear", geo_in, geo_out))
+    assert len(set(keys)) == 1
+    assert digests == [(4, 3), (2,)]
+
+    geo_in = SimpleNamespace(lons=lons + 1, lats=lats)
+    assert interpolation_key("bilinear", geo_in, geo_out) != keys[0]
+    assert interpolation_key("nearest", geo_in, geo_out) != keys[0]
+    assert digests == [(4, 3), (2,), (4, 3)]
+
+
+def test_weights_are_checked_with_probe_field(tmp_path, monkeypatch):
+    monkeypatch.setattr(interpolation_cache, "_WEIGHTS", {})
+    lons, lats = np.meshgrid(np.arange(4.0), np.arange(3.0), indexing="ij")
+    geo_out = SimpleNamespace(lonlist=np.array([0.5, 1.5]), latlist=np.array([1.0, 1.0]))
+    field = np.ones((4, 3))
+    for name, interpolate, cached in [
+        ("bilinear", _bilinear, True),
+        # Not a weighted sum, but reproduces a field of ones
+        ("sqrt", lambda field2d: _bilinear(np.sqrt(field2d)), False),
+    ]:
+        monkeypatch.setattr(
+            interpolation_cache.Interpolation,
+            "interpolate",
+            lambda __, field2d, undefined=None, func=interpolate: func(field2d),
+        )
+        interpolation = CachedInterpolation.__new__(CachedInterpolation)
+        interpolation.operator = name
+        interpolation.geo_in = SimpleNamespace(lons=lons, lats=lats)
+        interpolation.geo_out = geo_out
+        interpolation.cache_dir = tmp_path.as_posix()
+        weights = interpolation.get_weights(field)
+        assert (weights is not None) == cached
+        assert os.path.exists(interpolation.cache_file(field.shape)) == cached
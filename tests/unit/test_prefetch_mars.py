@@ -0,0 +1,251 @@
+"""Test the MARS prefetch."""
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from experiment.datetime_utils import as_datetime
+from experiment.grib_inventory import GribInventory
+from experiment.tasks.prefetch_mars import (
+    plan_requests,
+    prefetch,
+    prefetch_synop_window,
+    read_manifest,
+    scan_grib_file,
+    split_files,
+    write_manifest,
+)
+
+ec = pytest.importorskip("eccodes")
+
+
+def _write_grib_message(fhandler, hour, step, param):
+    gid = ec.codes_grib_new_from_samples("GRIB2")
+    ec.codes_set(gid, "date", 20230101)
+    ec.codes_set(gid, "hour", hour)
+    ec.codes_set(gid, "paramId", param)
+    ec.codes_set(gid, "step", step)
+    ec.codes_set_values(gid, np.ones(ec.codes_get_size(gid, "values")))
+    ec.codes_write(gid, fhandler)
+    ec.codes_release(gid)
+
+
+def _read_grib_messages(filename):
+    messages = []
+    with open(filename, mode="rb") as fhandler:
+        while (gid := ec.codes_grib_new_from_file(fhandler)) is not None:
+            messages.append(
+                (ec.codes_get(gid, "param"), ec.codes_get_array(gid, "values").max())
+            )
+            ec.codes_release(gid)
+    return messages
+
+
+def test_split_mars_grib_file(tmp_path):
+    with open(f"{tmp_path}/mars.grib2", mode="wb") as fhandler:
+        for hour in [0, 3]:
+            _write_grib_message(fhandler, hour, 0, 130)
+            _write_grib_message(fhandler, hour, 1, 228228)
+            _write_grib_message(fhandler, hour, 1, 134)
+
+    index = scan_grib_file(f"{tmp_path}/mars.grib2")
+    assert [(step, param) for __, __, __, step, param in index] == [
+        (0, 130),
+        (1, 228228),
+        (1, 134),
+    ] * 2
+    assert index[-1][0] + index[-1][1] == os.path.getsize(f"{tmp_path}/mars.grib2")
+
+    split_files(f"{tmp_path}/mars.grib2", f"{tmp_path}/", workers=2)
+    messages = {
+        filename: _read_grib_messages(f"{tmp_path}/{filename}")
+        for filename in os.listdir(tmp_path)
+        if filename.startswith("carra_") and filename.endswith(".grib2")
+    }
+    assert messages == {
+        "carra_20221231T21Z_003.grib2": [(130, 1)],
+        "carra_20230101T00Z_000.grib2": [(130, 1), (228228, 0)],
+        "carra_20230101T00Z_001.grib2": [(228228, 1), (134, 1)],
+        "carra_20230101T00Z_003.grib2": [(130, 1)],
+        "carra_20230101T03Z_000.grib2": [(130, 1), (228228, 0)],
+        "carra_20230101T03Z_001.grib2": [(228228, 1), (134, 1)],
+    }
+    for filename in messages:
+        assert GribInventory.is_up_to_date(f"{tmp_path}/{filename}")
+
+
+@pytest.fixture()
+def fake_mars(tmp_path, monkeypatch):
+    """Install a script as mars in PATH and run in an empty directory."""
+
+    def install(script):
+        bin_dir = tmp_path / "bin"
+        bin_dir.mkdir()
+        (bin_dir / "mars").write_text(script.format(python=sys.executable))
+        (bin_dir / "mars").chmod(0o755)
+        monkeypatch.setenv("PATH", f"{bin_dir}:{os.environ['PATH']}")
+        run_dir = tmp_path / "run"
+        run_dir.mkdir()
+        monkeypatch.chdir(run_dir)
+        return run_dir
+
+    return install
+
+
+FAKE_MARS = """#!{python}
+import sys
+
+import eccodes as ec
+
+with open(sys.argv[1], mode="r", encoding="utf-8") as request_file:
+    requests = request_file.read().split("retrieve,")[1:]
+for request in requests:
+    keys = {{}}
+    for line in request.splitlines():
+        if "=" in line:
+            key, value = line.split("=", 1)
+            keys[key.strip()] = value.strip().rstrip(",")
+    with open("mars.log", mode="a", encoding="utf-8") as log:
+        log.write(keys["DATE"] + "\\n")
+    with open(keys["TARGET"], mode="ab") as target:
+        for date in keys["DATE"].split("/"):
+            for hour in keys["TIME"].split("/"):
+                for step in keys["STEP"].split("/"):
+                    for param in keys["PARAM"].split("/"):
+                        gid = ec.codes_grib_new_from_samples("GRIB2")
+                        ec.codes_set(gid, "date", int(date))
+                        ec.codes_set(gid, "hour", int(hour))
+                        try:
+                            ec.codes_set(gid, "paramId", int(param))
+                        except ec.CodesInternalError:
+                            # Not in the GRIB2 tables of eccodes
+                            ec.codes_release(gid)
+                            continue
+                        ec.codes_set(gid, "step", int(step))
+                        ec.codes_write(gid, target)
+                        ec.codes_release(gid)
+"""
+
+
+def test_prefetch_mars_chunks(tmp_path, fake_mars):
+    run_dir = fake_mars(FAKE_MARS)
+    dest = tmp_path / "grib"
+    dest.mkdir()
+
+    def mars_requests():
+        return (run_dir / "mars.log").read_text().split()
+
+    dts = [datetime(2023, 1, 30) + timedelta(hours=3 * i) for i in range(24)]
+    assert plan_requests(dts, chunk_days=7) == [
+        [date(2023, 1, 30), date(2023, 1, 31)],
+        [date(2023, 2, 1)],
+    ]
+    prefetch(dts, f"{dest}/", workers=1)
+    assert mars_requests() == ["20230130/20230131"] * 3 + ["20230201"] * 4 + ["20230202"]
+    manifest = read_manifest(f"{dest}/")
+    assert sorted(manifest) == ["20230130_20230131", "20230201_20230201"]
+    assert all(entry["split"] for entry in manifest.values())
+    assert (dest / "carra_20230201T21Z_003.grib2").exists()
+
+    # Only the chunk missing in the manifest is retrieved again
+    del manifest["20230201_20230201"]
+    write_manifest(f"{dest}/", manifest)
+    (dest / "multi_carra_20230201_20230201.grib2").unlink()
+    (dest / "carra_20230201T00Z_000.grib2").unlink()
+    prefetch(dts, f"{dest}/", workers=1)
+    assert mars_requests()[8:] == ["20230201"] * 3 + ["20230202"]
+    assert (dest / "carra_20230201T00Z_000.grib2").exists()
+
+    # Nothing is retrieved when the split files exist
+    write_manifest(f"{dest}/", {})
+    prefetch(dts, f"{dest}/", workers=1)
+    assert len(mars_requests()) == 12
+
+
+def test_prefetch_mars_chunk_boundary(tmp_path, fake_mars):
+    run_dir = fake_mars(FAKE_MARS)
+    dest = tmp_path / "grib"
+    dest.mkdir()
+
+    def params(filename):
+        return sorted(param for param, __ in _read_grib_messages(dest / filename))
+
+    # Step 3 of the last cycle of a chunk has the model level fields of the next day
+    dts = [datetime(2023, 1, 1) + timedelta(hours=3 * i) for i in range(16)]
+    prefetch(dts, f"{dest}/", chunk_days=1, workers=1)
+    expected = params("carra_20230101T21Z_003.grib2")
+    assert expected.count(130) == 1
+    assert params("carra_20230102T21Z_003.grib2") == expected
+
+    # Splitting a chunk again does not add messages to the files of the other chunk
+    for name in ["20230102_20230102", "20230101_20230101"]:
+        manifest = read_manifest(f"{dest}/")
+        manifest[name]["split"] = False
+        write_manifest(f"{dest}/", manifest)
+        (dest / f"carra_{name[:8]}T00Z_000.grib2").unlink()
+        prefetch(dts, f"{dest}/", chunk_days=1, workers=1)
+        assert (dest / f"carra_{name[:8]}T00Z_000.grib2").exists()
+        assert params("carra_20230101T21Z_003.grib2") == expected
+        assert params("carra_20230102T21Z_003.grib2") == expected
+    assert len((run_dir / "mars.log").read_text().split()) == 8
+
+
+FAKE_MARS_SYNOP = """#!{python}
+import datetime
+import sys
+
+import eccodes as ec
+
+with open(sys.argv[1], mode="r", encoding="utf-8") as request_file:
+    request = request_file.read()
+keys = {{}}
+for line in request.splitlines():
+    if "=" in line:
+        key, value = line.split("=", 1)
+        keys[key.strip()] = value.strip().rstrip(",")
+with open("mars.log", mode="a", encoding="utf-8") as log:
+    log.write(keys["date"] + "\\n")
+first, __, last = keys["date"].split("/")
+day = datetime.datetime.strptime(first, "%Y%m%d")
+with open(keys["target"], mode="wb") as target:
+    while day <= datetime.datetime.strptime(last, "%Y%m%d"):
+        for hour in range(24):
+            bid = ec.codes_bufr_new_from_samples("BUFR4")
+            for key, value in [
+                ("typicalYear", day.year),
+                ("typicalMonth", day.month),
+                ("typicalDay", day.day),
+                ("typicalHour", hour),
+                ("typicalMinute", 0),
+            ]:
+                ec.codes_set(bid, key, value)
+            ec.codes_write(bid, target)
+            ec.codes_release(bid)
+        day += datetime.timedelta(days=1)
+"""
+
+
+def test_prefetch_synop_window(tmp_path, fake_mars):
+    run_dir = fake_mars(FAKE_MARS_SYNOP)
+    obs_dir = tmp_path / "obs"
+    obs_dir.mkdir()
+    (obs_dir / "ob2023010203").write_text("existing")
+
+    dts = [as_datetime(f"2023-01-02T{hour:02d}") for hour in [0, 3, 6]]
+    prefetch_synop_window(dts, str(obs_dir), workers=1)
+    assert (run_dir / "mars.log").read_text().split() == ["20230101/to/20230102"]
+    assert (obs_dir / "ob2023010203").read_text() == "existing"
+    expected = {"ob2023010200": [22, 23, 0, 1], "ob2023010206": [4, 5, 6, 7]}
+    for filename, hours in expected.items():
+        with open(obs_dir / filename, mode="rb") as fhandler:
+            typical_hours = []
+            while (bid := ec.codes_bufr_new_from_file(fhandler)) is not None:
+                typical_hours.append(ec.codes_get(bid, "typicalHour"))
+                ec.codes_release(bid)
+        assert typical_hours == hours
+
+    prefetch_synop_window(dts, str(obs_dir), workers=1)
+    assert len((run_dir / "mars.log").read_text().split()) == 1
+    assert sorted(os.listdir(run_dir)) == ["mars.log", "request.out"]
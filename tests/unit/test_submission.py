@@ -217,3 +217,54 @@ class TestSubmission:
         sub = NoSchedulerSubmission(background)
         with pytest.raises(Exception, match="Task not found:"):
             sub.submit(task, config, template_job, task_job, output)
+
+    def test_bundle(self, config):
+        update = {
+            "submission": {
+                "submit_types": ["unittest"],
+                "default_submit_type": "unittest",
+                "bundle_tasks": ["Qc2obsmon", "LogProgressPP"],
+                "unittest": {"SCHOST": "localhost"},
+            }
+        }
+        config = config.copy(update=update)
+        task_settings = TaskSettings(config)
+        assert task_settings.may_bundle("Qc2obsmon")
+        assert not task_settings.may_bundle("Forecast")
+        assert task_settings.bundle(["Qc2obsmon", "LogProgressPP"])
+        assert not task_settings.bundle(["LogProgressPP"])
+        assert not task_settings.bundle(["Qc2obsmon", "Forecast"])
+
+    def test_get_array_settings(self, config):
+        update = {
+            "submission": {
+                "submit_types": ["unittest"],
+                "default_submit_type": "unittest",
+                "arrays": {"EPS": {"min_members": 3, "cores_per_member": 4}},
+                "unittest": {"SCHOST": "localhost"},
+            }
+        }
+        config = config.copy(update=update)
+        task_settings = TaskSettings(config)
+        assert task_settings.get_array_settings("EPS", [1, 2]) is None
+        settings = task_settings.get_array_settings("EPS", [1, 2, 3])
+        assert settings["cores_per_member"] == 4
+        assert task_settings.get_array_settings("ensemble_prep", [1, 2, 3]) is None
+
+    def test_pipeline_depth_and_limits(self, config):
+        update = {
+            "submission": {
+                "submit_types": ["unittest"],
+                "default_submit_type": "unittest",
+                "pipeline_depth": {"default": 12, "PrepareCycle": 48},
+                "limits": {"io": {"max": 2, "tasks": ["Forcing", "ArchiveECFS"]}},
+                "unittest": {"SCHOST": "localhost"},
+            }
+        }
+        config = config.copy(update=update)
+        task_settings = TaskSettings(config)
+        assert task_settings.get_pipeline_depth("PrepareCycle") == 48
+        assert task_settings.get_pipeline_depth("CycleInput") == 12
+        assert task_settings.get_limits() == {"io": 2}
+        assert task_settings.get_limit("Forcing") == "io"
+        assert task_settings.get_limit("Forecast") is None
@@ -1,24 +1,34 @@
 #!/usr/bin/env python3
 """Unit tests for the config file parsing module."""
+import json
 import os
 import subprocess
+import sys
 from pathlib import Path
+from types import SimpleNamespace
 
 import numpy as np
-import pysurfex
 import pytest
+from netCDF4 import Dataset
 from pysurfex.geo import ConfProj
 from pysurfex.run import BatchJob
 
 import experiment
 from experiment import PACKAGE_NAME
-from experiment.config_parser import ParsedConfig
 from experiment.datetime_utils import as_datetime
-from experiment.experiment import Exp, ExpFromFiles
 from experiment.logs import logger
-from experiment.system import System
-from experiment.tasks.discover_tasks import discover, get_task
-from experiment.tasks.tasks import AbstractTask
+from experiment.scheduler.scheduler import EcflowTask
+from experiment.suites import forcing_task_path
+from experiment.tasks.discover_tasks import (
+    TASK_MANIFEST,
+    build_manifest,
+    discover,
+    find_task_class,
+    get_task,
+    load_plugin_manifest,
+)
+from experiment.tasks.task_array import ekf_perturbations, run_in_pool, task_args
+from experiment.tasks.tasks import AbstractTask, Dummy
 
 WORKING_DIR = Path.cwd()
 
@@ -33,127 +43,6 @@ def classes_to_be_tested():
     return encountered_classes.keys()
 
 
-@pytest.fixture(scope="module")
-def get_config(tmp_path_factory):
-    wdir = f"{tmp_path_factory.getbasetemp().as_posix()}"
-    exp_name = "test_config"
-    pysurfex_experiment = f"{str(((Path(__file__).parent).parent).parent)}"
-    pysurfex_path = f"{str((Path(pysurfex.__file__).parent).parent)}"
-    offline_source = f"{wdir}/source"
-
-    exp_dependencies = ExpFromFiles.setup_files(
-        wdir,
-        exp_name,
-        None,
-        pysurfex_path,
-        pysurfex_experiment,
-        offline_source=offline_source,
-    )
-
-    scratch = f"{tmp_path_factory.getbasetemp().as_posix()}"
-    env_system = {
-        "host_system": {
-            "compcentre": "LOCAL",
-            "hosts": ["my_host_0", "my_host_1"],
-            "sfx_exp_data": f"{scratch}/host0/@EXP@",
-            "sfx_exp_lib": f"{scratch}/host0/@EXP@/lib",
-            "host_name": "",
-            "joboutdir": f"{scratch}/host0/job",
-            "hm_cs": "gfortran",
-            "parch": "",
-            "mkdir": "mkdir -p",
-            "rsync": 'rsync -avh -e "ssh -i ~/.ssh/id_rsa"',
-            "surfex_config": "my_harmonie_config",
-            "login_host": "localhost",
-            "scheduler_pythonpath": "",
-            "host1": {
-                "sfx_exp_data": f"{scratch}/host1/@EXP@",
-                "sfx_exp_lib": f"{scratch}/host1/@EXP@/lib",
-                "host_name": "",
-                "joboutdir": f"{scratch}/host1/job",
-                "login_host": "localhost",
-                "sync_data": True,
-            },
-        }
-    }
-
-    system = System(env_system, exp_name)
-    system_file_paths = {
-        "soilgrid_data_path": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "ecoclimap_bin_dir": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "ecosg_data_path": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "pgd_data_path": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "scratch": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "static_data": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "climdata": f"{tmp_path_factory.getbasetemp().as_posix()}",
-        "prep_input_file": f"{tmp_path_factory.getbasetemp().as_posix()}"
-        + "/demo/ECMWF/archive/2023/02/18/18/fc20230218_18+006",
-        "gmted2010_data_path": f"{tmp_path_factory.getbasetemp().as_posix()}/GMTED2010",
-    }
-
-    env_submit = {
-        "submit_types": ["background", "scalar"],
-        "default_submit_type": "scalar",
-        "background": {
-            "HOST": "0",
-            "OMP_NUM_THREADS": 'import os\nos.environ.update({"OMP_NUM_THREADS": "1"})',
-            "tasks": ["InitRun", "LogProgress", "LogProgressPP"],
-        },
-        "scalar": {"HOST": "1", "Not_existing_task": {"DR_HOOK": 'print("Hello world")'}},
-    }
-    progress = {
-        "basetime": "2023-01-01T03:00:00Z",
-        "start": "2023-01-01T00:00:00Z",
-        "end": "2023-01-01T06:00:00Z",
-        "basetime_pp": "2023-01-01T03:00:00Z",
-    }
-
-    # Configuration
-    config_files_dict = ExpFromFiles.get_config_files(
-        exp_dependencies["config"]["config_files"], exp_dependencies["config"]["blocks"]
-    )
-    merged_config = ExpFromFiles.merge_dict_from_config_dicts(config_files_dict)
-
-    # Update domain
-    domain_file = f"{pysurfex_experiment}/data/config/domains/Harmonie_domains.json"
-    domain = ExpFromFiles.update_domain_from_json_file(
-        domain_file, merged_config["domain"]
-    )
-    merged_config.update({"domain": domain})
-
-    # Create Exp/Configuration object
-    stream = None
-    env_server = {"ECF_HOST": "localhost"}
-    sfx_exp = Exp(
-        exp_dependencies,
-        merged_config,
-        system,
-        system_file_paths,
-        env_server,
-        env_submit,
-        progress,
-        stream=stream,
-        json_schema={},
-    )
-
-    config_file = f"{tmp_path_factory.getbasetemp().as_posix()}/config.json"
-    sfx_exp.dump_json(config_file)
-    config = ParsedConfig.from_file(config_file)
-    # Template variables
-    update = {
-        "task": {
-            "args": {
-                "check_existence": False,
-                "pert": 1,
-                "ivar": 1,
-                "print_namelist": True,
-            }
-        }
-    }
-    config = config.copy(update=update)
-    return config
-
-
 @pytest.fixture(params=classes_to_be_tested())
 def task_name_and_configs(request, get_config):
     """Return a ParsedConfig with a task-specific section according to `params`."""
@@ -248,24 +137,18 @@ def _mockers_for_task_run_tests(session_mocker, tmp_path_factory):
     session_mocker.patch(
         "pysurfex.read.ConvertedInput.read_time_step", new=new_converted_input
     )
+    # The tasks import these functions when they are run
     session_mocker.patch(
-        "experiment.tasks.tasks.read_first_guess_netcdf_file",
+        "pysurfex.netcdf.read_first_guess_netcdf_file",
         new=new_read_first_guess_netcdf_file,
     )
+    session_mocker.patch("pysurfex.titan.dataset_from_file", new=new_dataset_from_file)
+    session_mocker.patch("pysurfex.interpolation.horizontal_oi", new=new_horizontal_oi)
     session_mocker.patch(
-        "experiment.tasks.tasks.dataset_from_file", new=new_dataset_from_file
-    )
-    session_mocker.patch("experiment.tasks.tasks.horizontal_oi", new=new_horizontal_oi)
-    session_mocker.patch(
-        "experiment.tasks.tasks.write_analysis_netcdf_file",
+        "pysurfex.netcdf.write_analysis_netcdf_file",
         new=new_write_analysis_netcdf_file,
     )
     session_mocker.patch("pysurfex.pseudoobs.read_cryoclim_nc", new=new_read_cryoclim_nc)
-    session_mocker.patch(
-        "experiment.tasks.tasks.write_obsmon_sqlite_file",
-        new=new_write_obsmon_sqlite_file,
-    )
-    session_mocker.patch("experiment.tasks.tasks.oi2soda", new=new_oi2soda)
 
     session_mocker.patch(
         "experiment.tasks.surfex_binary_task.PerturbedOffline", new=new_surfex_binary
@@ -324,3 +207,254 @@ class TestTasks:
         my_task_class.var_name = "t2m"
         my_task_class.fc_start_sfx = f"{my_task_class.fc_start_sfx}_{class_name}"
         my_task_class.run()
+
+
+def _square(value):
+    if value < 0:
+        raise ValueError("Negative value")
+    return value * value
+
+
+def test_run_in_pool():
+    finished = []
+    jobs = {1: (1,), 2: (2,), 3: (-1,)}
+    failed = run_in_pool(
+        _square, jobs, callback=lambda key, exc: finished.append((key, exc is None))
+    )
+    assert sorted(finished) == [(1, True), (2, True), (3, False)]
+    assert list(failed) == [3]
+
+
+def test_ekf_perturbations(get_config):
+    ekf = {"NNCV": [0, 1, 0, 1], "CVAR_M": ["TG1", "TG2", "WG1", "WG2"]}
+    config = get_config.copy(
+        update={"SURFEX": {"ASSIM": {"ISBA": {"EKF": {**ekf, "LLINCHECK": True}}}}}
+    )
+    runs = ekf_perturbations(config)
+    assert [task_args(run) for run in runs] == [
+        "pert=0;name=REF;ivar=0",
+        "pert=2;name=TG2;ivar=1;pert_sign=pos",
+        "pert=6;name=TG2;ivar=1;pert_sign=neg",
+        "pert=4;name=WG2;ivar=2;pert_sign=pos",
+        "pert=8;name=WG2;ivar=2;pert_sign=neg",
+    ]
+
+
+def test_forcing_file_per_cycle(get_config, tmp_path):
+    config = get_config.copy(
+        update={"system": {"forcing_dir": f"{tmp_path}/@YYYY@@MM@@DD@@HH@/"}}
+    )
+    task = get_task("Forcing", config)
+    cycles = [task.dtg + icycle * task.fcint for icycle in range(3)]
+    assert [task.forcing_file(cycle) for cycle in cycles] == [
+        f"{tmp_path}/{cycle.strftime('%Y%m%d%H')}/FORCING.nc" for cycle in cycles
+    ]
+
+
+def test_forcing_catchup_creates_missing_cycles(get_config, tmp_path, monkeypatch):
+    config = get_config.copy(
+        update={
+            "general": {"times": {"end": "2023-01-02T00:00:00Z"}},
+            "system": {"forcing_dir": f"{tmp_path}/@YYYY@@MM@@DD@@HH@/"},
+            "forcing": {"catchup_cycles": 3, "modify_forcing": False, "timestep": 3600},
+        }
+    )
+    task = get_task("Forcing", config)
+    task.create_wdir()
+    generated = []
+
+    def _generate(dtg_start, dtg_stop, output, encoding=None):  # noqa ARG001
+        generated.append((dtg_start, dtg_stop))
+        nsteps = int((dtg_stop - dtg_start).total_seconds() // 3600) + 1
+        with Dataset(output, mode="w") as nc_file:
+            nc_file.createDimension("time", None)
+            nc_file.createDimension("Number_of_points", 2)
+            nc_file.createVariable("time", "f8", ("time",))[:] = np.arange(nsteps)
+            var = nc_file.createVariable("Tair", "f4", ("time", "Number_of_points"))
+            var[:] = np.repeat(np.arange(nsteps), 2).reshape(nsteps, 2)
+
+    monkeypatch.setattr(task, "generate", _generate)
+    cycles = task.catchup_cycles()
+    assert len(cycles) == 3
+    # The forcing of the first cycle was created before the task failed
+    _generate(cycles[0], cycles[1], task.forcing_file(cycles[0]))
+    generated.clear()
+
+    completed = []
+    task.scheduler_client = SimpleNamespace(
+        task=EcflowTask(forcing_task_path("suite", cycles[0]), 1, "", None),
+        server=SimpleNamespace(force_complete=completed.append),
+    )
+    task.execute()
+    assert generated == [(cycles[1], cycles[2] + task.fcint)]
+    for cycle, first in [(cycles[1], 0), (cycles[2], 3)]:
+        with Dataset(task.forcing_file(cycle)) as nc_file:
+            assert list(nc_file["Tair"][:, 0]) == [first, first + 1, first + 2, first + 3]
+    assert [ecf_task.ecf_name for ecf_task in completed] == [
+        f"/suite/{cycle:%Y%m%d%H%M}/CycleInput/Forcing" for cycle in cycles[1:]
+    ]
+
+    generated.clear()
+    completed.clear()
+    task.execute()
+    assert generated == []
+    assert len(completed) == 2
+
+
+def test_modify_forcing_from_previous_cycle(get_config, tmp_path):
+    config = get_config.copy(
+        update={"system": {"forcing_dir": f"{tmp_path}/@YYYY@@MM@@DD@@HH@/"}}
+    )
+    task = get_task("ModifyForcing", config)
+    for cycle, offset in [(task.dtg - task.fcint, 100), (task.dtg, 0)]:
+        os.makedirs(f"{tmp_path}/{cycle.strftime('%Y%m%d%H')}")
+        filename = f"{tmp_path}/{cycle.strftime('%Y%m%d%H')}/FORCING.nc"
+        with Dataset(filename, mode="w") as nc_file:
+            nc_file.createDimension("Number_of_points", 2)
+            nc_file.createDimension("time", 4)
+            for name in ["LWdown", "DIR_SWdown", "SCA_SWdown", "Tair"]:
+                var = nc_file.createVariable(name, "f4", ("time", "Number_of_points"))
+                var[:] = np.arange(8).reshape(4, 2) + offset
+
+    task.execute()
+    with Dataset(f"{tmp_path}/{task.dtg.strftime('%Y%m%d%H')}/FORCING.nc") as nc_file:
+        for name in ["LWdown", "DIR_SWdown", "SCA_SWdown"]:
+            assert list(nc_file[name][:, 0]) == [106, 2, 4, 6]
+        assert list(nc_file["Tair"][:, 0]) == [0, 2, 4, 6]
+
+
+class _RecordingClient:
+    def __init__(self):
+        self.calls = []
+
+    def label(self, name, text):
+        self.calls.append(("label", name, text))
+
+    def event(self, name):
+        self.calls.append(("event", name))
+
+
+def test_bundle_reports_each_task(get_config, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    config = get_config.copy(update={"task": {"bundle": "Dummy:Dummy"}})
+    bundle = get_task("Bundle", config)
+    bundle.scheduler_client = _RecordingClient()
+    bundle.execute()
+    assert bundle.scheduler_client.calls == [
+        ("label", "task", "Dummy"),
+        ("event", "Dummy"),
+        ("label", "task", "Dummy"),
+        ("event", "Dummy"),
+        ("label", "task", ""),
+    ]
+
+
+def test_bundle_stops_at_failing_task(get_config, monkeypatch, tmp_path):
+    def _fail(__):
+        raise RuntimeError("Dummy failed")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Dummy, "execute", _fail)
+    config = get_config.copy(update={"task": {"bundle": "Dummy:Dummy"}})
+    bundle = get_task("Bundle", config)
+    bundle.scheduler_client = _RecordingClient()
+    with pytest.raises(RuntimeError, match="Dummy failed"):
+        bundle.execute()
+    assert bundle.scheduler_client.calls == [
+        ("label", "task", "Dummy"),
+        ("label", "task", "Dummy failed"),
+    ]
+
+
+def test_task_manifest_is_up_to_date():
+    with open(TASK_MANIFEST, mode="r", encoding="utf-8") as fhandler:
+        manifest = json.load(fhandler)
+    assert manifest == build_manifest()
+    assert set(manifest) == set(classes_to_be_tested())
+
+
+def _imported_task_modules(code):
+    code = (
+        "import sys; "
+        f"{code}; "
+        "print(' '.join(mod for mod in sys.modules if mod.startswith('experiment.')))"
+    )
+    output = subprocess.run(  # noqa S603
+        [sys.executable, "-c", code], capture_output=True, check=True, text=True
+    ).stdout.splitlines()
+    return set(output[-1].split())
+
+
+def test_find_task_class_imports_one_module():
+    lazy_modules = _imported_task_modules(
+        "from experiment.tasks.discover_tasks import find_task_class; "
+        "find_task_class('Dummy')"
+    )
+    all_modules = _imported_task_modules(
+        "import experiment.tasks; "
+        "from experiment.tasks.discover_tasks import discover; "
+        "from experiment.tasks.tasks import AbstractTask; "
+        "discover(experiment.tasks, AbstractTask, attrname='__type_name__')"
+    )
+    assert "experiment.tasks.gmtedsoil" not in lazy_modules
+    assert "experiment.tasks.prefetch_mars" not in lazy_modules
+    assert "experiment.tasks.gmtedsoil" in all_modules
+    assert lazy_modules < all_modules
+
+
+def test_plugin_manifest(tmp_path):
+    plugin_dir = tmp_path / "experiment_plugin_tasks"
+    plugin_dir.mkdir()
+    (plugin_dir / "my_tasks.py").write_text(
+        "from experiment.tasks import Forecast\n\n\n"
+        "class MyForecast(Forecast):\n"
+        "    pass\n",
+        encoding="utf-8",
+    )
+    manifest = load_plugin_manifest(plugin_dir.as_posix())
+    assert manifest == {
+        "myforecast": {
+            "module": "experiment_plugin_tasks.my_tasks",
+            "class": "MyForecast",
+        }
+    }
+    assert (plugin_dir / ".task_manifest.json").exists()
+    assert find_task_class("MyForecast", exp_dir=tmp_path.as_posix()).__name__ == (
+        "MyForecast"
+    )
+
+
+def test_task_context_is_created_on_demand(get_config):
+    task = get_task("Dummy", get_config)
+    for attr in ["fmanager", "platform", "settings", "geo", "suffix", "wrk", "nnco"]:
+        assert attr not in vars(task)
+    assert task.wdir.startswith(task.wrk)
+    assert os.path.isdir(task.wrk)
+    assert "platform" in vars(task)
+    assert task.geo is get_task("Dummy", get_config).geo
+
+
+def test_namelist_cache_file_shared_by_perturbations(get_config):
+    cache_files = set()
+    for pert in [0, 1, 2]:
+        config = get_config.copy(update={"task": {"args": {"pert": pert}}})
+        cache_files.add(get_task("PerturbedRun", config).namelist_cache_file())
+    assert len(cache_files) == 1
+    assert get_task("Forecast", get_config).namelist_cache_file() not in cache_files
+
+
+def test_scratch_wdir_with_copy_back(get_config, tmp_path):
+    config = get_config.copy(update={"general": {"scratch_root": f"{tmp_path}/scratch"}})
+    task = get_task("Dummy", config)
+    assert task.wdir.startswith(f"{tmp_path}/scratch/")
+    task.create_wdir()
+    with open(f"{task.wdir}/SURFOUT.nc", mode="w", encoding="utf-8") as fhandler:
+        fhandler.write("surfout")
+    destination = f"{tmp_path}/archive/SURFOUT.nc"
+    task.declare_output("SURFOUT.nc", destination)
+    task.declare_output("missing.nc", f"{tmp_path}/archive/missing.nc")
+    with pytest.raises(RuntimeError, match="missing.nc"):
+        task.wait_for_outputs()
+    with open(destination, mode="r", encoding="utf-8") as fhandler:
+        assert fhandler.read() == "surfout"
+    assert not os.path.exists(f"{task.wdir}/SURFOUT.nc")
@@ -0,0 +1,38 @@
+"""Unit tests for the task tracing."""
+import json
+
+from experiment.tracing import get_tracer, span, task_trace, traced
+
+
+@traced("add")
+def _add(val1, val2):
+    return val1 + val2
+
+
+def test_tracing_disabled(monkeypatch):
+    tracer = get_tracer()
+    monkeypatch.setattr(tracer, "trace_dir", None)
+    monkeypatch.setattr(tracer, "events", [])
+    with task_trace("Task"):
+        with span("step"):
+            assert _add(1, 2) == 3
+    assert tracer.events == []
+
+
+def test_task_trace_written(monkeypatch, tmp_path):
+    tracer = get_tracer()
+    monkeypatch.setattr(tracer, "trace_dir", tmp_path.as_posix())
+    monkeypatch.setattr(tracer, "events", [])
+    with task_trace("Task"):
+        with task_trace("Task"):
+            with span("step", mode="offline"):
+                assert _add(1, 2) == 3
+
+    trace_files = list(tmp_path.glob("Task_*.trace.json"))
+    assert len(trace_files) == 1
+    with open(trace_files[0], mode="r", encoding="utf-8") as fhandler:
+        events = json.load(fhandler)["traceEvents"]
+    assert [event["name"] for event in events] == ["add", "step", "Task", "Task"]
+    assert events[1]["args"] == {"mode": "offline"}
+    assert all(event["ph"] == "X" and event["dur"] >= 0 for event in events)
+    assert tracer.events == []
@@ -0,0 +1,130 @@
+"""Unit tests for the resident task worker."""
+import io
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from experiment.worker import EXIT_MARKER, WorkerLostError, run_in_worker, task_request
+
+WORKER_CODE = """
+import atexit
+import sys
+from experiment import PACKAGE_NAME
+from experiment.logs import logger
+from experiment.worker import TaskWorker
+
+logger.enable(PACKAGE_NAME)
+atexit.register(print, "Worker exit handler")
+worker = TaskWorker(sys.argv[1], preload=["experiment.tasks.tasks"], request_timeout=0.5)
+worker.serve(poll_interval=0.05)
+"""
+
+
+@pytest.fixture()
+def task_worker(tmp_path):
+    socket_path = f"{tmp_path.as_posix()}/worker.sock"
+    env = dict(os.environ)
+    repo = str(Path(__file__).parents[2])
+    env["PYTHONPATH"] = os.pathsep.join([repo, env.get("PYTHONPATH", "")])
+    with open(f"{tmp_path.as_posix()}/worker.log", mode="wb") as log:
+        worker = subprocess.Popen(  # noqa S603
+            [sys.executable, "-c", WORKER_CODE, socket_path],
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            env=env,
+        )
+    try:
+        deadline = time.monotonic() + 60
+        while not os.path.exists(socket_path):
+            assert worker.poll() is None, "Worker did not start"
+            assert time.monotonic() < deadline, "Worker is not listening"
+            time.sleep(0.05)
+        yield socket_path
+    finally:
+        worker.send_signal(signal.SIGINT)
+        worker.wait(timeout=30)
+    assert not os.path.exists(socket_path)
+
+
+def test_run_in_worker_no_worker(tmp_path):
+    socket_path = f"{tmp_path.as_posix()}/missing.sock"
+    assert run_in_worker(socket_path, task_request("Dummy", "config.json")) is None
+    assert run_in_worker("", task_request("Dummy", "config.json")) is None
+
+
+def test_run_in_worker_streams_output(tmp_path):
+    socket_path = f"{tmp_path.as_posix()}/worker.sock"
+    output = b"line\n" * 100
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+
+        def fake_worker():
+            conn, __ = server.accept()
+            with conn:
+                with conn.makefile("rb") as reader:
+                    reader.readline()
+                conn.sendall(output)
+                conn.sendall(EXIT_MARKER + b"3\n")
+
+        thread = threading.Thread(target=fake_worker)
+        thread.start()
+        stream = io.BytesIO()
+        exit_code = run_in_worker(
+            socket_path, task_request("Dummy", "config.json"), stream=stream
+        )
+        thread.join()
+    assert exit_code == 3
+    assert stream.getvalue() == output
+
+
+def test_task_worker_runs_task(task_worker, get_config, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_file = f"{tmp_path.as_posix()}/config.json"
+    with open(config_file, mode="w", encoding="utf-8") as fhandler:
+        fhandler.write(get_config.dumps(style="json", include_metadata=True))
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stalled:
+        # A client not sending its request does not block the worker
+        stalled.connect(task_worker)
+        stream = io.BytesIO()
+        exit_code = run_in_worker(task_worker, task_request("Dummy", config_file), stream)
+    assert exit_code == 0
+    assert b"Dummy task" in stream.getvalue()
+    assert b"Worker exit handler" not in stream.getvalue()
+
+    stream = io.BytesIO()
+    exit_code = run_in_worker(
+        task_worker, task_request("NoSuchTask", config_file), stream
+    )
+    assert exit_code == 1
+    assert b"Traceback" in stream.getvalue()
+
+
+def test_run_in_worker_lost_worker(tmp_path):
+    socket_path = f"{tmp_path.as_posix()}/worker.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(socket_path)
+        server.listen()
+
+        def dying_worker():
+            conn, __ = server.accept()
+            with conn:
+                with conn.makefile("rb") as reader:
+                    reader.readline()
+                conn.sendall(b"started\n")
+
+        thread = threading.Thread(target=dying_worker)
+        thread.start()
+        stream = io.BytesIO()
+        with pytest.raises(WorkerLostError):
+            run_in_worker(socket_path, task_request("Dummy", "config.json"), stream)
+        thread.join()
+    assert stream.getvalue() == b"started\n"